@@ -1,47 +1,67 @@
 import os
-import json
+import re
+import time
+_STARTED = time.perf_counter()
+
+import html
 import traceback
 from dotenv import load_dotenv
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from utils.data_fetcher import get_stock_data, plot_candlestick
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from telegram import InputFile
-from utils.gap_analyzer import analyze_stock, get_gap_down_summary, calculate_ad_line, detect_gap_down
-from utils.watchlist_manager import add_to_watchlist, remove_from_watchlist
+from utils.watchlist_manager import add_to_watchlist, remove_from_watchlist, load_watchlist
 from utils.scheduler import GapScanner
+from utils.executor import run_io, run_cpu, shutdown_pools
+from utils.metrics import metrics, timed_handler
+from utils.store import get_store
+from utils.single_flight import commands, command_key
+from utils.sectors import parse_gapcheck_args, sector_names
 from telegram.constants import ParseMode
 
+# Modul berat yang tidak diimport saat start; dimuat di background setelah
+# polling siap (atau saat pertama dipakai handler), lihat warm_up_imports
+HEAVY_MODULES = (
+    'pandas',
+    'yfinance',
+    'utils.data_fetcher',
+    'utils.gap_analyzer',
+    'utils.scan_pipeline',
+    'mplfinance',
+)
+
 # Load config
 load_dotenv()
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
-# Path untuk simpan chat_id
-CHAT_ID_FILE = "data/chat_ids.json"
+# Chat yang boleh memakai perintah admin (/stats), pisahkan dengan koma
+ADMIN_CHAT_IDS = {int(x) for x in os.getenv('ADMIN_CHAT_IDS', '').split(',') if x.strip()}
+
+# /gapcheck banyak saham: jumlah baris tabel dan panel grafik ringkas maksimum
+GAPCHECK_TABLE_ROWS = int(os.getenv('GAPCHECK_TABLE_ROWS', '25'))
+GAPCHECK_CHART_TOP = int(os.getenv('GAPCHECK_CHART_TOP', '6'))
+
+# Pantau gap down saat pembukaan (polling intraday), aktifkan dengan INTRADAY_MODE=1
+INTRADAY_MODE = os.getenv('INTRADAY_MODE', '0').lower() in ('1', 'true', 'yes')
+
+# 'polling' (default) atau 'webhook' (butuh WEBHOOK_URL, lihat utils/webhook)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
 
 if not TOKEN:
     raise ValueError("Token bot tidak ditemukan! Pastikan file .env sudah dibuat")
 
 def save_chat_id(chat_id):
-    os.makedirs("data", exist_ok=True)
-    try:
-        with open(CHAT_ID_FILE, "r") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = []
-    
-    if chat_id not in data:
-        data.append(chat_id)
-        with open(CHAT_ID_FILE, "w") as f:
-            json.dump(data, f)
+    """Daftarkan chat_id untuk menerima alert"""
+    get_store().subscribe(chat_id)
 
 def get_registered_chat_ids():
     """Mengembalikan list chat_id yang tersimpan atau list kosong jika error"""
     try:
-        with open("data/chat_ids.json", "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        return get_store().subscribers()
+    except Exception as e:
+        print(f"[ERROR] Gagal baca chat_id: {e}")
         return []
 
+@timed_handler('show_ids')
 async def show_registered_ids(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk perintah /show_ids"""
     chat_ids = get_registered_chat_ids()
@@ -56,6 +76,7 @@ async def show_registered_ids(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await update.message.reply_text(message)
 
+@timed_handler('start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handler untuk command /start"""
     chat_id = update.effective_chat.id
@@ -66,10 +87,115 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Perintah yang tersedia:\n"
         "/cek_candle [kode_saham] - Cek manual grafik candle\n"
         "/gapcheck [kode_saham] - Cek manual gap down ≥2%\n"
+        "/gapcheck [kode ...|sektor|all] [chart] - Ringkasan banyak saham\n"
+        "/addwatch, /rmwatch, /watchlist - Atur watchlist chat ini\n"
+        "/threshold [persen] - Atur batas gap down untuk alert\n"
+        "/rules [nama ...] - Pilih rule sinyal untuk alert\n"
+        "/signals [kode] [dari] [sampai] - Riwayat sinyal yang pernah dikirim\n"
         "/help - Untuk menampilkan kembali pesan ini"
     )
     await update.message.reply_text(help_text)
 
+class CommandFailed(Exception):
+    """Kegagalan yang pesannya langsung ditampilkan ke user (tidak disimpan di cache single-flight)"""
+
+async def build_candle_chart(stock_code, period='1mo'):
+    """Ambil data + render grafik untuk /cek_candle, kembalikan PNG bytes"""
+    from utils.data_fetcher import get_stock_data, render_chart
+
+    data = await run_io(get_stock_data, stock_code, period=period)
+    if data is None or data.empty:
+        raise CommandFailed(f"❌ Gagal mengambil data {stock_code}")
+    chart = await render_chart(data, stock_code)
+    if chart is None:
+        raise CommandFailed("❌ Gagal membuat grafik")
+    return chart
+
+async def build_gapcheck(stock_code, period='1mo'):
+    """Deteksi sinyal untuk /gapcheck, kembalikan (pesan, grafik atau None, ada_sinyal)"""
+    from utils.data_fetcher import get_stock_data, render_chart
+    from utils.gap_analyzer import detect_gap_down
+
+    # Ambil data
+    data = await run_io(get_stock_data, stock_code, period=period)
+    if data is None or data.empty:
+        raise CommandFailed("⚠️ Gagal mengambil data saham")
+
+    # Proses deteksi sinyal (gap + OBV)
+    data = await run_cpu(detect_gap_down, data)  # Fungsi dari gap_analyzer.py yang sudah diupdate
+    if data is None:
+        raise CommandFailed("⚠️ Gagal memproses data saham")
+    signals = data[data['Is_Signal']]
+
+    if signals.empty:
+        return f"⚠️ Tidak ada sinyal gap down + akumulasi pada {stock_code} (periode: {period})", None, False
+
+    # Kirim alert untuk setiap sinyal (atau hanya yang terbaru)
+    latest_signal = signals.iloc[-1]
+
+    # Gunakan format sama seperti auto scan
+    message = (
+        f"📉 <b>SINYAL TERAKHIR TERDETEKSI (Manual Check)</b>\n"
+        f"Saham: {stock_code}\n"
+        f"Tanggal: {latest_signal.name.strftime('%Y-%m-%d')}\n"
+        f"Harga: {latest_signal['Close']:,.0f}\n"
+        f"Gap: {latest_signal['Gap_pct']:.2f}%\n"
+        f"Akumulasi Bandar: ✅"
+    )
+    chart = await render_chart(data, stock_code, window=len(data))
+    return message, chart, True
+
+def _compact_number(value):
+    """1234567 -> +1.2M, untuk kolom tabel yang sempit"""
+    for unit, size in (('B', 1e9), ('M', 1e6), ('K', 1e3)):
+        if abs(value) >= size:
+            return f"{value / size:+.1f}{unit}"
+    return f"{value:+.0f}"
+
+def format_gapcheck_table(ranked, scope, period, scanned, missing):
+    """Pesan HTML berisi tabel sinyal terurut (gap paling dalam dulu) untuk /gapcheck banyak saham"""
+    lines = [
+        "📊 <b>RINGKASAN GAP DOWN + AKUMULASI</b>",
+        f"Cakupan: {html.escape(scope)}, periode {html.escape(period)}",
+        f"Sinyal: {len(ranked)} dari {scanned} saham berdata",
+    ]
+    if len(ranked):
+        rows = [f"{'#':>2} {'Kode':<5} {'Tanggal':<10} {'Gap%':>6} {'OBV Δ':>7} {'Harga':>8}"]
+        for i, row in enumerate(ranked.head(GAPCHECK_TABLE_ROWS).itertuples(index=False), start=1):
+            rows.append(
+                f"{i:>2} {row.Ticker.replace('.JK', ''):<5} {row.Date.strftime('%Y-%m-%d')} "
+                f"{row.Gap_pct:>6.2f} {_compact_number(row.OBV_Change):>7} {row.Close:>8,.0f}"
+            )
+        lines.append("<pre>" + html.escape("\n".join(rows)) + "</pre>")
+        if len(ranked) > GAPCHECK_TABLE_ROWS:
+            lines.append(f"... dan {len(ranked) - GAPCHECK_TABLE_ROWS} saham lainnya")
+    if missing:
+        shown = ', '.join(missing[:20]) + (f" (+{len(missing) - 20})" if len(missing) > 20 else "")
+        lines.append(f"Tanpa data: {html.escape(shown)}")
+    return "\n".join(lines)
+
+async def build_gapcheck_bulk(stock_codes, period='1mo', with_chart=False, scope=None):
+    """Deteksi sinyal banyak saham dalam satu batch, kembalikan (pesan, grafik ringkas atau None, ada_sinyal)"""
+    from utils.data_fetcher import get_bulk_stock_data, render_small_multiples
+    from utils.signal_engine import scan_frames, rank_signals
+
+    frames = await run_io(get_bulk_stock_data, stock_codes, period=period)
+    if not frames:
+        raise CommandFailed("⚠️ Gagal mengambil data saham")
+
+    fired = await run_cpu(scan_frames, frames)
+    ranked = rank_signals(fired)
+    missing = [code for code in stock_codes if code not in frames]
+    message = format_gapcheck_table(ranked, scope or f"{len(stock_codes)} saham", period, len(frames), missing)
+
+    chart = None
+    if with_chart and len(ranked):
+        top = ranked.head(GAPCHECK_CHART_TOP)
+        titles = {row.Ticker: f"{row.Ticker} {row.Gap_pct:.2f}%" for row in top.itertuples(index=False)}
+        chart = await run_cpu(render_small_multiples, {code: frames[code] for code in titles}, titles)
+    return message, chart, len(ranked) > 0
+
+@timed_handler('cek_candle')
 async def cek_candle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handler untuk cek candle dengan penanganan error lebih baik"""
     if not context.args:
@@ -80,93 +206,172 @@ async def cek_candle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     msg = await update.message.reply_text(f"🔄 Mengambil data {stock_code}...")
     
     try:
-        # Step 1: Dapatkan data
-        data = get_stock_data(stock_code)
-        if data is None or data.empty:
-            await msg.edit_text(f"❌ Gagal mengambil data {stock_code}")
-            return
-            
-        # Step 2: Buat grafik
-        await msg.edit_text(f"📊 Membuat grafik {stock_code}...")
-        chart_file = plot_candlestick(data, stock_code)
-        
-        if chart_file is None or not os.path.exists(chart_file):
-            await msg.edit_text("❌ Gagal membuat grafik")
-            return
-            
-        # Step 3: Kirim gambar
-        with open(chart_file, 'rb') as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=f"📈 Grafik {stock_code} - 30 hari terakhir"
-            )
+        # Request identik yang bersamaan berbagi satu fetch + render
+        chart = await commands.do(
+            command_key('cek_candle', stock_code, '1mo'),
+            lambda: build_candle_chart(stock_code)
+        )
+        await update.message.reply_photo(
+            photo=chart,
+            caption=f"📈 Grafik {stock_code} - 30 hari terakhir"
+        )
         await msg.delete()
-        
-        # Step 4: Bersihkan file
-        try:
-            os.remove(chart_file)
-        except:
-            pass
-            
+
+    except CommandFailed as e:
+        await msg.edit_text(str(e))
     except Exception as e:
         await msg.edit_text(f"❌ Error: {str(e)}")
         print(f"Error trace: {traceback.format_exc()}")
 
+@timed_handler('gapcheck')
 async def cek_gap(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler manual untuk cek gap down + akumulasi (format sama seperti auto scan)"""
+    """Handler manual untuk cek gap down + akumulasi (format sama seperti auto scan).
+
+    Satu kode saham: pesan + grafik seperti alert. Banyak kode, nama sektor
+    atau `all`: satu tabel terurut + grafik ringkas opsional (`chart`).
+    """
     try:
         # Parsing input
-        stock_code = context.args[0].upper() if context.args else None
-        period = context.args[1] if len(context.args) > 1 else "1mo"  # Default: 1 bulan
-        
-        if not stock_code:
-            await update.message.reply_text("Contoh: /gapcheck BBRI 3mo")
-            return
+        chat_id = update.effective_chat.id
+        stock_codes, period, scope, with_chart = parse_gapcheck_args(
+            context.args or [], watchlist=load_watchlist(chat_id)
+        )
 
-        # Ambil data
-        data = get_stock_data(stock_code, period=period)
-        if data is None or data.empty:
-            await update.message.reply_text("⚠️ Gagal mengambil data saham")
+        if not stock_codes:
+            await update.message.reply_text(
+                "Contoh: /gapcheck BBRI 3mo\n"
+                "/gapcheck BBRI BBCA TLKM chart\n"
+                "/gapcheck keuangan | /gapcheck all\n"
+                f"Sektor: {', '.join(sector_names())}"
+            )
             return
 
-        # Proses deteksi sinyal (gap + OBV)
-        data = detect_gap_down(data)  # Fungsi dari gap_analyzer.py yang sudah diupdate
-        signals = data[data['Is_Signal']]
-        
-        if not signals.empty:
-            # Kirim alert untuk setiap sinyal (atau hanya yang terbaru)
-            latest_signal = signals.iloc[-1]
-            
-            # Gunakan format sama seperti auto scan
-            message = (
-                f"📉 <b>SINYAL TERAKHIR TERDETEKSI (Manual Check)</b>\n"
-                f"Saham: {stock_code}\n"
-                f"Tanggal: {latest_signal.name.strftime('%Y-%m-%d')}\n"
-                f"Harga: {latest_signal['Close']:,.0f}\n"
-                f"Gap: {latest_signal['Gap_pct']:.2f}%\n"
-                f"Akumulasi Bandar: ✅"
+        if len(stock_codes) == 1 and scope is None:
+            stock_code = stock_codes[0]
+            message, chart, found = await commands.do(
+                command_key('gapcheck', stock_code, period),
+                lambda: build_gapcheck(stock_code, period)
             )
-            
-            # Kirim grafik
-            chart_file = plot_candlestick(data, stock_code)
-            if chart_file:
-                with open(chart_file, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message,
-                        parse_mode=ParseMode.HTML
-                    )
-                os.remove(chart_file)
+            if not found:
+                await update.message.reply_text(message)
+            elif chart:
+                await update.message.reply_photo(
+                    photo=chart,
+                    caption=message,
+                    parse_mode=ParseMode.HTML
+                )
             else:
                 await update.message.reply_text(message, parse_mode=ParseMode.HTML)
-        else:
-            await update.message.reply_text(
-                f"⚠️ Tidak ada sinyal gap down + akumulasi pada {stock_code} (periode: {period})"
+            return
+
+        # Banyak saham: satu batch fetch + deteksi, satu balasan
+        msg = await update.message.reply_text(f"🔄 Memeriksa {len(stock_codes)} saham...")
+        message, chart, found = await commands.do(
+            command_key('gapcheck', ','.join(sorted(stock_codes)), period) + (with_chart,),
+            lambda: build_gapcheck_bulk(stock_codes, period, with_chart, scope)
+        )
+        await msg.edit_text(message, parse_mode=ParseMode.HTML)
+        if chart:
+            await update.message.reply_photo(
+                photo=chart,
+                caption="📈 Sinyal teratas (gap terdalam)"
             )
 
+    except CommandFailed as e:
+        await update.message.reply_text(str(e))
     except Exception as e:
         await update.message.reply_text(f"⚠️ Error: {str(e)}")
 
+@timed_handler('rules')
+async def set_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /rules [nama ...|default] - lihat/atur rule sinyal alert chat ini"""
+    from utils.rules import available_rules
+
+    chat_id = update.effective_chat.id
+    rules = available_rules()
+    if not context.args:
+        active = get_store().rules(chat_id)
+        lines = [f"{'✅' if name in active else '▫️'} {name} - {rule.description}" for name, rule in rules.items()]
+        await update.message.reply_text(
+            "📐 Rule sinyal (✅ = aktif untuk chat ini):\n" + "\n".join(lines) +
+            "\n\nContoh: /rules gap_obv gap_volume\n/rules default - kembali ke rule bawaan"
+        )
+        return
+
+    names = [name.lower() for arg in context.args for name in arg.split(',') if name.strip()]
+    if names == ['default']:
+        names = []
+    unknown = [name for name in names if name not in rules]
+    if unknown:
+        await update.message.reply_text(f"⚠️ Rule tidak dikenal: {', '.join(unknown)}\nLihat daftar dengan /rules")
+        return
+
+    get_store().set_rules(chat_id, names)
+    await update.message.reply_text(f"✅ Rule aktif: {', '.join(get_store().rules(chat_id))}")
+
+STOCK_CODE_PATTERN = re.compile(r'^[A-Z0-9]{1,6}$')
+
+def _signals_page(stock_code=None, start=None, end=None, before=None):
+    """Satu halaman riwayat jurnal sinyal: (teks, tombol halaman berikutnya atau None)"""
+    from utils.signal_journal import get_journal
+
+    rows, cursor = get_journal().query(stock_code, start, end, before=before)
+    scope = " ".join(x for x in (stock_code, f"dari {start}" if start else None, f"s/d {end}" if end else None) if x)
+    if not rows:
+        return f"📭 Tidak ada sinyal tercatat{' (' + scope + ')' if scope else ''}", None
+
+    lines = [f"🗂 Riwayat sinyal{' ' + scope if scope else ''}:"]
+    for row in rows:
+        gap = f"{row['gap_pct']:.2f}%" if row['gap_pct'] is not None else "-"
+        close = f"{row['close']:,.0f}" if row['close'] is not None else "-"
+        lines.append(f"• {row['bar_date']} {row['stock_code'].replace('.JK', '')} [{row['rule']}] gap {gap}, harga {close}")
+
+    markup = None
+    if cursor:
+        # callback_data maks 64 byte: filter + kursor keyset (tanggal, id)
+        data = "|".join(['signals', stock_code or '-', start or '-', end or '-', cursor[0], str(cursor[1])])
+        assert len(data.encode()) <= 64, data
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("Berikutnya ▶", callback_data=data)]])
+    return "\n".join(lines), markup
+
+@timed_handler('signals')
+async def show_signals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /signals [kode] [dari YYYY-MM-DD] [sampai YYYY-MM-DD] - riwayat sinyal yang pernah dikirim"""
+    stock_code, dates = None, []
+    for arg in context.args or []:
+        if len(arg) == 10 and arg[4] == '-' and arg[7] == '-':
+            dates.append(arg)
+        else:
+            stock_code = arg.upper().replace('.JK', '')
+    if stock_code is not None and not STOCK_CODE_PATTERN.match(stock_code):
+        await update.message.reply_text("⚠️ Kode saham tidak valid. Contoh: /signals BBRI")
+        return
+    try:
+        for date in dates:
+            time.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        await update.message.reply_text("⚠️ Format tanggal salah. Contoh: /signals BBRI 2025-01-01 2025-03-31")
+        return
+
+    start = dates[0] if dates else None
+    end = dates[1] if len(dates) > 1 else None
+    text, markup = _signals_page(stock_code, start, end)
+    await update.message.reply_text(text, reply_markup=markup)
+
+async def signals_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Tombol 'Berikutnya' di /signals: ganti pesan dengan halaman berikutnya"""
+    query = update.callback_query
+    await query.answer()
+    _, stock_code, start, end, cursor_date, cursor_id = query.data.split('|')
+    text, markup = _signals_page(
+        None if stock_code == '-' else stock_code,
+        None if start == '-' else start,
+        None if end == '-' else end,
+        before=(cursor_date, int(cursor_id))
+    )
+    await query.edit_message_text(text, reply_markup=markup)
+
+@timed_handler('addwatch')
 async def add_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk /addwatch"""
     if not context.args:
@@ -174,11 +379,12 @@ async def add_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     stock_code = context.args[0].upper()
-    if add_to_watchlist(stock_code):
+    if add_to_watchlist(stock_code, chat_id=update.effective_chat.id):
         await update.message.reply_text(f"✅ {stock_code} ditambahkan ke watchlist!")
     else:
         await update.message.reply_text(f"⚠️ {stock_code} sudah ada di watchlist")
 
+@timed_handler('rmwatch')
 async def remove_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk /rmwatch"""
     if not context.args:
@@ -186,23 +392,47 @@ async def remove_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     stock_code = context.args[0].upper()
-    if remove_from_watchlist(stock_code):
+    if remove_from_watchlist(stock_code, chat_id=update.effective_chat.id):
         await update.message.reply_text(f"✅ {stock_code} dihapus dari watchlist!")
     else:
         await update.message.reply_text(f"⚠️ {stock_code} tidak ditemukan di watchlist")
 
+@timed_handler('watchlist')
 async def show_watchlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk /watchlist"""
     from utils.watchlist_manager import load_watchlist
-    watchlist = load_watchlist()
+    chat_id = update.effective_chat.id
+    watchlist = load_watchlist(chat_id)
     if not watchlist:
         await update.message.reply_text("Watchlist kosong")
     else:
-        message = "📋 Daftar Saham yang Dipantau:\n" + "\n".join(
+        source = "" if get_store().has_own_watchlist(chat_id) else " (global)"
+        message = f"📋 Daftar Saham yang Dipantau{source}:\n" + "\n".join(
             f"• {code.replace('.JK', '')}" for code in watchlist
-        )
+        ) + f"\n\nBatas gap down: {get_store().threshold(chat_id):g}%"
         await update.message.reply_text(message)
 
+@timed_handler('threshold')
+async def set_threshold(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /threshold [persen] - lihat/atur batas gap down untuk chat ini"""
+    chat_id = update.effective_chat.id
+    if not context.args:
+        await update.message.reply_text(
+            f"Batas gap down saat ini: {get_store().threshold(chat_id):g}%\nContoh: /threshold 2"
+        )
+        return
+
+    try:
+        threshold = float(context.args[0].replace('%', '').replace(',', '.'))
+        if not 0 <= threshold < 100:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("⚠️ Format salah. Contoh: /threshold 2")
+        return
+
+    get_store().set_threshold(chat_id, threshold)
+    await update.message.reply_text(f"✅ Alert dikirim jika gap down ≥ {threshold:g}%")
+
 async def test_auto_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         print(f"[DEBUG] Command chat_id: {update.effective_chat.id}")
@@ -213,12 +443,87 @@ async def test_auto_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Error: {str(e)}")
         print(f"[ERROR] in test_auto: {traceback.format_exc()}")
 
-def main():
-    application = Application.builder().token(TOKEN).build()  
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /stats [json|prom] (khusus admin)"""
+    if update.effective_chat.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("❌ Perintah ini khusus admin.")
+        return
+
+    fmt = context.args[0].lower() if context.args else None
+    if fmt == 'json':
+        await update.message.reply_document(
+            document=InputFile(metrics.to_json().encode(), filename='metrics.json')
+        )
+    elif fmt in ('prom', 'prometheus'):
+        await update.message.reply_document(
+            document=InputFile(metrics.to_prometheus().encode(), filename='metrics.prom')
+        )
+    else:
+        await update.message.reply_text(metrics.format_summary(), parse_mode=ParseMode.HTML)
+
+def warm_up_imports(modules=HEAVY_MODULES):
+    """Import modul berat satu per satu, kembalikan {modul: detik}"""
+    import importlib
+
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+async def warm_up(application):
+    """Muat modul berat di thread I/O tanpa menahan polling"""
+    try:
+        timings = await run_io(warm_up_imports)
+        total = sum(timings.values())
+        metrics.observe('warmup_seconds', total)
+        print(f"[STARTUP] Modul berat termuat di background dalam {total:.2f}s")
+    except Exception as e:
+        print(f"⚠️ Error warm-up: {str(e)}")
+
+async def on_startup(application):
+    """Dipanggil tepat sebelum polling mulai: catat waktu start lalu jalankan warm-up"""
+    elapsed = time.perf_counter() - _STARTED
+    metrics.observe('startup_seconds', elapsed)
+    print(f"[STARTUP] Siap polling dalam {elapsed:.2f}s")
+    application.create_task(warm_up(application))
+
+async def on_shutdown(application):
+    """Tutup thread/process pool dan session HTTP saat bot berhenti"""
+    from utils.data_source import close_source
+    from utils.scan_coordinator import close_coordinator
+
+    close_coordinator()
+    shutdown_pools(wait=False)
+    close_source()
+
+def build_application(request=None):
+    """Bangun Application lengkap dengan handler & job, tanpa mulai polling.
+
+    `request` = BaseRequest pengganti untuk Bot API (mis. tiruan lokal di benchmark).
+    """
+    from utils.update_queue import QueuedApplication, UPDATE_WORKERS
+
+    builder = (
+        Application.builder().token(TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if UPDATE_WORKERS > 0:
+        # Update diproses bersamaan lewat antrian terbatas (urutan per chat tetap)
+        builder = builder.application_class(QueuedApplication)
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
     scanner = GapScanner(application)  # Tanpa test_mode  
     scanner.start()
+    if INTRADAY_MODE:
+        from utils.intraday import IntradayGapMonitor
+        IntradayGapMonitor(application).start()
 
     # Simpan scanner di context.user_data atau gunakan closure
+    @timed_handler('test_auto')
     async def test_auto(update, context):
         await scanner.scan_and_alert(context)
         await update.message.reply_text("✅ Test berhasil!")
@@ -228,18 +533,30 @@ def main():
     application.add_handler(CommandHandler("addwatch", add_watch))
     application.add_handler(CommandHandler("rmwatch", remove_watch))
     application.add_handler(CommandHandler("watchlist", show_watchlist))
+    application.add_handler(CommandHandler("threshold", set_threshold))
+    application.add_handler(CommandHandler("rules", set_rules))
+    application.add_handler(CommandHandler("signals", show_signals))
+    application.add_handler(CallbackQueryHandler(signals_next_page, pattern=r'^signals\|'))
     application.add_handler(CommandHandler("show_ids", show_registered_ids))
     application.add_handler(CommandHandler("help", start))
     application.add_handler(CommandHandler("cek_candle", cek_candle))
     application.add_handler(CommandHandler("gapcheck", cek_gap))
     application.add_handler(CommandHandler("test_auto", test_auto))
+    application.add_handler(CommandHandler("stats", show_stats))
 
     # scanner = GapScanner(application)  # application di-pass sebagai argumen
     # scanner = GapScanner(application, test_mode=True)
     # scanner.start()
+    return application
 
-    print("Bot sedang berjalan...")
-    application.run_polling()
+def main():
+    application = build_application()
+    print(f"Bot sedang berjalan ({BOT_MODE})...")
+    if BOT_MODE == 'webhook':
+        from utils.webhook import run_webhook
+        run_webhook(application)
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Profil waktu import & start bot, untuk memantau cold start.
+
+Menjalankan `python -X importtime` di proses terpisah (cache modul bersih),
+lalu melaporkan total waktu sampai Application siap polling dan modul
+paling lambat.
+
+Contoh:
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --top 30 --json import_profile.json
+    python -m benchmarks.import_profile --module utils.data_fetcher
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Kode yang diukur: import base_bot lalu bangun Application (tanpa koneksi ke Telegram)
+STARTUP_CODE = """
+import time
+started = time.perf_counter()
+import base_bot
+imported = time.perf_counter()
+base_bot.build_application()
+built = time.perf_counter()
+import sys, json
+print('RESULT', json.dumps({
+    'import_seconds': imported - started,
+    'ready_seconds': built - started,
+    'heavy_loaded_at_start': sorted(m for m in base_bot.HEAVY_MODULES if m in sys.modules),
+}))
+"""
+
+def run_importtime(code, env=None):
+    """Jalankan `code` dengan -X importtime, kembalikan (stdout, list baris importtime)"""
+    env = dict(os.environ, **(env or {}))
+    env.setdefault('TELEGRAM_BOT_TOKEN', '0:profile')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+    return proc.stdout, rows
+
+def profile_startup():
+    stdout, rows = run_importtime(STARTUP_CODE)
+    line = next(l for l in stdout.splitlines() if l.startswith('RESULT '))
+    return {**json.loads(line[len('RESULT '):]), 'modules': rows}
+
+def profile_module(module):
+    _, rows = run_importtime(f'import {module}')
+    top = [row for row in rows if row['module'] == module]
+    return {
+        'import_seconds': top[-1]['cumulative_ms'] / 1000 if top else None,
+        'modules': rows,
+    }
+
+def print_report(result, top):
+    if 'ready_seconds' in result:
+        print(f"Import base_bot      : {result['import_seconds']:.3f}s")
+        print(f"Siap polling         : {result['ready_seconds']:.3f}s")
+        heavy = result['heavy_loaded_at_start']
+        print(f"Modul berat saat start: {', '.join(heavy) if heavy else '-'}")
+    else:
+        print(f"Import               : {result['import_seconds']:.3f}s")
+
+    rows = result['modules']
+    print(f"\nTop {top} modul (kumulatif, ms)")
+    for row in sorted((r for r in rows if r['depth'] <= 1), key=lambda r: r['cumulative_ms'], reverse=True)[:top]:
+        print(f"{row['cumulative_ms']:10.1f}  {row['module']}")
+    print(f"\nTop {top} modul (self, ms)")
+    for row in sorted(rows, key=lambda r: r['self_ms'], reverse=True)[:top]:
+        print(f"{row['self_ms']:10.1f}  {row['module']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profil waktu import & start bot")
+    parser.add_argument('--module', help="Profil import satu modul saja (default: start bot lengkap)")
+    parser.add_argument('--top', type=int, default=15, help="Jumlah modul paling lambat yang ditampilkan")
+    parser.add_argument('--json', help="Simpan hasil lengkap ke file JSON")
+    args = parser.parse_args(argv)
+
+    result = profile_module(args.module) if args.module else profile_startup()
+    print_report(result, args.top)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nHasil disimpan: {args.json}")
+
+if __name__ == '__main__':
+    main()
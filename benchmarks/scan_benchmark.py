@@ -0,0 +1,302 @@
+"""Benchmark scan pagi tanpa jaringan.
+
+Data OHLCV diputar ulang dari fixture rekaman lewat FileSource (utils/data_source), dan
+alert dikirim ke bot Telegram tiruan dengan latency yang bisa diatur.
+
+Contoh:
+    python -m benchmarks.scan_benchmark --sizes 50,500,5000 --json bench.json
+    python -m benchmarks.scan_benchmark --record       # rekam fixture dari watchlist (butuh internet)
+"""
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'ohlcv.csv.gz')
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# ---------------------------------------------------------------- fixture
+
+def record_fixture(path=FIXTURE_PATH, period='3mo'):
+    """Rekam OHLCV watchlist dari Yahoo ke fixture CSV (format panjang: Date, Ticker, OHLCV)"""
+    import yfinance as yf
+    from utils.watchlist_manager import load_watchlist
+
+    data = yf.download(load_watchlist(), period=period, group_by='ticker', auto_adjust=True, progress=False)
+    records = data.stack(level=0, future_stack=True).reset_index()
+    records.columns = ['Date', 'Ticker'] + list(records.columns[2:])
+    records = records[['Date', 'Ticker'] + FIELDS].dropna()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records.to_csv(path, index=False)
+    print(f"Fixture disimpan: {path} ({records['Ticker'].nunique()} ticker, {len(records)} bar)")
+
+def synthetic_fixture(n_tickers=90, n_days=63, seed=42):
+    """Fixture sintetis deterministik, dipakai jika belum ada rekaman"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=n_days)
+    frames = []
+    for i in range(n_tickers):
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+        open_ = close * (1 + rng.normal(0, 0.015, n_days))
+        frames.append(pd.DataFrame({
+            'Date': dates,
+            'Ticker': f'SYN{i:03d}.JK',
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n_days)),
+            'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n_days)),
+            'Close': close,
+            'Volume': rng.integers(100_000, 50_000_000, n_days),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def load_fixture(path=FIXTURE_PATH):
+    """Muat fixture sebagai {ticker: DataFrame}; tanggal digeser agar bar terakhir = hari bursa terakhir"""
+    if os.path.exists(path):
+        records = pd.read_csv(path, parse_dates=['Date'])
+        source = path
+    else:
+        records = synthetic_fixture()
+        source = 'synthetic (belum ada rekaman, jalankan --record)'
+
+    shift = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=1)[0] - records['Date'].max()
+    records['Date'] = records['Date'] + pd.Timedelta(days=shift.days)
+    frames = {
+        ticker: group.set_index('Date')[FIELDS].sort_index()
+        for ticker, group in records.groupby('Ticker')
+    }
+    return frames, source
+
+def make_universe(fixture, size):
+    """Perbanyak fixture ke `size` ticker (diulang dengan skala harga berbeda)"""
+    base = list(fixture.values())
+    universe = {}
+    for i in range(size):
+        data = base[i % len(base)].copy()
+        scale = 1 + (i // len(base)) * 0.01
+        data[['Open', 'High', 'Low', 'Close']] *= scale
+        universe[f'B{i:04d}.JK'] = data
+    return universe
+
+# ---------------------------------------------------------------- tiruan
+
+class StubBot:
+    """Bot Telegram tiruan: setiap kirim menunggu `latency` detik"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_photo(self, chat_id, photo, caption=None, parse_mode=None):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return types.SimpleNamespace(photo=[types.SimpleNamespace(file_id=f'stub-{chat_id}')])
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return types.SimpleNamespace(photo=[])
+
+# ---------------------------------------------------------------- pengukuran
+
+TRACE_MEMORY = False  # diaktifkan oleh --tracemalloc (akurat tapi memperlambat stage)
+
+def _max_rss_mb():
+    # ru_maxrss dalam KB di Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(func, *args, **kwargs):
+    """Jalankan func, kembalikan (hasil, detik, info memori)"""
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        memory = {'peak_rss_mb': round(_max_rss_mb(), 1), 'rss_growth_mb': round(_max_rss_mb() - rss_before, 1)}
+        if TRACE_MEMORY:
+            memory['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+            tracemalloc.stop()
+    return result, elapsed, memory
+
+def stage(name, elapsed, memory, items):
+    return {
+        'stage': name,
+        'seconds': round(elapsed, 6),
+        **memory,
+        'items': items,
+        'items_per_sec': round(items / elapsed, 2) if elapsed > 0 else None,
+    }
+
+def run_size(fixture, size, args):
+    from utils import bar_cache, alert_sender, chart_base
+    from utils.data_source import FileSource, set_source
+    from utils.signal_engine import scan_frames, latest_signals
+    from utils.data_fetcher import get_bulk_stock_data, render_candlestick
+
+    universe = make_universe(fixture, size)
+    set_source(FileSource(universe, latency=args.fetch_latency))
+    codes = list(universe)
+    stages = []
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_bars_')
+    bar_cache.BAR_CACHE_DIR = cache_dir
+    try:
+        # Fetch dingin (cache kosong) lalu hangat (dilayani dari cache)
+        frames, elapsed, memory = measure(get_bulk_stock_data, codes, period='1mo')
+        stages.append(stage('fetch_cold', elapsed, memory, len(frames)))
+        _, elapsed, memory = measure(get_bulk_stock_data, codes, period='1mo')
+        stages.append(stage('fetch_warm', elapsed, memory, len(frames)))
+
+        # Indikator + sinyal
+        fired, elapsed, memory = measure(scan_frames, frames)
+        latest = latest_signals(fired)
+        stages.append(stage('indicators', elapsed, memory, len(frames)))
+
+        # Render grafik untuk ticker yang memicu sinyal (dibatasi --max-renders)
+        to_render = list(latest)[:args.max_renders]
+
+        def render_all():
+            return [render_candlestick(frames[code].loc[:latest[code].name].tail(30), code) for code in to_render]
+
+        charts, elapsed, memory = measure(render_all)
+        stages.append(stage('render', elapsed, memory, len(charts)))
+
+        # Grafik yang sama dari lapisan dasar (disiapkan "semalam", tidak ikut diukur): komposit bar terakhir saja
+        chart_base.CHART_BASE_DIR = os.path.join(cache_dir, 'chart_base')
+        for code in to_render:
+            history = frames[code].loc[:latest[code].name]
+            chart_base.save_base(*chart_base.build_base_layer(history.iloc[:-1], code, history.index[-1]))
+
+        def compose_all():
+            return [chart_base.compose_from_base(frames[code].loc[:latest[code].name].tail(30), code) for code in to_render]
+
+        composed, elapsed, memory = measure(compose_all)
+        stages.append(stage('compose', elapsed, memory, sum(png is not None for png in composed)))
+
+        # Kirim ke bot tiruan
+        bot = StubBot(latency=args.send_latency)
+        chat_ids = list(range(1, args.chats + 1))
+
+        async def send_all():
+            for code, chart in zip(to_render, charts):
+                await alert_sender.broadcast(bot, chat_ids, f"bench {code}", photo=chart, label=code)
+
+        _, elapsed, memory = measure(asyncio.run, send_all())
+        stages.append(stage('send', elapsed, memory, bot.sent))
+
+        # End-to-end GapScanner.scan_and_alert (hanya untuk watchlist kecil: render semua sinyal)
+        if size <= args.e2e_max:
+            stages.append(run_end_to_end(codes, chat_ids, args))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        'size': size,
+        'tickers_with_data': len(frames),
+        'signals': len(latest),
+        'stages': stages,
+    }
+
+def run_end_to_end(codes, chat_ids, args):
+    from utils import bar_cache, store, signal_journal
+    from utils.scheduler import GapScanner
+    from utils.executor import shutdown_pools
+    from utils.scan_coordinator import close_coordinator
+
+    # Cache dingin lagi supaya fetch ikut terukur
+    shutil.rmtree(bar_cache.BAR_CACHE_DIR, ignore_errors=True)
+    store_dir = tempfile.mkdtemp(prefix='bench_store_')
+    # Jangan ikut memigrasi data/*.json milik bot asli
+    store.LEGACY_CHAT_ID_FILE = store.LEGACY_WATCHLIST_FILE = os.path.join(store_dir, 'none.json')
+    store._store = store.Store(os.path.join(store_dir, 'bench.db'))
+    for chat_id in chat_ids:
+        store._store.subscribe(chat_id)
+    store._store.set_watchlist(codes)
+    # Jurnal kosong supaya semua sinyal dihitung baru (dan jurnal asli tidak tersentuh)
+    signal_journal._journal = signal_journal.SignalJournal(os.path.join(store_dir, 'signals.db'))
+
+    bot = StubBot(latency=args.send_latency)
+    context = types.SimpleNamespace(bot=bot)
+    try:
+        _, elapsed, memory = measure(asyncio.run, GapScanner(None).scan_and_alert(context))
+    finally:
+        close_coordinator()
+        shutdown_pools()
+        store._store.close()
+        store._store = None
+        signal_journal._journal.close()
+        signal_journal._journal = None
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return stage('end_to_end', elapsed, memory, bot.sent)
+
+def disable_rate_limits():
+    """Batas laju Telegram tidak relevan untuk bot tiruan"""
+    from utils import alert_sender
+    alert_sender.PER_CHAT_RATE = alert_sender.GROUP_RATE = 1e9
+    alert_sender._global_bucket = alert_sender.TokenBucket(1e9, capacity=1e9)
+    alert_sender._chat_buckets.clear()
+
+def print_report(report):
+    print(f"Fixture: {report['fixture']}")
+    for result in report['results']:
+        print(f"\n== {result['size']} ticker ({result['tickers_with_data']} berdata, {result['signals']} sinyal)")
+        print(f"{'stage':<12}{'detik':>10}{'RSS MB':>10}{'+RSS MB':>10}{'item':>8}{'item/detik':>12}")
+        for s in result['stages']:
+            rate = f"{s['items_per_sec']:.1f}" if s['items_per_sec'] is not None else '-'
+            print(f"{s['stage']:<12}{s['seconds']:>10.3f}{s['peak_rss_mb']:>10.1f}{s['rss_growth_mb']:>10.1f}"
+                  f"{s['items']:>8}{rate:>12}")
+    print(f"\nPeak RSS proses: {report['max_rss_mb']:.1f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scan gap down tanpa jaringan")
+    parser.add_argument('--sizes', default='50,500,5000', help="Ukuran watchlist, dipisah koma")
+    parser.add_argument('--fixture', default=FIXTURE_PATH, help="Path fixture CSV rekaman")
+    parser.add_argument('--record', action='store_true', help="Rekam fixture dari Yahoo lalu keluar")
+    parser.add_argument('--fetch-latency', type=float, default=0.0, help="Latency palsu per permintaan ke sumber data (detik)")
+    parser.add_argument('--send-latency', type=float, default=0.05, help="Latency bot tiruan per kirim (detik)")
+    parser.add_argument('--chats', type=int, default=10, help="Jumlah chat penerima alert")
+    parser.add_argument('--max-renders', type=int, default=20, help="Batas grafik yang dirender per ukuran")
+    parser.add_argument('--e2e-max', type=int, default=50, help="Ukuran maksimum untuk tes end-to-end")
+    parser.add_argument('--tracemalloc', action='store_true', help="Ukur peak alokasi Python per stage (lebih lambat)")
+    parser.add_argument('--json', default=None, help="Tulis hasil (JSON) ke file ini")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixture(args.fixture)
+        return
+
+    global TRACE_MEMORY
+    TRACE_MEMORY = args.tracemalloc
+    disable_rate_limits()
+    fixture, source = load_fixture(args.fixture)
+    results = [run_size(fixture, int(size), args) for size in args.sizes.split(',')]
+
+    report = {
+        'timestamp': pd.Timestamp.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'fixture': source,
+        'params': vars(args),
+        'results': results,
+        'max_rss_mb': _max_rss_mb(),
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Hasil JSON: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Uji beban mode webhook tanpa jaringan.
+
+Bot dijalankan dengan server webhook lokal (utils/webhook) dan Bot API tiruan
+(StandInRequest) yang menjawab semua panggilan secara lokal. Klien HTTP lokal
+mengirim update bersamaan: sebagian chat minta grafik (/cek_candle), sebagian
+/watchlist. Dilaporkan latency balasan per jenis command, jumlah update yang
+ditolak ("sibuk") dan apakah urutan per chat terjaga.
+
+Contoh:
+    python -m benchmarks.webhook_load                       # bandingkan sekuensial (0) vs antrian (8 worker)
+    python -m benchmarks.webhook_load --workers 8 --queue-size 10 --heavy-chats 20
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+BUSY_PREFIX = '⏳'
+
+# ---------------------------------------------------------------- tiruan
+
+def _stand_in_message(message_id, chat_id, text=None):
+    message = {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+    }
+    if text is not None:
+        message['text'] = text
+    return message
+
+def make_stand_in_request(latency=0.02):
+    """BaseRequest tiruan: menjawab Bot API secara lokal dan mencatat setiap kirim per chat"""
+    from telegram.request import BaseRequest
+
+    class StandInRequest(BaseRequest):
+        def __init__(self):
+            self.latency = latency
+            self.sent = {}          # chat_id -> [(detik, method, teks/caption)]
+            self._message_id = 0
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit('/', 1)[-1]
+            params = request_data.parameters if request_data is not None else {}
+            if endpoint == 'getMe':
+                result = {'id': 1, 'is_bot': True, 'first_name': 'Stand-in', 'username': 'standin_bot'}
+            elif endpoint.startswith(('send', 'edit')):
+                await asyncio.sleep(self.latency)
+                chat_id = int(params['chat_id'])
+                text = params.get('text', params.get('caption'))
+                self.sent.setdefault(chat_id, []).append((time.perf_counter(), endpoint, text))
+                self._message_id += 1
+                result = _stand_in_message(self._message_id, chat_id, text)
+            else:
+                result = True
+            return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    return StandInRequest()
+
+def make_update(update_id, chat_id, text):
+    command = text.split()[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+        },
+    }
+
+# ---------------------------------------------------------------- beban
+
+def _replies(sent, heavy):
+    """Balasan akhir per command: grafik/error untuk /cek_candle, pesan untuk /watchlist"""
+    for at, method, text in sent:
+        busy = (text or '').startswith(BUSY_PREFIX)
+        if busy or (method in ('sendPhoto', 'editMessageText') if heavy else method == 'sendMessage'):
+            yield at, text, busy
+
+def _summary(latencies):
+    if not latencies:
+        return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+    values = np.array(latencies)
+    return {
+        'count': len(values),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'max': float(values.max()),
+    }
+
+async def run_load(args):
+    import httpx
+    import base_bot
+    from benchmarks.scan_benchmark import load_fixture, make_universe, disable_rate_limits
+    from utils.data_source import FileSource, set_source
+    from utils.executor import shutdown_pools
+    from utils.webhook import WebhookServer
+    from utils.update_queue import UPDATE_WORKERS
+
+    disable_rate_limits()
+    fixture, _ = load_fixture()
+    heavy_chats = list(range(1000, 1000 + args.heavy_chats))
+    light_chats = list(range(2000, 2000 + args.light_chats))
+    universe = make_universe(fixture, args.heavy_chats * args.rounds)
+    codes = iter(code.replace('.JK', '') for code in universe)
+    set_source(FileSource(universe))
+
+    request = make_stand_in_request(args.send_latency)
+    application = base_bot.build_application(request=request)
+    server = WebhookServer(application, '127.0.0.1', 0, '/webhook', secret='stand-in-secret')
+    await application.initialize()
+    await application.start()
+    await server.start()
+
+    posted = {}   # chat_id -> [(detik, kode)]
+    update_ids = iter(range(1, 10 ** 9))
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(
+            base_url=f'http://127.0.0.1:{server.port}',
+            headers={'X-Telegram-Bot-Api-Secret-Token': 'stand-in-secret'},
+            limits=httpx.Limits(max_connections=40),
+        ) as client:
+            async def post(chat_id, text, code=None):
+                posted.setdefault(chat_id, []).append((time.perf_counter(), code))
+                response = await client.post('/webhook', json=make_update(next(update_ids), chat_id, text))
+                response.raise_for_status()
+
+            for _ in range(args.rounds):
+                batch = [post(chat, f'/cek_candle {code}', code) for chat, code in zip(heavy_chats, codes)]
+                batch += [post(chat, '/watchlist') for chat in light_chats]
+                await asyncio.gather(*batch)
+                await asyncio.sleep(args.interval)
+
+        expected = sum(len(items) for items in posted.values())
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            answered = sum(
+                len(list(_replies(request.sent.get(chat, []), chat in heavy_chats))) for chat in posted
+            )
+            if answered >= expected:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        await server.stop()
+        await application.stop()
+        await application.shutdown()
+        shutdown_pools(wait=False)
+
+    result = {'workers': UPDATE_WORKERS, 'seconds': elapsed, 'shed': 0, 'ordered': True, 'unanswered': 0}
+    for kind, chats in (('heavy', heavy_chats), ('light', light_chats)):
+        latencies = []
+        for chat in chats:
+            posts = posted.get(chat, [])
+            replies = list(_replies(request.sent.get(chat, []), kind == 'heavy'))
+            result['unanswered'] += max(len(posts) - len(replies), 0)
+            shed = sum(busy for _, _, busy in replies)
+            result['shed'] += shed
+            answered = [(at, text) for at, text, busy in replies if not busy]
+            if kind == 'heavy':
+                # Balasan "sibuk" datang di luar urutan; cocokkan grafik dengan kode di caption
+                sent_at = {code: at for at, code in posts}
+                order = [code for _, code in posts]
+                matched = [next((code for code in order if code in (text or '')), None) for _, text in answered]
+                latencies += [at - sent_at[code] for (at, _), code in zip(answered, matched) if code]
+                positions = [order.index(code) for code in matched if code]
+                result['ordered'] &= positions == sorted(positions)
+            elif not shed:
+                # /watchlist tidak membawa penanda: latency hanya dihitung jika tidak ada yang ditolak
+                latencies += [at - sent_at for (sent_at, _), (at, _) in zip(posts, answered)]
+        result[kind] = _summary(latencies)
+    return result
+
+def run_single(args):
+    print(json.dumps(asyncio.run(run_load(args))))
+
+def _fmt(value):
+    return f"{value * 1000:.0f}" if value is not None else '-'
+
+def print_report(results):
+    print(f"{'worker':>7}{'detik':>8}{'ringan p50/p95 ms':>20}{'berat p50/p95 ms':>19}{'ditolak':>9}{'urut':>6}")
+    for r in results:
+        light, heavy = r['light'], r['heavy']
+        print(f"{r['workers']:>7}{r['seconds']:>8.2f}"
+              f"{_fmt(light['p50']) + '/' + _fmt(light['p95']):>20}"
+              f"{_fmt(heavy['p50']) + '/' + _fmt(heavy['p95']):>19}"
+              f"{r['shed']:>9}{'ya' if r['ordered'] and not r['unanswered'] else 'TIDAK':>6}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Uji beban mode webhook dengan Bot API tiruan lokal")
+    parser.add_argument('--workers', default='0,8', help="UPDATE_WORKERS yang dibandingkan, dipisah koma (0 = sekuensial)")
+    parser.add_argument('--queue-size', type=int, default=100, help="UPDATE_QUEUE_SIZE")
+    parser.add_argument('--heavy-chats', type=int, default=6, help="Chat yang mengirim /cek_candle")
+    parser.add_argument('--light-chats', type=int, default=20, help="Chat yang mengirim /watchlist")
+    parser.add_argument('--rounds', type=int, default=3, help="Putaran kiriman per chat")
+    parser.add_argument('--interval', type=float, default=0.1, help="Jeda antar putaran (detik)")
+    parser.add_argument('--send-latency', type=float, default=0.02, help="Latency Bot API tiruan per kirim (detik)")
+    parser.add_argument('--timeout', type=float, default=120, help="Batas tunggu semua balasan (detik)")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--json', default=None, help="Tulis hasil (JSON) ke file ini")
+    args = parser.parse_args(argv)
+
+    if args.single:
+        run_single(args)
+        return
+
+    # Konfigurasi antrian dibaca saat import, jadi tiap mode dijalankan di proses sendiri
+    results = []
+    workdir = tempfile.mkdtemp(prefix='webhook_load_')
+    for workers in args.workers.split(','):
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=os.environ.get('TELEGRAM_BOT_TOKEN', '1:stand-in'),
+            UPDATE_WORKERS=workers.strip(),
+            UPDATE_QUEUE_SIZE=str(args.queue_size),
+            STORE_PATH=os.path.join(workdir, f'store_{workers.strip()}.db'),
+            BAR_CACHE_DIR=os.path.join(workdir, f'bars_{workers.strip()}'),
+        )
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.webhook_load', '--single', *(argv if argv is not None else sys.argv[1:])],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Hasil JSON: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,179 @@
 import pandas as pd
-import json
+import time
+import asyncio
 from telegram.constants import ParseMode
-from utils.data_fetcher import plot_candlestick
+from telegram.error import RetryAfter, TimedOut, NetworkError
+from utils.data_fetcher import render_chart
+from utils.metrics import metrics
+from utils.rules import get_rule
+from utils.store import get_store
 import os
-from datetime import datetime
 
-CHAT_ID_FILE = "data/chat_ids.json"
+# Batas kirim Telegram: ~30 pesan/detik global, 1 pesan/detik per chat, 20 pesan/menit per grup
+ALERT_CONCURRENCY = int(os.getenv('ALERT_CONCURRENCY', '10'))
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', str(20 / 60)))
+SEND_RETRIES = int(os.getenv('TELEGRAM_SEND_RETRIES', '3'))
+CHAT_BUCKET_IDLE = float(os.getenv('CHAT_BUCKET_IDLE', '60'))        # detik; bucket yang diam selama ini sudah penuh lagi
+CHAT_BUCKET_PRUNE_AT = int(os.getenv('CHAT_BUCKET_PRUNE_AT', '1000'))  # jumlah bucket sebelum yang diam dibuang
+
+class TokenBucket:
+    """Token bucket sederhana untuk membatasi laju kirim (async)"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+_global_bucket = TokenBucket(GLOBAL_RATE, capacity=GLOBAL_RATE)
+_chat_buckets = {}
+
+def _prune_chat_buckets():
+    """Buang bucket chat yang lama diam: isinya sudah penuh, sama dengan bucket baru"""
+    cutoff = time.monotonic() - CHAT_BUCKET_IDLE
+    idle = [chat_id for chat_id, bucket in _chat_buckets.items() if bucket.updated < cutoff and not bucket._lock.locked()]
+    for chat_id in idle:
+        del _chat_buckets[chat_id]
+
+def _chat_bucket(chat_id):
+    if chat_id not in _chat_buckets:
+        if len(_chat_buckets) >= CHAT_BUCKET_PRUNE_AT:
+            _prune_chat_buckets()
+        # chat_id negatif = grup/channel, limitnya lebih ketat
+        rate = GROUP_RATE if int(chat_id) < 0 else PER_CHAT_RATE
+        _chat_buckets[chat_id] = TokenBucket(rate)
+    return _chat_buckets[chat_id]
+
+async def _send_with_retry(bot, chat_id, text, photo=None):
+    """Kirim satu pesan dengan rate limit dan retry (RetryAfter / error jaringan).
+
+    TimedOut tidak diulang: request sudah terkirim dan pesan sering sudah
+    sampai, jadi kirim ulang berarti alert ganda. Exception-nya diteruskan.
+    """
+    for attempt in range(SEND_RETRIES + 1):
+        await _chat_bucket(chat_id).acquire()
+        await _global_bucket.acquire()
+        try:
+            with metrics.timer('telegram_send_seconds', kind='photo' if photo is not None else 'text'):
+                if photo is not None:
+                    return await bot.send_photo(
+                        chat_id=chat_id,
+                        photo=photo,
+                        caption=text,
+                        parse_mode=ParseMode.HTML
+                    )
+                return await bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode=ParseMode.HTML
+                )
+        except RetryAfter as e:
+            metrics.inc('telegram_send_retries_total', reason='retry_after')
+            if attempt == SEND_RETRIES:
+                raise
+            retry_after = e.retry_after
+            if hasattr(retry_after, 'total_seconds'):
+                retry_after = retry_after.total_seconds()
+            await asyncio.sleep(retry_after)
+        except TimedOut:
+            raise  # mungkin sudah terkirim (TimedOut adalah subclass NetworkError, jadi dicek dulu)
+        except NetworkError:
+            metrics.inc('telegram_send_retries_total', reason='network')
+            if attempt == SEND_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+async def broadcast(bot, chat_ids, text, photo=None, label=""):
+    """Kirim pesan/foto ke banyak chat secara paralel dengan rate limit.
+
+    Foto (bytes) di-upload sekali saja; penerima berikutnya memakai file_id
+    yang dikembalikan Telegram. Mengembalikan dict ringkasan pengiriman;
+    kiriman yang TimedOut dihitung `uncertain` (mungkin sudah sampai).
+    """
+    started = time.perf_counter()
+    remaining = list(chat_ids)
+    sent, failed, uncertain = 0, 0, 0
+
+    # Upload foto ke penerima pertama yang berhasil, lalu pakai file_id-nya
+    if photo is not None:
+        file_id = None
+        while remaining and file_id is None:
+            chat_id = remaining.pop(0)
+            try:
+                message = await _send_with_retry(bot, chat_id, text, photo=photo)
+                file_id = message.photo[-1].file_id
+                sent += 1
+            except TimedOut as e:
+                uncertain += 1
+                print(f"⚠️ Timeout kirim ke {chat_id}, tidak diulang (mungkin sudah terkirim): {str(e)}")
+            except Exception as e:
+                failed += 1
+                print(f"[ERROR] Gagal kirim ke {chat_id}: {str(e)}")
+        photo = file_id
+
+    semaphore = asyncio.Semaphore(ALERT_CONCURRENCY)
+
+    async def send_one(chat_id):
+        async with semaphore:
+            try:
+                await _send_with_retry(bot, chat_id, text, photo=photo)
+                return 'sent'
+            except TimedOut as e:
+                print(f"⚠️ Timeout kirim ke {chat_id}, tidak diulang (mungkin sudah terkirim): {str(e)}")
+                return 'uncertain'
+            except Exception as e:
+                print(f"[ERROR] Gagal kirim ke {chat_id}: {str(e)}")
+                return 'failed'
+
+    results = await asyncio.gather(*(send_one(chat_id) for chat_id in remaining))
+    sent += results.count('sent')
+    uncertain += results.count('uncertain')
+    failed += results.count('failed')
+
+    elapsed = time.perf_counter() - started
+    metrics.observe('alert_broadcast_seconds', elapsed)
+    metrics.inc('telegram_sent_total', sent)
+    metrics.inc('telegram_send_failures_total', failed)
+    metrics.inc('telegram_send_uncertain_total', uncertain)
+    print(f"[ALERT] {label}: {sent}/{sent + failed + uncertain} terkirim"
+          f"{f', {uncertain} timeout' if uncertain else ''} dalam {elapsed:.2f}s")
+    return {'sent': sent, 'failed': failed, 'uncertain': uncertain, 'elapsed': elapsed}
 
 def load_chat_ids():
     try:
-        with open(CHAT_ID_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        return get_store().subscribers()
+    except Exception as e:
+        print(f"[ERROR] Gagal baca chat_id: {str(e)}")
         return []
 
-async def send_signal_alert(context, stock_code, signal_data):
+async def send_signal_alert(context, stock_code, signal_data, chart=None, chat_ids=None):
+    """Kirim alert sinyal ke chat_ids (default: semua chat terdaftar).
+
+    `chart` = PNG (bytes) yang sudah dirender oleh pipeline scan; jika None,
+    grafik dibuat dari `signal_data` (DataFrame) di sini. Mengembalikan
+    ringkasan broadcast, atau None jika tidak ada yang dikirim / terjadi error.
+    """
     try:
         # Dapatkan semua chat_id yang terdaftar
-        chat_ids = load_chat_ids()
+        if chat_ids is None:
+            chat_ids = load_chat_ids()
         if not chat_ids:
             print("[ERROR] Tidak ada chat_id tersimpan!")
-            return
+            return None
 
         # Proses data sinyal
         if isinstance(signal_data, pd.DataFrame):
@@ -37,49 +190,21 @@ async def send_signal_alert(context, stock_code, signal_data):
             f"Tanggal: {date.strftime('%Y-%m-%d')}\n"
             f"Harga: Rp. {last_row['Close']:,.0f}\n"
             f"Gap: {last_row.get('Gap_pct', 0):.2f}%\n"
-            f"Akumulasi Bandar: ✅"
+            f"Akumulasi Bandar: {'✅' if last_row.get('OBV_Change', 1) > 0 else '❌'}"
         )
+        if 'Rules' in last_row:
+            # Sinyal dari rule engine: sebutkan rule yang memicu
+            rules = [get_rule(name) for name in last_row['Rules']]
+            message += "\nSinyal: " + ", ".join(rule.description for rule in rules if rule is not None)
 
-        # Siapkan data grafik
-        plot_data = signal_data[['Open','High','Low','Close','Volume']].copy() if isinstance(signal_data, pd.DataFrame) \
-                   else pd.DataFrame(signal_data).T[['Open','High','Low','Close','Volume']]
-        
-        # Pastikan tipe data benar
-        plot_data = plot_data.astype({
-            'Open': float,
-            'High': float,
-            'Low': float,
-            'Close': float,
-            'Volume': int
-        })
-
-        # Generate grafik
-        chart_file = plot_candlestick(plot_data, stock_code)
+        # Siapkan grafik jika belum dirender oleh pipeline
+        photo = chart
+        if photo is None and isinstance(signal_data, pd.DataFrame):
+            photo = await render_chart(signal_data, stock_code)
 
         # Kirim ke semua chat_id
-        for chat_id in chat_ids:
-            try:
-                if chart_file:
-                    with open(chart_file, 'rb') as photo:
-                        await context.bot.send_photo(
-                            chat_id=chat_id,
-                            photo=photo,
-                            caption=message,
-                            parse_mode=ParseMode.HTML
-                        )
-                else:
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=message,
-                        parse_mode=ParseMode.HTML
-                    )
-            except Exception as e:
-                print(f"[ERROR] Gagal kirim ke {chat_id}: {str(e)}")
-
-        # Bersihkan file grafik jika ada
-        if chart_file and os.path.exists(chart_file):
-            os.remove(chart_file)
+        return await broadcast(context.bot, chat_ids, message, photo=photo, label=stock_code)
 
     except Exception as e:
         print(f"[ALERT ERROR] {str(e)}")
-        print(f"[DEBUG DATA] Last row: {last_row.to_dict() if 'last_row' in locals() else 'No data'}")
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""Backtest strategi gap down + akumulasi OBV atas histori cache.
+
+Contoh:
+    python -m utils.backtest --period 5y --thresholds 0.02,1,2,3,5 --horizons 1,3,5,10
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.market_store import MarketStore
+
+def forward_returns(close, horizons):
+    """Return close-to-close N hari ke depan, bentuk [n_horizons, n_dates, n_tickers]"""
+    result = np.full((len(horizons),) + close.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, n in enumerate(horizons):
+            result[i, :-n] = close[n:] / close[:-n] - 1
+    return result
+
+def forward_drawdowns(close, low, horizons):
+    """Penurunan terdalam (Low terendah vs harga masuk) selama N hari ke depan"""
+    result = np.full((len(horizons),) + close.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, n in enumerate(horizons):
+            if n >= len(close):
+                continue
+            # jendela Low[t+1 .. t+n] untuk setiap t
+            window_low = sliding_window_view(low[1:], n, axis=0).min(axis=-1)
+            result[i, :len(window_low)] = np.minimum(window_low / close[:len(window_low)] - 1, 0)
+    return result
+
+def signal_cube(indicators, thresholds):
+    """Mask sinyal untuk semua threshold sekaligus, bentuk [n_thresholds, n_dates, n_tickers]"""
+    thresholds = np.asarray(thresholds, dtype=float)[:, None, None]
+    with np.errstate(invalid='ignore'):
+        accumulation = indicators['OBV_Change'] > 0
+        return (indicators['Gap_pct'][None] <= -thresholds) & accumulation[None]
+
+def run_backtest(frames, thresholds=(0.02, 1, 2, 3, 5), horizons=(1, 3, 5, 10)):
+    """Hitung statistik sinyal untuk setiap kombinasi threshold × horizon.
+
+    Mengembalikan DataFrame ringkasan (satu baris per threshold/horizon):
+    jumlah sinyal, rata-rata & median return, hit rate, rata-rata dan
+    terburuk drawdown. Threshold memakai satuan yang sama dengan detect_gap_down (persen).
+    """
+    store = MarketStore.from_frames(frames)
+    indicators = store.indicators()
+    close, low = store.field('Close').astype(float), store.field('Low').astype(float)
+    horizons = list(horizons)
+    thresholds = list(thresholds)
+
+    returns = forward_returns(close, horizons)
+    drawdowns = forward_drawdowns(close, low, horizons)
+    mask = signal_cube(indicators, thresholds)
+
+    # Ratakan ke [threshold, sel] dan [horizon, sel] supaya agregasi cukup perkalian matriks
+    flat_mask = mask.reshape(len(thresholds), -1)
+    flat_returns = returns.reshape(len(horizons), -1)
+    flat_drawdowns = drawdowns.reshape(len(horizons), -1)
+    has_outcome = ~np.isnan(flat_returns)
+
+    counts = flat_mask.astype(float) @ has_outcome.T.astype(float)
+    sum_returns = flat_mask.astype(float) @ np.nan_to_num(flat_returns).T
+    hits = flat_mask.astype(float) @ (np.nan_to_num(flat_returns) > 0).T.astype(float)
+    sum_drawdowns = flat_mask.astype(float) @ np.nan_to_num(flat_drawdowns).T
+
+    rows = []
+    for t, threshold in enumerate(thresholds):
+        for h, horizon in enumerate(horizons):
+            selected = flat_mask[t] & has_outcome[h]
+            n = counts[t, h]
+            rows.append({
+                'threshold': threshold,
+                'horizon': horizon,
+                'signals': int(flat_mask[t].sum()),
+                'evaluated': int(n),
+                'avg_return_pct': sum_returns[t, h] / n * 100 if n else np.nan,
+                'median_return_pct': np.median(flat_returns[h, selected]) * 100 if n else np.nan,
+                'hit_rate_pct': hits[t, h] / n * 100 if n else np.nan,
+                'avg_drawdown_pct': sum_drawdowns[t, h] / n * 100 if n else np.nan,
+                'worst_drawdown_pct': np.nanmin(flat_drawdowns[h, selected]) * 100 if n else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+def signal_table(frames, threshold=0.02, horizons=(1, 3, 5, 10)):
+    """Daftar setiap sinyal beserta return dan drawdown ke depan untuk satu threshold"""
+    store = MarketStore.from_frames(frames)
+    indicators = store.indicators()
+    close, low = store.field('Close').astype(float), store.field('Low').astype(float)
+    horizons = list(horizons)
+    returns = forward_returns(close, horizons)
+    drawdowns = forward_drawdowns(close, low, horizons)
+    rows, cols = np.nonzero(signal_cube(indicators, [threshold])[0])
+
+    table = pd.DataFrame({
+        'Date': store.dates[rows],
+        'Ticker': np.asarray(store.tickers, dtype=object)[cols],
+        'Close': close[rows, cols],
+        'Gap_pct': indicators['Gap_pct'][rows, cols],
+        'OBV_Change': indicators['OBV_Change'][rows, cols],
+    })
+    for h, horizon in enumerate(horizons):
+        table[f'Return_{horizon}d_pct'] = returns[h, rows, cols] * 100
+        table[f'Drawdown_{horizon}d_pct'] = drawdowns[h, rows, cols] * 100
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest sinyal gap down + akumulasi OBV")
+    parser.add_argument('--period', default='5y', help="Panjang histori (format yfinance, default 5y)")
+    parser.add_argument('--thresholds', default='0.02,1,2,3,5', help="Daftar threshold gap (persen)")
+    parser.add_argument('--horizons', default='1,3,5,10', help="Daftar horizon return (hari bursa)")
+    parser.add_argument('--tickers', default=None, help="Kode saham dipisah koma (default: watchlist)")
+    parser.add_argument('--signals-csv', default=None, help="Simpan daftar sinyal (threshold pertama) ke CSV")
+    args = parser.parse_args(argv)
+
+    from utils.data_fetcher import get_bulk_stock_data
+    from utils.watchlist_manager import load_watchlist
+
+    tickers = args.tickers.split(',') if args.tickers else load_watchlist()
+    thresholds = [float(x) for x in args.thresholds.split(',')]
+    horizons = [int(x) for x in args.horizons.split(',')]
+
+    started = time.perf_counter()
+    frames = get_bulk_stock_data(tickers, period=args.period)
+    fetched = time.perf_counter()
+    summary = run_backtest(frames, thresholds, horizons)
+    finished = time.perf_counter()
+
+    print(f"Data: {len(frames)}/{len(tickers)} ticker, periode {args.period} "
+          f"(fetch {fetched - started:.2f}s, backtest {finished - fetched:.3f}s)")
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    if args.signals_csv:
+        signal_table(frames, thresholds[0], horizons).to_csv(args.signals_csv, index=False)
+        print(f"Daftar sinyal disimpan ke {args.signals_csv}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from utils import indicator_state
+
+# Lokasi & kebijakan cache bar harian (bisa diatur lewat .env)
+BAR_CACHE_DIR = os.getenv('BAR_CACHE_DIR', 'data/bars')
+BAR_CACHE_TTL = int(os.getenv('BAR_CACHE_TTL', '900'))                 # detik, bar dianggap segar
+BAR_CACHE_MAX_DAYS = int(os.getenv('BAR_CACHE_MAX_DAYS', str(5 * 366)))  # batas panjang histori
+
+# Satu file .npy per ticker: structured array kolumnar, bisa di-mmap
+BAR_DTYPE = np.dtype([
+    ('date', '<i8'),     # datetime64[ns] sebagai int64
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+])
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _key(stock_code):
+    return stock_code.upper().replace('.JK', '')
+
+def _lock(stock_code):
+    with _locks_guard:
+        return _locks.setdefault(_key(stock_code), threading.Lock())
+
+def _bars_path(stock_code):
+    return os.path.join(BAR_CACHE_DIR, f"{_key(stock_code)}.npy")
+
+def _meta_path(stock_code):
+    return os.path.join(BAR_CACHE_DIR, f"{_key(stock_code)}.json")
+
+def _state_path(stock_code):
+    return os.path.join(BAR_CACHE_DIR, f"{_key(stock_code)}.state.json")
+
+def _atomic_write(path, write_func, mode='wb'):
+    """Tulis ke file sementara lalu rename, supaya pembaca tidak melihat file setengah jadi"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode) as f:
+        write_func(f)
+    os.replace(tmp_path, path)
+
+def history_cutoff(now=None):
+    """Tanggal paling awal yang masih disimpan di cache"""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    return (now - pd.Timedelta(days=BAR_CACHE_MAX_DAYS)).normalize()
+
+def period_start(period, now=None):
+    """Konversi period gaya yfinance ('5d', '1mo', '1y', 'ytd', 'max') ke tanggal awal"""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    today = now.normalize()
+    period = period.lower()
+
+    if period == 'max':
+        start = history_cutoff(now)
+    elif period == 'ytd':
+        start = pd.Timestamp(year=today.year, month=1, day=1)
+    elif period.endswith('mo'):
+        start = today - pd.DateOffset(months=int(period[:-2]))
+    elif period.endswith('wk'):
+        start = today - pd.DateOffset(weeks=int(period[:-2]))
+    elif period.endswith('y'):
+        start = today - pd.DateOffset(years=int(period[:-1]))
+    elif period.endswith('d'):
+        start = today - pd.DateOffset(days=int(period[:-1]))
+    else:
+        raise ValueError(f"Period tidak dikenal: {period}")
+
+    # Histori di luar batas cache tidak pernah disimpan
+    return max(start, history_cutoff(now))
+
+def load_meta(stock_code):
+    try:
+        with open(_meta_path(stock_code), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def load_state(stock_code):
+    """State indikator (close, OBV, AD terakhir) ticker ini, None jika belum ada"""
+    try:
+        with open(_state_path(stock_code), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def load_bars(stock_code):
+    """Muat bar dari cache sebagai DataFrame OHLCV, atau None jika belum ada"""
+    try:
+        bars = np.load(_bars_path(stock_code), mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+
+    index = pd.DatetimeIndex(np.asarray(bars['date']).astype('datetime64[ns]'))
+    return pd.DataFrame({
+        'Open': np.array(bars['open']),
+        'High': np.array(bars['high']),
+        'Low': np.array(bars['low']),
+        'Close': np.array(bars['close']),
+        'Volume': np.array(bars['volume']),
+    }, index=index)
+
+def _to_records(data):
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    records = np.empty(len(data), dtype=BAR_DTYPE)
+    records['date'] = index.values.astype('datetime64[ns]').astype('<i8')
+    records['open'] = data['Open'].to_numpy(dtype=float)
+    records['high'] = data['High'].to_numpy(dtype=float)
+    records['low'] = data['Low'].to_numpy(dtype=float)
+    records['close'] = data['Close'].to_numpy(dtype=float)
+    records['volume'] = data['Volume'].to_numpy(dtype=np.int64)
+    return records
+
+def merge_bars(stock_code, new_data, since=None):
+    """Gabungkan bar baru ke cache (bar tanggal sama ditimpa) lalu simpan.
+
+    `since` = tanggal awal yang diminta saat download untuk ticker ini, dipakai
+    untuk menandai sejauh mana histori ticker ini sudah lengkap; bar baru
+    sebelum `since` (batch bulk memakai tanggal awal paling awal di batch)
+    dibuang supaya tidak dianggap revisi histori. State indikator ikut
+    diperbarui secara inkremental (hanya dipakai intraday; scan harian tetap
+    menghitung indikator dari bar penuh). Mengembalikan DataFrame hasil gabungan.
+    """
+    with _lock(stock_code):
+        old = load_bars(stock_code)
+        changed_from = None
+        if new_data is not None and not new_data.empty:
+            new_data = new_data.copy()
+            if new_data.index.tz is not None:
+                new_data.index = new_data.index.tz_localize(None)
+            if since is not None:
+                new_data = new_data[new_data.index >= pd.Timestamp(since)]
+        if new_data is not None and not new_data.empty:
+            changed_from = new_data.index.min()
+            merged = new_data if old is None else pd.concat([old, new_data])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        else:
+            merged = old if old is not None else pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+        cutoff = history_cutoff()
+        merged = merged[merged.index >= cutoff]
+
+        meta = load_meta(stock_code)
+        if since is not None:
+            since = max(pd.Timestamp(since), cutoff)
+            if 'since' not in meta or since < pd.Timestamp(meta['since']):
+                meta['since'] = since.strftime('%Y-%m-%d')
+        if 'since' in meta and pd.Timestamp(meta['since']) < cutoff:
+            meta['since'] = cutoff.strftime('%Y-%m-%d')
+        meta['refreshed'] = time.time()
+
+        os.makedirs(BAR_CACHE_DIR, exist_ok=True)
+        records = _to_records(merged)
+        _atomic_write(_bars_path(stock_code), lambda f: np.save(f, records))
+        _atomic_write(_meta_path(stock_code), lambda f: json.dump(meta, f), mode='w')
+
+        old_state = load_state(stock_code)
+        state = indicator_state.advance(old_state, merged, changed_from)
+        if state is not None and state is not old_state:
+            _atomic_write(_state_path(stock_code), lambda f: json.dump(state, f), mode='w')
+        return merged
+
+def is_fresh(stock_code, meta=None):
+    """True jika cache di-refresh kurang dari BAR_CACHE_TTL detik yang lalu"""
+    meta = load_meta(stock_code) if meta is None else meta
+    return time.time() - meta.get('refreshed', 0) < BAR_CACHE_TTL
+
+def covers(stock_code, start, meta=None):
+    """True jika histori cache sudah mencakup sejak tanggal `start`"""
+    meta = load_meta(stock_code) if meta is None else meta
+    return 'since' in meta and pd.Timestamp(meta['since']) <= pd.Timestamp(start)
+
+def slice_period(data, period):
+    """Ambil potongan bar sesuai period dari data cache"""
+    if data is None:
+        return None
+    return data[data.index >= period_start(period)].copy()
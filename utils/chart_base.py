@@ -0,0 +1,268 @@
+import io
+import os
+import json
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+from utils.bar_cache import _atomic_write
+from utils.data_fetcher import REQUIRED_COLS, CHART_WINDOW, get_chart_style, get_bulk_stock_data
+from utils.executor import run_io, run_cpu, CPU_WORKERS
+from utils.metrics import metrics
+
+# Lapisan dasar grafik alert: style, sumbu, judul & candle historis dirender setelah
+# penutupan bursa; saat alert pagi hanya bar baru yang digambar lalu di-encode PNG
+CHART_BASE_DIR = os.getenv('CHART_BASE_DIR', 'data/chart_base')
+CHART_BASE_HEADROOM = float(os.getenv('CHART_BASE_HEADROOM', '0.3'))                # ruang harga atas/bawah, x rentang harga historis
+CHART_BASE_VOLUME_HEADROOM = float(os.getenv('CHART_BASE_VOLUME_HEADROOM', '1.6'))  # batas sumbu volume, x volume historis maks.
+CHART_PNG_COMPRESSION = int(os.getenv('CHART_PNG_COMPRESSION', '1'))                # zlib level 0-9 saat encode hasil komposit
+
+# Lapisan dasar disimpan sebagai PNG berpalet (1 byte/piksel): encode ulang ~3x lebih cepat
+# dari RGB. Slot terakhir palet dipesan untuk warna bar baru supaya warnanya persis.
+BAR_PARTS = ('body', 'edge', 'wick', 'volume', 'volume_edge')
+PALETTE_COLORS = 256 - 2 * len(BAR_PARTS)
+
+def _key(stock_code):
+    return stock_code.upper().replace('.JK', '')
+
+def _base_path(stock_code, style, ext):
+    return os.path.join(CHART_BASE_DIR, f"{_key(stock_code)}.{style}.{ext}")
+
+def _rgb(color, alpha=1.0):
+    """Warna matplotlib -> RGB 0-255, alpha di-blend ke latar putih"""
+    from matplotlib.colors import to_rgb
+
+    return [round(255 * (1 - alpha + alpha * channel)) for channel in to_rgb(color)]
+
+def build_base_layer(data, stock_code, next_date, window=CHART_WINDOW, style='default'):
+    """Render lapisan dasar grafik `window` bar untuk bar `next_date` yang belum ada.
+
+    Dipanggil di worker CPU. Tampilannya sama dengan render_candlestick,
+    tapi slot bar terakhir dibiarkan kosong dan skala sumbu diberi ruang
+    untuk bar baru. Mengembalikan (PNG berpalet bytes, meta) dengan meta
+    berisi pemetaan harga/volume -> piksel dan indeks palet warna candle.
+    """
+    import mplfinance as mpf
+    from PIL import Image
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    history = data[REQUIRED_COLS].tail(window - 1).astype(float)
+    next_date = pd.Timestamp(next_date).normalize()
+    frame = history.reindex(history.index.append(pd.DatetimeIndex([next_date])))  # slot bar baru = NaN
+
+    fig, axes = mpf.plot(
+        frame,
+        type='candle',
+        style=get_chart_style(style),
+        title=f'\n{stock_code} | {next_date.strftime("%d %b %Y")}',
+        ylabel='Harga (IDR)',
+        ylabel_lower='Volume',
+        volume=True,
+        figratio=(12, 6),
+        tight_layout=True,
+        show_nontrading=False,
+        returnfig=True,
+    )
+    try:
+        price_ax, volume_ax = axes[0], axes[2]
+        low, high = float(history['Low'].min()), float(history['High'].max())
+        pad = (high - low) * CHART_BASE_HEADROOM or high * 0.05
+        price_limits = (low - pad, high + pad)
+        volume_limit = float(history['Volume'].max()) * CHART_BASE_VOLUME_HEADROOM or 1.0
+        price_ax.set_ylim(*price_limits)
+        volume_ax.set_ylim(0, volume_limit)
+
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+        pixels = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        height = pixels.shape[0]
+
+        def linear(ax, x0, x1, y0, y1):
+            # Koordinat display matplotlib (origin kiri bawah) -> baris/kolom piksel
+            (px0, py0), (px1, py1) = ax.transData.transform([(x0, y0), (x1, y1)])
+            return [px0, (px1 - px0) / (x1 - x0), height - py0, -(py1 - py0) / (y1 - y0), y0]
+
+        slot = window - 1
+        scale = fig.dpi / 72
+        wicks, bodies = price_ax.collections[0], price_ax.collections[1]
+        body_half = float(np.ptp(bodies.get_paths()[0].vertices[:, 0])) / 2
+        volume_half = volume_ax.patches[0].get_width() / 2 if volume_ax.patches else 0.49
+        marketcolors = get_chart_style(style)['marketcolors']
+        alpha = marketcolors.get('alpha', 1.0)
+        image = Image.fromarray(np.ascontiguousarray(pixels)).quantize(PALETTE_COLORS, dither=Image.Dither.NONE)
+        palette = image.getpalette()[:PALETTE_COLORS * 3]
+        colors = {}
+        for direction in ('up', 'down'):
+            colors[direction] = {}
+            for part, color, part_alpha in (
+                ('body', marketcolors['candle'][direction], alpha),
+                ('edge', marketcolors['edge'][direction], 1.0),
+                ('wick', marketcolors['wick'][direction], 1.0),
+                ('volume', marketcolors['volume'][direction], 1.0),
+                ('volume_edge', marketcolors['vcedge'][direction], 1.0),
+            ):
+                colors[direction][part] = len(palette) // 3
+                palette += _rgb(color, part_alpha)
+        image.putpalette(palette)
+        meta = {
+            'code': _key(stock_code),
+            'style': style,
+            'window': window,
+            'next_date': next_date.strftime('%Y-%m-%d'),
+            'last_date': history.index[-1].strftime('%Y-%m-%d'),
+            'last_close': float(history['Close'].iloc[-1]),
+            'price_limits': list(price_limits),
+            'volume_limit': volume_limit,
+            'price': linear(price_ax, slot - 1, slot, *price_limits),
+            'volume': linear(volume_ax, slot - 1, slot, 0.0, volume_limit),
+            'body_half': body_half,
+            'volume_half': volume_half,
+            'wick_px': float(wicks.get_linewidths()[0]) * scale,
+            'edge_px': float(bodies.get_linewidths()[0]) * scale,
+            'volume_edge_px': (volume_ax.patches[0].get_linewidth() * scale) if volume_ax.patches else 0.0,
+            'colors': colors,
+        }
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=CHART_PNG_COMPRESSION)
+        return buffer.getvalue(), meta
+    finally:
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+
+def save_base(png, meta):
+    os.makedirs(CHART_BASE_DIR, exist_ok=True)
+    _atomic_write(_base_path(meta['code'], meta['style'], 'png'), lambda f: f.write(png))
+    _atomic_write(_base_path(meta['code'], meta['style'], 'json'), lambda f: json.dump(meta, f), mode='w')
+
+def load_base(stock_code, style='default'):
+    """(meta, PIL Image berpalet) lapisan dasar tersimpan, None jika belum ada"""
+    from PIL import Image
+
+    try:
+        with open(_base_path(stock_code, style, 'json'), 'r') as f:
+            meta = json.load(f)
+        image = Image.open(_base_path(stock_code, style, 'png'))
+        image.load()
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return None
+    return meta, image
+
+def prune_bases(keep_codes):
+    """Hapus lapisan dasar ticker yang tidak lagi dipantau"""
+    keep = {_key(code) for code in keep_codes}
+    if not os.path.isdir(CHART_BASE_DIR):
+        return
+    for name in os.listdir(CHART_BASE_DIR):
+        if name.split('.', 1)[0] not in keep:
+            os.remove(os.path.join(CHART_BASE_DIR, name))
+
+def _fill(pixels, rows, cols, color):
+    """Isi persegi [rows) x [cols) dengan indeks palet `color`"""
+    height, width = pixels.shape
+    r0, r1 = max(int(rows[0]), 0), min(int(rows[1]), height)
+    c0, c1 = max(int(cols[0]), 0), min(int(cols[1]), width)
+    if r0 < r1 and c0 < c1:
+        pixels[r0:r1, c0:c1] = color
+
+def _box(pixels, top, bottom, left, right, face, edge, edge_px):
+    """Persegi berisi `face` dengan garis tepi `edge` setebal `edge_px` (koordinat piksel float)"""
+    top, bottom = round(top), max(round(bottom), round(top) + 1)
+    left, right = round(left), max(round(right), round(left) + 1)
+    _fill(pixels, (top, bottom), (left, right), face)
+    line = max(round(edge_px), 1) if edge_px > 0 else 0
+    if line:
+        _fill(pixels, (top, top + line), (left, right), edge)
+        _fill(pixels, (bottom - line, bottom), (left, right), edge)
+        _fill(pixels, (top, bottom), (left, left + line), edge)
+        _fill(pixels, (top, bottom), (right - line, right), edge)
+
+def compose_chart(meta, base, bar):
+    """Gambar bar baru (dict OHLCV) di atas lapisan dasar, kembalikan PNG bytes.
+
+    None jika bar keluar dari skala sumbu lapisan dasar (perlu render penuh).
+    """
+    from PIL import Image
+
+    o, h, l, c, v = (float(bar[field]) for field in REQUIRED_COLS)
+    price_low, price_high = meta['price_limits']
+    if not (price_low <= l <= h <= price_high and 0 <= v <= meta['volume_limit']):
+        return None
+
+    x0, x_scale, y0, y_scale, y_ref = meta['price']
+    x = x0 + x_scale                                   # pusat slot bar baru
+    row = lambda price: y0 + (price - y_ref) * y_scale  # noqa: E731
+    colors = meta['colors']['up' if c >= o else 'down']
+    image = np.array(base)  # indeks palet [baris, kolom], salinan
+
+    wick_half = max(meta['wick_px'], 1) / 2
+    _fill(image, (round(row(h)), round(row(l)) + 1), (round(x - wick_half), round(x + wick_half)), colors['wick'])
+    body = meta['body_half'] * x_scale
+    _box(image, row(max(o, c)), row(min(o, c)), x - body, x + body, colors['body'], colors['edge'], meta['edge_px'])
+
+    vx0, vx_scale, vy0, vy_scale, vy_ref = meta['volume']
+    vx = vx0 + vx_scale
+    half = meta['volume_half'] * vx_scale
+    _box(image, vy0 + (v - vy_ref) * vy_scale, vy0, vx - half, vx + half,
+         colors['volume'], colors['volume_edge'], meta['volume_edge_px'])
+
+    composed = Image.fromarray(image)  # mode L -> P oleh putpalette
+    composed.putpalette(base.getpalette())
+    buffer = io.BytesIO()
+    composed.save(buffer, format='PNG', compress_level=CHART_PNG_COMPRESSION)
+    return buffer.getvalue()
+
+def _compose_from_base(data, stock_code, window, style):
+    loaded = load_base(stock_code, style)
+    if loaded is None:
+        return None, 'miss'
+    meta, base = loaded
+    data = data[REQUIRED_COLS].tail(window)
+    try:
+        if (
+            meta['window'] != window
+            or len(data) < 2
+            or data.index[-1].strftime('%Y-%m-%d') != meta['next_date']
+            or data.index[-2].strftime('%Y-%m-%d') != meta['last_date']
+            or not np.isclose(float(data['Close'].iloc[-2]), meta['last_close'], rtol=1e-4)
+        ):
+            return None, 'stale'
+        png = compose_chart(meta, base, data.iloc[-1])
+    except Exception as e:
+        print(f"⚠️ Error komposit grafik {stock_code}: {str(e)}")
+        return None, 'error'
+    return png, 'hit' if png is not None else 'out_of_range'
+
+def compose_from_base(data, stock_code, window=CHART_WINDOW, style='default'):
+    """Grafik dari lapisan dasar tersimpan bila cocok dengan `data`, selain itu None.
+
+    Cocok = bar terakhir `data` adalah bar yang disiapkan lapisan dasar dan
+    bar sebelumnya (tanggal & close) sama dengan histori yang dirender.
+    Durasi dicatat ke chart_compose_seconds dengan label hasil (hit, miss,
+    stale, out_of_range, error), jadi kuantil `hit` = biaya komposit sebenarnya.
+    """
+    started = time.perf_counter()
+    png, result = _compose_from_base(data, stock_code, window, style)
+    metrics.observe('chart_compose_seconds', time.perf_counter() - started, result=result)
+    metrics.inc('chart_base_requests_total', result=result)
+    return png
+
+async def precompute_chart_bases(stock_codes, next_date, period='1mo', window=CHART_WINDOW, style='default'):
+    """Siapkan lapisan dasar grafik untuk `stock_codes` (setelah penutupan), kembalikan jumlah yang tersimpan"""
+    frames = await run_io(get_bulk_stock_data, list(stock_codes), period=period)
+    semaphore = asyncio.Semaphore(max(CPU_WORKERS, 1))
+
+    async def build(code, data):
+        async with semaphore:
+            try:
+                png, meta = await run_cpu(build_base_layer, data, code, next_date, window, style)
+                await run_io(save_base, png, meta)
+                return True
+            except Exception as e:
+                print(f"⚠️ Error lapisan dasar grafik {code}: {str(e)}")
+                return False
+
+    results = await asyncio.gather(*(
+        build(code, data) for code, data in frames.items() if len(data) >= 2
+    ))
+    await run_io(prune_bases, stock_codes)
+    return sum(results)
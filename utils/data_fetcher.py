@@ -1,70 +1,205 @@
-import yfinance as yf
-import mplfinance as mpf
 import pandas as pd
+import io
 import os
-from datetime import datetime
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from utils import bar_cache
+from utils.data_source import get_source, DataSourceError
+from utils.market_calendar import MARKET_TZ
+from utils.executor import run_io, run_cpu
+from utils.metrics import metrics
+
+# Jumlah ticker per permintaan ke sumber data pada mode bulk
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '50'))
+
+REQUIRED_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Jumlah grafik PNG yang disimpan di cache memori
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '128'))
+CHART_WINDOW = 30  # jumlah bar default di grafik
+
+def _clean_ohlcv(data):
+    """Standarkan kolom dan tipe data OHLCV dari sumber data"""
+    # Bersihkan multi-level columns jika ada
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.droplevel(0)
+
+    # Pastikan kolom nya standar
+    data = data.rename(columns={
+        'price': 'Close',
+        'open': 'Open',
+        'high': 'High',
+        'low': 'Low',
+        'volume': 'Volume'
+    })
+
+    # Pastikan kolom penting ada, buang baris kosong sebelum konversi tipe
+    data = data[REQUIRED_COLS].dropna().copy()
+
+    # Konversi tipe
+    data[['Open', 'High', 'Low', 'Close']] = data[['Open', 'High', 'Low', 'Close']].astype(float)
+    data['Volume'] = data['Volume'].astype(int)
+
+    return data
 
 def get_stock_data(stock_code, period='1mo'):
-    """Ambil data dan bersihkan struktur kolom"""
-    """Handle baik 1 ticker maupun banyak ticker."""
-    tickers = [stock_code] if isinstance(stock_code, str) else stock_code
+    """Ambil data dan bersihkan struktur kolom.
 
-    try:
-        # Download data
-        data = yf.download(
-            f"{stock_code}.JK",
-            period=period,
-            progress=False,
-            group_by='ticker', # <-- Tetap dipakai untuk multi-ticker
-            auto_adjust=True
-        )
+    Handle baik 1 ticker maupun banyak ticker: jika `stock_code` berupa list,
+    hasilnya dict {kode: DataFrame} dari get_bulk_stock_data.
+    Data dilayani dari cache lokal (utils/bar_cache) bila masih segar.
+    """
+    if not isinstance(stock_code, str):
+        return get_bulk_stock_data(stock_code, period=period)
 
-        # Bersihkan multi-level columns jika ada
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.droplevel(0)
-
-        # Pastikan kolom nya standar
-        data = data.rename(columns={
-            'price': 'Close',
-            'open': 'Open',
-            'high': 'High',
-            'low': 'Low',
-            'volume': 'Volume'
-        })
-        
-        # Pastikan kolom penting ada
-        required_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-        data = data[required_cols].copy()
-        
-        # Konversi tipe
-        data[['Open', 'High', 'Low', 'Close']] = data[['Open', 'High', 'Low', 'Close']].astype(float)
-        data['Volume'] = data['Volume'].astype(int)
-            
-        return data.dropna()
-    
+    try:
+        return get_bulk_stock_data([stock_code], period=period).get(stock_code)
     except Exception as e:
         print(f"Error in get_stock_data: {e}")
         return None
 
-def plot_candlestick(data, stock_code):
-    """Buat candlestick chart dengan penanganan error lebih kuat"""
-    try:
-        # Validasi data
-        required_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-        if not all(col in data.columns for col in required_cols):
-            raise ValueError(f"Data harus mengandung kolom: {required_cols}")
-        
-        # Konversi index ke datetime
-        if not isinstance(data.index, pd.DatetimeIndex):
-            data.index = pd.to_datetime(data.index, errors='coerce')
-            if data.index.isnull().any():
-                raise ValueError("Format tanggal tidak valid")
-        
-        # Buat direktori temp jika belum ada
-        os.makedirs('temp', exist_ok=True)
-        filename = f"temp/{stock_code}_candle.png"
-        
-        # Style candlestick
+def _download_batch(stock_codes, **fetch_kwargs):
+    """Satu permintaan ke sumber data (dengan retry) untuk sekumpulan ticker, hasil sudah dibersihkan"""
+    result = {}
+    for code, data in get_source().fetch(stock_codes, **fetch_kwargs).items():
+        try:
+            frame = _clean_ohlcv(data.copy())
+        except Exception as e:
+            print(f"Error cleaning {code}: {e}")
+            continue
+        if not frame.empty:
+            result[code] = frame
+    return result
+
+def _refresh_batches(stock_codes, start_of, batch_size):
+    """Download bar yang kurang per batch lalu gabungkan ke cache.
+
+    `start_of(code)` memberi tanggal awal yang dibutuhkan tiap ticker; satu batch
+    memakai tanggal paling awal di batch tersebut, lalu bar tiap ticker dipangkas
+    lagi ke tanggal awalnya sendiri saat digabung (lihat merge_bars). Mengembalikan
+    {kode: DataFrame cache}.
+    """
+    result = {}
+    for offset in range(0, len(stock_codes), batch_size):
+        batch = stock_codes[offset:offset + batch_size]
+        start = min(start_of(code) for code in batch)
+        started = time.perf_counter()
+        try:
+            fresh = _download_batch(batch, start=start.strftime('%Y-%m-%d'))
+        except DataSourceError as e:
+            metrics.inc('yahoo_fetch_failures_total', len(batch))
+            print(f"Error in get_bulk_stock_data (batch {offset // batch_size + 1}): {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        metrics.observe('yahoo_fetch_batch_seconds', elapsed)
+        metrics.inc('yahoo_fetch_failures_total', len(batch) - len(fresh))
+
+        for code in batch:
+            if code in fresh:
+                # Dalam mode bulk, tiap ticker menunggu selama batch-nya
+                metrics.observe('yahoo_fetch_ticker_seconds', elapsed)
+                result[code] = bar_cache.merge_bars(code, fresh[code], since=start_of(code))
+    return result
+
+def get_bulk_stock_data(stock_codes, period='1mo', batch_size=None):
+    """Ambil data banyak ticker sekaligus, dipecah per batch.
+
+    Bar dilayani dari cache lokal; hanya bar yang lebih baru dari tanggal
+    terakhir di cache (atau histori yang belum ada) yang di-download.
+    Mengembalikan dict {kode: DataFrame OHLCV} dengan kunci sama seperti input.
+    Ticker yang gagal/kosong tidak ada di hasil.
+    """
+    batch_size = batch_size or BULK_BATCH_SIZE
+    stock_codes = list(dict.fromkeys(stock_codes))  # buang duplikat, urutan tetap
+    start = bar_cache.period_start(period)
+
+    cached = {}
+    stale, missing = [], []
+    for code in stock_codes:
+        meta = bar_cache.load_meta(code)
+        if not bar_cache.covers(code, start, meta):
+            missing.append(code)
+            metrics.inc('bar_cache_requests_total', result='miss')
+            continue
+        bars = bar_cache.load_bars(code)
+        if bars is None or bars.empty:
+            missing.append(code)
+            metrics.inc('bar_cache_requests_total', result='miss')
+            continue
+        cached[code] = bars
+        if bar_cache.is_fresh(code, meta):
+            metrics.inc('bar_cache_requests_total', result='hit')
+        else:
+            stale.append(code)
+            metrics.inc('bar_cache_requests_total', result='stale')
+
+    # Ticker yang histori-nya sudah lengkap: cukup ambil dari bar terakhir (ditimpa jika berubah)
+    cached.update(_refresh_batches(stale, lambda code: cached[code].index[-1], batch_size))
+    # Ticker baru / histori kurang panjang: ambil sejak awal period
+    cached.update(_refresh_batches(missing, lambda code: start, batch_size))
+
+    result = {}
+    for code in stock_codes:
+        if code in cached:
+            data = bar_cache.slice_period(cached[code], period)
+            if not data.empty:
+                result[code] = data
+    return result
+
+def _session_bars(bars, session_date):
+    """Bar intraday yang tanggal WIB-nya sama dengan `session_date`"""
+    index = bars.index
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TZ).tz_localize(None)
+    return bars[index.normalize() == pd.Timestamp(session_date).normalize()]
+
+def get_bulk_intraday_prices(stock_codes, batch_size=None, session_date=None):
+    """Harga hari ini (bar 1 menit) untuk banyak ticker sekaligus.
+
+    Mengembalikan {kode: {'open', 'high', 'low', 'last', 'volume', 'time'}}: bar harian
+    sementara hasil agregasi bar 1 menit, plus waktu bar terakhir. Jika `session_date`
+    diberikan, hanya bar tanggal (WIB) tsb yang dipakai; sebelum bursa buka Yahoo masih
+    mengembalikan bar sesi sebelumnya, jadi ticker tanpa bar hari ini dilewati.
+    """
+    batch_size = batch_size or BULK_BATCH_SIZE
+    stock_codes = list(dict.fromkeys(stock_codes))
+
+    result = {}
+    for offset in range(0, len(stock_codes), batch_size):
+        batch = stock_codes[offset:offset + batch_size]
+        started = time.perf_counter()
+        try:
+            frames = get_source().fetch(batch, period='1d', interval='1m')
+        except DataSourceError as e:
+            metrics.inc('yahoo_intraday_failures_total', len(batch))
+            print(f"Error in get_bulk_intraday_prices (batch {offset // batch_size + 1}): {e}")
+            continue
+        metrics.observe('yahoo_intraday_batch_seconds', time.perf_counter() - started)
+
+        for code, data in frames.items():
+            bars = data[['Open', 'High', 'Low', 'Close', 'Volume']].dropna(subset=['Open', 'Close'])
+            if session_date is not None:
+                bars = _session_bars(bars, session_date)
+            if bars.empty:
+                continue
+            result[code] = {
+                'open': float(bars['Open'].iloc[0]),
+                'high': float(bars['High'].max()),
+                'low': float(bars['Low'].min()),
+                'last': float(bars['Close'].iloc[-1]),
+                'volume': float(bars['Volume'].fillna(0).sum()),
+                'time': bars.index[-1],
+            }
+    return result
+
+_chart_styles = {}
+
+def get_chart_style(name='default'):
+    """Style mplfinance, dibuat sekali per proses lalu dipakai ulang"""
+    if name not in _chart_styles:
+        import mplfinance as mpf  # import berat (~1 detik), baru dimuat saat render pertama
         mc = mpf.make_marketcolors(
             up='#2E7D32',  # hijau tua
             down='#C62828', # merah tua
@@ -72,23 +207,43 @@ def plot_candlestick(data, stock_code):
             edge={'up':'#2E7D32', 'down':'#C62828'},
             volume='#78909C'  # abu-abu
         )
-        style = mpf.make_mpf_style(
+        _chart_styles[name] = mpf.make_mpf_style(
             marketcolors=mc,
             gridstyle='--',
             gridcolor='#ECEFF1'
         )
-        
-        # Buat plot
+    return _chart_styles[name]
+
+def render_candlestick(data, stock_code, window=CHART_WINDOW, style='default'):
+    """Render candlestick chart ke PNG (bytes) di memori, tanpa file sementara"""
+    try:
+        # Validasi data
+        if not all(col in data.columns for col in REQUIRED_COLS):
+            raise ValueError(f"Data harus mengandung kolom: {REQUIRED_COLS}")
+
+        data = data[REQUIRED_COLS].tail(window) if window else data[REQUIRED_COLS]
+
+        # Konversi index ke datetime
+        if not isinstance(data.index, pd.DatetimeIndex):
+            data = data.copy()
+            data.index = pd.to_datetime(data.index, errors='coerce')
+            if data.index.isnull().any():
+                raise ValueError("Format tanggal tidak valid")
+
+        import mplfinance as mpf
+
+        buffer = io.BytesIO()
         mpf.plot(
             data,
             type='candle',
-            style=style,
-            title=f'\n{stock_code} | {datetime.now().strftime("%d %b %Y")}',
+            style=get_chart_style(style),
+            title=f'\n{stock_code} | {data.index[-1].strftime("%d %b %Y")}',
             ylabel='Harga (IDR)',
             ylabel_lower='Volume',
             volume=True,
             savefig=dict(
-                fname=filename,
+                fname=buffer,
+                format='png',
                 dpi=100,
                 bbox_inches='tight',
                 pad_inches=0.5
@@ -97,10 +252,124 @@ def plot_candlestick(data, stock_code):
             tight_layout=True,
             show_nontrading=False
         )
-        
-        return filename
-    
+        return buffer.getvalue()
+
     except Exception as e:
         print(f"Error generating chart: {str(e)}")
         print(f"Data received:\n{data.head() if data is not None else 'None'}")
-        return None
\ No newline at end of file
+        return None
+
+def warm_renderer(style='default'):
+    """Render grafik kecil sekali agar style, font & backend matplotlib sudah termuat di proses ini.
+
+    Dipanggil di worker pool sebelum scan; mengembalikan PID worker.
+    """
+    index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=5)
+    data = pd.DataFrame({
+        'Open': [100.0, 101, 102, 101, 100],
+        'High': [102.0, 103, 103, 102, 101],
+        'Low': [99.0, 100, 101, 99, 98],
+        'Close': [101.0, 102, 101, 100, 99],
+        'Volume': [1000, 1200, 900, 1100, 1500],
+    }, index=index)
+    render_candlestick(data, 'WARMUP', window=None, style=style)
+    return os.getpid()
+
+def render_small_multiples(frames, titles=None, window=CHART_WINDOW, columns=3, style='default'):
+    """Render beberapa candlestick kecil dalam satu PNG (grid), untuk ringkasan banyak ticker.
+
+    `frames` adalah {kode: DataFrame OHLCV} dengan urutan tampil; `titles`
+    opsional {kode: judul panel}. Tanpa panel volume agar tiap panel tetap terbaca.
+    """
+    try:
+        import mplfinance as mpf
+        from matplotlib.figure import Figure
+
+        frames = {code: data for code, data in frames.items() if data is not None and not data.empty}
+        if not frames:
+            return None
+        titles = titles or {}
+        columns = max(1, min(columns, len(frames)))
+        rows = -(-len(frames) // columns)
+
+        fig = Figure(figsize=(4 * columns, 2.8 * rows), dpi=100)
+        for i, (code, data) in enumerate(frames.items()):
+            ax = fig.add_subplot(rows, columns, i + 1)
+            data = data[REQUIRED_COLS].tail(window) if window else data[REQUIRED_COLS]
+            mpf.plot(data, type='candle', style=get_chart_style(style), ax=ax, show_nontrading=False)
+            ax.set_title(titles.get(code, code), fontsize=10)
+            ax.set_ylabel('')
+            ax.tick_params(labelsize=7)
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.3)
+        return buffer.getvalue()
+
+    except Exception as e:
+        print(f"Error generating small multiples: {str(e)}")
+        return None
+
+class ChartCache:
+    """LRU cache PNG grafik, thread-safe"""
+
+    def __init__(self, maxsize=CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(data, stock_code, window=CHART_WINDOW, style='default'):
+        """(ticker, tanggal bar terakhir, window, style) + close terakhir agar bar intraday yang berubah tidak basi"""
+        last_date = data.index[-1]
+        return (stock_code.upper().replace('.JK', ''), str(last_date), window, style, float(data['Close'].iloc[-1]))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        return None
+
+    def put(self, key, png):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+chart_cache = ChartCache()
+
+async def render_chart(data, stock_code, window=CHART_WINDOW, style='default'):
+    """Ambil PNG dari cache, komposit dari lapisan dasar (utils/chart_base), atau render penuh di process pool"""
+    if data is None or data.empty:
+        return None
+    key = ChartCache.key(data, stock_code, window, style)
+    png = chart_cache.get(key)
+    if png is not None:
+        metrics.inc('chart_cache_requests_total', result='hit')
+        return png
+
+    metrics.inc('chart_cache_requests_total', result='miss')
+    # Lapisan dasar yang disiapkan setelah penutupan: cukup gambar bar terakhir
+    from utils.chart_base import compose_from_base
+    png = await run_io(compose_from_base, data, stock_code, window, style)
+    if png is None:
+        with metrics.timer('chart_render_seconds'):
+            png = await run_cpu(render_candlestick, data, stock_code, window, style)
+    if png is None:
+        metrics.inc('chart_render_failures_total')
+    else:
+        chart_cache.put(key, png)
+    return png
+
+def plot_candlestick(data, stock_code):
+    """Kompatibilitas lama: render ke file PNG unik dan kembalikan path-nya"""
+    png = render_candlestick(data, stock_code, window=None)
+    if png is None:
+        return None
+    os.makedirs('temp', exist_ok=True)
+    fd, filename = tempfile.mkstemp(prefix=f"{stock_code}_", suffix='_candle.png', dir='temp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(png)
+    return filename
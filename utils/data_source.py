@@ -0,0 +1,352 @@
+import os
+import time
+import random
+import threading
+import functools
+import pandas as pd
+from utils.bar_cache import period_start
+from utils.metrics import metrics
+
+# Kebijakan request ke sumber data (bisa diatur lewat .env)
+SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', '10'))          # detik per request HTTP
+SOURCE_RETRIES = int(os.getenv('SOURCE_RETRIES', '3'))             # percobaan ulang setelah gagal
+SOURCE_BACKOFF = float(os.getenv('SOURCE_BACKOFF', '1.0'))         # detik, dikali 2 tiap percobaan
+SOURCE_BACKOFF_MAX = float(os.getenv('SOURCE_BACKOFF_MAX', '30'))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', '5'))       # gagal berturut-turut sebelum circuit terbuka
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '60'))      # detik circuit terbuka
+DATA_SOURCE = os.getenv('DATA_SOURCE', 'yahoo')                    # 'yahoo' atau 'file:<path fixture csv>'
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class DataSourceError(Exception):
+    """Semua percobaan ke sumber data gagal"""
+
+class SourceUnavailable(DataSourceError):
+    """Circuit breaker terbuka: sumber data sedang dianggap down/membatasi request"""
+
+def to_yahoo_symbol(stock_code):
+    """Ubah kode saham (BBRI / BBRI.JK) menjadi simbol Yahoo (BBRI.JK)"""
+    stock_code = stock_code.upper()
+    return stock_code if stock_code.endswith('.JK') else f"{stock_code}.JK"
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Exponential backoff dengan full jitter: acak di [0, min(cap, base * 2^attempt)]"""
+    base = SOURCE_BACKOFF if base is None else base
+    cap = SOURCE_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """Circuit breaker sederhana: closed -> open (setelah `threshold` gagal) -> half-open (setelah cooldown).
+
+    Saat half-open hanya satu pemanggil (probe) yang diizinkan; sukses menutup
+    circuit, gagal membukanya lagi. Pemanggil lain tetap ditolak sampai probe
+    selesai (atau dianggap hilang setelah `cooldown` tanpa kabar).
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = None  # waktu probe half-open dimulai, None jika tidak ada
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Dikirim ke proses worker scan: lock tidak bisa di-pickle, buat baru di sana
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown:
+                return False
+            if self._probing is not None and now - self._probing < self.cooldown:
+                return False  # half-open: probe lain sedang berjalan
+            self._probing = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+            self._probing = None
+
+    def trip(self):
+        """Buka circuit langsung (mis. Yahoo membalas rate limit)"""
+        with self._lock:
+            self.failures = max(self.failures, self.threshold)
+            self.opened_at = time.monotonic()
+            self._probing = None
+
+class DataSource:
+    """Antarmuka backend data OHLCV.
+
+    Subclass cukup mengimplementasikan `_fetch`; retry dengan backoff dan
+    circuit breaker ditangani `fetch`.
+    """
+    name = 'base'
+
+    def __init__(self, retries=SOURCE_RETRIES, breaker=None):
+        self.retries = retries
+        self.breaker = breaker
+
+    def _fetch(self, stock_codes, start=None, period=None, interval='1d'):
+        """Satu percobaan: {kode: DataFrame OHLCV mentah}. Ticker tanpa data tidak ada di hasil."""
+        raise NotImplementedError
+
+    def is_rate_limit(self, error):
+        """True jika error berarti sumber data membatasi request (circuit langsung dibuka)"""
+        return False
+
+    def fetch(self, stock_codes, start=None, period=None, interval='1d'):
+        """Ambil OHLCV banyak ticker dengan retry + backoff.
+
+        Percobaan yang gagal total (exception / hasil kosong) diulang hingga
+        `retries` kali; ticker yang hilang dari hasil parsial diulang sekali.
+        Mengembalikan {kode: DataFrame}; raise DataSourceError jika tidak ada
+        data sama sekali, SourceUnavailable jika circuit terbuka.
+        """
+        pending = list(dict.fromkeys(stock_codes))
+        result = {}
+        last_error = None
+        partial_retried = False
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.inc('source_retries_total', source=self.name)
+                time.sleep(backoff_delay(attempt - 1))
+            if self.breaker is not None and not self.breaker.allow():
+                metrics.inc('source_rejected_total', source=self.name)
+                if result:
+                    break
+                raise SourceUnavailable(f"Sumber data {self.name} sedang tidak tersedia (circuit terbuka)")
+
+            try:
+                frames = self._fetch(pending, start=start, period=period, interval=interval)
+            except Exception as e:
+                last_error = e
+                if self.is_rate_limit(e):
+                    metrics.inc('source_failures_total', source=self.name, reason='rate_limit')
+                    if self.breaker is not None:
+                        self.breaker.trip()
+                    continue
+                metrics.inc('source_failures_total', source=self.name, reason='error')
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                continue
+
+            if not frames and result:
+                break  # ulangan parsial tetap kosong: ticker sisanya memang tidak ada datanya
+            if not frames:
+                last_error = DataSourceError(f"Tidak ada data untuk {len(pending)} ticker")
+                metrics.inc('source_failures_total', source=self.name, reason='empty')
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                continue
+
+            if self.breaker is not None:
+                self.breaker.record_success()
+            result.update(frames)
+            pending = [code for code in pending if code not in frames]
+            if not pending or partial_retried:
+                break
+            partial_retried = True
+
+        if not result and pending:
+            raise DataSourceError(f"Gagal mengambil data dari {self.name}: {last_error}") from last_error
+        return result
+
+_warned_downloader = False
+
+class YahooSource(DataSource):
+    """Yahoo Finance lewat yf.download dengan satu session HTTP keep-alive bersama"""
+    name = 'yahoo'
+
+    def __init__(self, timeout=SOURCE_TIMEOUT, retries=SOURCE_RETRIES, breaker=None):
+        super().__init__(retries=retries, breaker=breaker or CircuitBreaker())
+        self.timeout = timeout
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Session curl_cffi (impersonate browser) yang dipakai ulang semua request"""
+        with self._session_lock:
+            if self._session is None:
+                from curl_cffi import requests as curl_requests
+                self._session = curl_requests.Session(impersonate='chrome')
+            return self._session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __getstate__(self):
+        # Worker scan membuat session HTTP sendiri saat request pertama
+        state = dict(self.__dict__)
+        state['_session'] = None
+        del state['_session_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._session_lock = threading.Lock()
+
+    def is_rate_limit(self, error):
+        from yfinance.exceptions import YFRateLimitError
+        return isinstance(error, YFRateLimitError)
+
+    @staticmethod
+    def _downloader():
+        """(fungsi download, dict error per ticker yang diisi download tsb, atau None)
+
+        yf.download menelan exception per ticker. Di yfinance 1.x error itu
+        disimpan di konteks per panggilan (multi._DownloadCtx); versi lama
+        memakai yf.shared._ERRORS global (dibaca setelah download).
+        """
+        import yfinance as yf  # import berat, dimuat saat download pertama
+        from yfinance import multi
+
+        if hasattr(multi, '_DownloadCtx') and hasattr(multi, '_download_impl'):
+            ctx = multi._DownloadCtx()
+            return functools.partial(multi._download_impl, ctx), ctx.errors
+        global _warned_downloader
+        if not _warned_downloader:
+            _warned_downloader = True
+            print(f"⚠️ yfinance {getattr(yf, '__version__', '?')} tanpa multi._DownloadCtx: memakai yf.download, "
+                  f"rate limit dideteksi lewat yf.shared._ERRORS (lihat versi teruji di requirements.txt)")
+        return yf.download, None
+
+    def _check_errors(self, errors):
+        """Raise YFRateLimitError jika ada ticker yang gagal karena rate limit, supaya circuit dibuka"""
+        from yfinance.exceptions import YFRateLimitError
+
+        limited = [
+            symbol for symbol, error in errors.items()
+            if any(marker in str(error) for marker in ('YFRateLimitError', 'Too Many Requests', 'Rate limited'))
+        ]
+        if limited:
+            print(f"⚠️ Yahoo membatasi request ({len(limited)} ticker): {', '.join(limited[:5])}")
+            raise YFRateLimitError()
+
+    def _fetch(self, stock_codes, start=None, period=None, interval='1d'):
+        symbols = {to_yahoo_symbol(code): code for code in stock_codes}
+        kwargs = {'start': start} if start is not None else {'period': period or '1mo'}
+        download, errors = self._downloader()
+        data = download(
+            list(symbols),
+            interval=interval,
+            progress=False,
+            group_by='ticker',
+            auto_adjust=True,
+            threads=True,
+            timeout=self.timeout,
+            session=self.session,
+            **kwargs
+        )
+        if errors is None:
+            from yfinance import shared
+            errors = dict(getattr(shared, '_ERRORS', {}))
+        self._check_errors(errors)
+
+        result = {}
+        if data is None or data.empty:
+            return result
+        available = set(data.columns.get_level_values(0))
+        for symbol, code in symbols.items():
+            if symbol not in available:
+                continue
+            frame = data[symbol].dropna(how='all')
+            if not frame.empty:
+                result[code] = frame
+        return result
+
+class FileSource(DataSource):
+    """Backend lokal dari {kode: DataFrame} atau fixture CSV (Date, Ticker, OHLCV), untuk tes & load test.
+
+    `latency` mensimulasikan waktu tunggu jaringan per panggilan. Untuk
+    interval intraday, bar harian terakhir dipakai sebagai pengganti.
+    """
+    name = 'file'
+
+    def __init__(self, frames, latency=0.0, retries=0):
+        super().__init__(retries=retries)
+        self.frames = {to_yahoo_symbol(code): data for code, data in frames.items()}
+        self.latency = latency
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        records = pd.read_csv(path, parse_dates=['Date'])
+        frames = {
+            ticker: group.set_index('Date')[FIELDS].sort_index()
+            for ticker, group in records.groupby('Ticker')
+        }
+        return cls(frames, **kwargs)
+
+    def _fetch(self, stock_codes, start=None, period=None, interval='1d'):
+        if self.latency:
+            time.sleep(self.latency)
+        since = pd.Timestamp(start) if start is not None else period_start(period or '1mo')
+        result = {}
+        for code in stock_codes:
+            data = self.frames.get(to_yahoo_symbol(code))
+            if data is None:
+                continue
+            data = data.tail(1) if interval != '1d' else data[data.index >= since]
+            if not data.empty:
+                result[code] = data
+        return result
+
+_source = None
+_source_lock = threading.Lock()
+
+def _default_source():
+    if DATA_SOURCE.startswith('file:'):
+        return FileSource.from_csv(DATA_SOURCE[len('file:'):])
+    return YahooSource()
+
+def get_source():
+    """Sumber data aktif (dibuat saat pertama dipakai sesuai DATA_SOURCE)"""
+    global _source
+    with _source_lock:
+        if _source is None:
+            _source = _default_source()
+        return _source
+
+def close_source():
+    """Tutup session HTTP sumber data aktif (jika sudah pernah dibuat)"""
+    with _source_lock:
+        source = _source
+    if source is not None and hasattr(source, 'close'):
+        source.close()
+
+def set_source(source):
+    """Ganti sumber data (mis. FileSource untuk tes/benchmark), kembalikan sumber sebelumnya"""
+    global _source
+    with _source_lock:
+        previous, _source = _source, source
+        return previous
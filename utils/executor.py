@@ -0,0 +1,76 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Ukuran pool bisa diatur lewat .env
+IO_WORKERS = int(os.getenv('IO_WORKERS', '8'))    # download data / network I/O
+CPU_WORKERS = int(os.getenv('CPU_WORKERS', '2'))  # render grafik & indikator (0 = pakai thread)
+WORKER_START_METHOD = os.getenv('WORKER_START_METHOD', 'forkserver')  # cara membuat proses worker
+WORKER_PRELOAD = ['pandas', 'utils.data_fetcher', 'utils.rules']  # dimuat sekali di proses forkserver
+
+_io_pool = None
+_cpu_pool = None
+
+def get_io_pool():
+    """Thread pool untuk pekerjaan I/O yang blocking (yf.download, file)"""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+    return _io_pool
+
+def worker_context():
+    """Konteks multiprocessing untuk semua pool proses.
+
+    Default forkserver, bukan fork: proses induk punya thread I/O yang bisa
+    sedang memegang lock (cache bar, metrics, session HTTP) saat worker dibuat,
+    dan worker hasil fork dari keadaan itu deadlock begitu lock tsb dipakai.
+    Proses forkserver (satu thread) memuat modul berat sekali, jadi worker
+    baru tetap cepat siap.
+    """
+    context = multiprocessing.get_context(WORKER_START_METHOD)
+    if WORKER_START_METHOD == 'forkserver':
+        context.set_forkserver_preload(WORKER_PRELOAD)
+    return context
+
+def get_cpu_pool():
+    """Process pool untuk pekerjaan CPU berat (mplfinance, indikator)"""
+    global _cpu_pool
+    if CPU_WORKERS <= 0:
+        return get_io_pool()
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=worker_context())
+    return _cpu_pool
+
+async def run_io(func, *args, **kwargs):
+    """Jalankan fungsi blocking di thread pool tanpa memblok event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(func, *args, **kwargs))
+
+async def run_cpu(func, *args, **kwargs):
+    """Jalankan fungsi CPU-bound di process pool.
+
+    `func` dan argumennya harus bisa di-pickle (fungsi level modul, DataFrame, dll).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_pool(), functools.partial(func, *args, **kwargs))
+
+async def warm_cpu_pool(func, *args, **kwargs):
+    """Jalankan `func` sekali per worker CPU agar proses worker sudah hidup & modul berat termuat.
+
+    Mengembalikan set hasil `func` (mis. PID worker yang sudah hangat).
+    """
+    get_io_pool()
+    tasks = [run_cpu(func, *args, **kwargs) for _ in range(max(CPU_WORKERS, 1))]
+    return set(await asyncio.gather(*tasks))
+
+def shutdown_pools(wait=True):
+    """Matikan semua pool (dipanggil saat bot berhenti)"""
+    global _io_pool, _cpu_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=wait, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=wait, cancel_futures=True)
+        _io_pool = None
@@ -1,7 +1,4 @@
-import yfinance as yf
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
 from ta.volume import OnBalanceVolumeIndicator
 
 from utils.data_fetcher import get_stock_data
@@ -89,7 +86,7 @@ def analyze_stock(stock_code, period='1mo'):
         # DEBUG: Cetak kolom setelah diproses
         print("\n=== DATA SETELAH PROSES ===")
         print("Columns:", data.columns.tolist())
-        print(data[['Open', 'Close', 'Gap_pct', 'Is_gap_down']].head())
+        print(data[['Open', 'Close', 'Gap_pct', 'Is_Gap_Down', 'AD_Line']].head())
         
         return data
     except Exception as e:
@@ -103,9 +100,9 @@ def analyze_stock(stock_code, period='1mo'):
     # return data
 
 def get_gap_down_summary(data, stock_code):
-    """Ringkasan hasil gap down dengan kolom yang konsisten"""
-    if not data.empty and 'Is_gap_down' in data.columns:
-        gaps = data[data['Is_gap_down']]
+    """Ringkasan hasil gap down (butuh kolom dari detect_gap_down, AD_Line dari calculate_ad_line jika ada)"""
+    if data is not None and not data.empty and 'Is_Gap_Down' in data.columns:
+        gaps = data[data['Is_Gap_Down']]
         if not gaps.empty:
             summary = []
             for date, row in gaps.iterrows():
@@ -115,7 +112,7 @@ def get_gap_down_summary(data, stock_code):
                     'Open': row['Open'],
                     'Close': row['Close'],
                     'Gap_pct': abs(row['Gap_pct']),  # Nilai absolute
-                    'AD_Line': row['AD Line']
+                    'AD_Line': row.get('AD_Line')
                 })
             return summary
     return None
@@ -125,7 +122,7 @@ def get_gap_down_summary(data, stock_code):
 # test_data = yf.download("BBRI.JK", period="1mo")
 # test_data = calculate_ad_line(test_data)
 # test_data = detect_gap_down(test_data)
-# print(test_data[['Open', 'Close', 'Gap_pct', 'Is_gap_down']].head())
+# print(test_data[['Open', 'Close', 'Gap_pct', 'Is_Gap_Down']].head())
 
 # # Test 2: Data kosong
 # empty_summary = get_gap_down_summary(pd.DataFrame(), "TEST")
@@ -0,0 +1,137 @@
+import math
+import pandas as pd
+from utils.signal_engine import compute_indicators
+
+# State indikator per ticker: cukup ringkasan bar terakhir, bukan seluruh histori.
+#
+#   {'first': tanggal jangkar, 'date': tanggal bar terakhir,
+#    'base': state SEBELUM bar terakhir (None jika baru satu bar),
+#    'head': state SETELAH bar terakhir}
+#
+# State berisi close, obv, ad (+ gap_pct & obv_change untuk head). `base` disimpan
+# supaya bar terakhir yang direvisi (bar hari ini yang masih berjalan) bisa
+# dihitung ulang tanpa menyentuh histori. Level OBV/AD dihitung sejak `first`;
+# yang dipakai sinyal hanya perubahannya, jadi bar lama yang dipangkas dari cache
+# tidak perlu memicu hitung ulang.
+#
+# Batasan: saat ini state ini hanya dibaca oleh poller intraday (utils.intraday).
+# Scan harian (scan_rules -> compute_indicators) masih menghitung OBV/AD/Gap dari
+# DataFrame bar secara penuh per ticker, jadi biaya scan tidak turun karena state
+# ini; bar_cache.merge_bars hanya menjaganya tetap mutakhir.
+
+def step(prev, bar):
+    """Satu langkah O(1): state sebelumnya (atau None) + satu bar {open, high, low, close, volume}.
+
+    Semantik sama dengan compute_indicators (OBV gaya `ta`, AD Line dengan High == Low -> range 1).
+    """
+    close, volume = float(bar['close']), float(bar['volume'])
+    high, low = float(bar['high']), float(bar['low'])
+
+    high_low_range = high - low
+    if high_low_range == 0:
+        high_low_range = 1.0
+    money_flow = ((close - low) - (high - close)) / high_low_range * volume
+
+    if prev is None:
+        return {'close': close, 'obv': volume, 'ad': money_flow, 'gap_pct': math.nan, 'obv_change': math.nan}
+
+    prev_close = prev['close']
+    flow = -volume if close < prev_close else volume
+    return {
+        'close': close,
+        'obv': prev['obv'] + flow,
+        'ad': prev['ad'] + money_flow,
+        'gap_pct': (float(bar['open']) - prev_close) / prev_close * 100,
+        'obv_change': flow,
+    }
+
+def _valid(bars):
+    return bars.dropna(subset=['Close', 'Volume'])
+
+def _bar(row):
+    return {'open': row.Open, 'high': row.High, 'low': row.Low, 'close': row.Close, 'volume': row.Volume}
+
+def _date(timestamp):
+    return pd.Timestamp(timestamp).strftime('%Y-%m-%d')
+
+def rebuild(bars):
+    """Hitung state dari seluruh histori (vectorized), None jika tidak ada bar valid"""
+    bars = _valid(bars)
+    if bars.empty:
+        return None
+
+    arrays = [bars[col].to_numpy(dtype=float)[:, None] for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    indicators = {name: values[:, 0] for name, values in compute_indicators(*arrays).items()}
+    close = arrays[3][:, 0]
+
+    def at(i, full=False):
+        state = {'close': float(close[i]), 'obv': float(indicators['OBV'][i]), 'ad': float(indicators['AD_Line'][i])}
+        if full:
+            state['gap_pct'] = float(indicators['Gap_pct'][i])
+            state['obv_change'] = float(indicators['OBV_Change'][i])
+        return state
+
+    return {
+        'first': _date(bars.index[0]),
+        'date': _date(bars.index[-1]),
+        'base': at(-2) if len(bars) > 1 else None,
+        'head': at(-1, full=True),
+    }
+
+def advance(state, bars, changed_from=None):
+    """Perbarui state setelah cache digabung dengan bar baru.
+
+    `bars` = seluruh bar cache (urut tanggal), `changed_from` = tanggal bar
+    paling awal yang baru/diubah. Bar setelah bar terakhir state di-step O(1);
+    bar terakhir yang direvisi dihitung ulang dari `base`. Hanya jika bar
+    yang lebih lama berubah (mis. backfill histori) state dibangun ulang.
+    """
+    if state is None:
+        return rebuild(bars)
+    if changed_from is None:
+        return state
+
+    last = pd.Timestamp(state['date'])
+    changed_from = pd.Timestamp(changed_from)
+    if changed_from < last:
+        return rebuild(bars)
+
+    new_bars = _valid(bars[bars.index >= changed_from])
+    if new_bars.empty:
+        return state
+
+    state = dict(state)
+    for date, row in zip(new_bars.index, new_bars.itertuples(index=False)):
+        if date == last:
+            # Revisi bar terakhir: hitung ulang dari state sebelumnya
+            prev = state['base']
+        else:
+            prev = state['head']
+            state['base'] = {k: prev[k] for k in ('close', 'obv', 'ad')}
+        state['head'] = step(prev, _bar(row))
+        state['date'] = _date(date)
+        last = pd.Timestamp(date)
+    return state
+
+def _prev_state(state, date):
+    """State sebelum bar bertanggal `date`: `base` jika bar itu revisi bar terakhir, `head` jika bar baru"""
+    date = pd.Timestamp(date).normalize()
+    last = pd.Timestamp(state['date'])
+    if date > last:
+        return state['head']
+    if date == last:
+        return state['base']
+    raise ValueError(f"State hanya menyimpan bar terakhir ({state['date']}), tidak bisa untuk {date.date()}")
+
+def previous_close(state, date):
+    """Close hari bursa sebelum `date`, None jika tidak ada"""
+    if state is None or pd.Timestamp(date).normalize() < pd.Timestamp(state['date']):
+        return None
+    prev = _prev_state(state, date)
+    return prev['close'] if prev else None
+
+def preview(state, bar, date):
+    """Indikator untuk bar sementara (mis. bar intraday hari ini) tanpa mengubah state"""
+    if state is None:
+        return step(None, bar)
+    return step(_prev_state(state, date), bar)
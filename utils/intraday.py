@@ -0,0 +1,131 @@
+import os
+import pandas as pd
+from datetime import time, timedelta
+from telegram.ext import ContextTypes
+from utils.data_fetcher import get_bulk_stock_data, get_bulk_intraday_prices
+from utils.alert_sender import broadcast
+from utils.executor import run_io
+from utils import bar_cache, indicator_state
+from utils.market_calendar import is_trading_day, today, MARKET_TZ
+from utils.store import get_store
+from utils.metrics import metrics
+
+# Mode intraday: polling harga pembukaan selama jendela pembukaan bursa
+INTRADAY_POLL_SECONDS = int(os.getenv('INTRADAY_POLL_SECONDS', '30'))
+INTRADAY_WINDOW_MINUTES = int(os.getenv('INTRADAY_WINDOW_MINUTES', '30'))
+SESSION_OPEN = time(hour=2, minute=0)      # 09:00 WIB
+SESSION_PREPARE = time(hour=1, minute=55)  # siapkan close kemarin sebelum bursa buka
+
+class IntradayGapMonitor:
+    """Deteksi gap down saat pembukaan: bandingkan harga open hari ini dengan close kemarin.
+
+    Close kemarin dimuat sekali per sesi dari cache bar, lalu harga pembukaan
+    seluruh watchlist di-poll dalam bulk setiap INTRADAY_POLL_SECONDS detik.
+    Setiap (ticker, chat) hanya menerima satu alert per sesi.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.session_date = None
+        self.routes = {}        # ticker -> {chat_id: threshold}
+        self.states = {}        # ticker -> state indikator (lihat utils.indicator_state)
+        self.prev_close = {}    # ticker -> close hari bursa sebelumnya
+        self.alerted = set()    # (ticker, chat_id) yang sudah dikirimi alert sesi ini
+
+    async def prepare_session(self, context: ContextTypes.DEFAULT_TYPE):
+        """Muat subscriber & close kemarin untuk sesi hari ini"""
+        if not is_trading_day():
+            return
+        session_date = today()
+        self.routes = get_store().subscription_index()
+        # Refresh cache (sekaligus memperbarui state indikator), lalu cukup baca state per ticker
+        frames = await run_io(get_bulk_stock_data, list(self.routes), period='5d')
+
+        states, prev_close = {}, {}
+        for code in frames:
+            state = bar_cache.load_state(code)
+            close = indicator_state.previous_close(state, session_date)
+            if close:
+                states[code] = state
+                prev_close[code] = close
+
+        self.states = states
+        self.prev_close = prev_close
+        self.session_date = session_date
+        self.alerted = set()
+        print(f"[INTRADAY] Sesi {session_date.date()}: {len(prev_close)} ticker siap dipantau")
+
+    def check_prices(self, prices):
+        """Bandingkan harga pembukaan dengan close kemarin.
+
+        Mengembalikan list (ticker, gap_pct, harga, chat_ids) yang baru melewati
+        threshold, dan langsung menandainya sebagai sudah dikirim. Harga yang bar
+        terakhirnya bukan dari sesi ini (belum ada transaksi hari ini) dilewati.
+        """
+        signals = []
+        for code, price in prices.items():
+            prev = self.prev_close.get(code)
+            if not prev or not self._in_session(price['time']):
+                continue
+            gap_pct = (price['open'] - prev) / prev * 100
+            chat_ids = [
+                chat_id for chat_id, threshold in self.routes.get(code, {}).items()
+                if gap_pct <= -threshold and (code, chat_id) not in self.alerted
+            ]
+            if chat_ids:
+                self.alerted.update((code, chat_id) for chat_id in chat_ids)
+                signals.append((code, gap_pct, price, chat_ids))
+        return signals
+
+    def _in_session(self, bar_time):
+        """True jika waktu bar jatuh pada tanggal sesi (WIB)"""
+        bar_time = pd.Timestamp(bar_time)
+        if bar_time.tz is not None:
+            bar_time = bar_time.tz_convert(MARKET_TZ).tz_localize(None)
+        return bar_time.normalize() == self.session_date
+
+    async def poll(self, context: ContextTypes.DEFAULT_TYPE):
+        """Satu putaran polling: ambil harga bulk, kirim alert untuk gap baru"""
+        if self.session_date != today():
+            await self.prepare_session(context)
+        if self.session_date != today() or not self.prev_close:
+            return
+
+        with metrics.timer('intraday_poll_seconds'):
+            prices = await run_io(get_bulk_intraday_prices, list(self.prev_close), session_date=self.session_date)
+
+        # Gap paling dalam dikirim lebih dulu
+        for code, gap_pct, price, chat_ids in sorted(self.check_prices(prices), key=lambda s: s[1]):
+            metrics.inc('intraday_signals_total')
+            bar = {'open': price['open'], 'high': price['high'], 'low': price['low'],
+                   'close': price['last'], 'volume': price['volume']}
+            live = indicator_state.preview(self.states[code], bar, self.session_date)
+            message = (
+                f"⚡ <b>GAP DOWN SAAT PEMBUKAAN</b>\n"
+                f"Saham: {code.replace('.JK', '')}\n"
+                f"Close kemarin: {self.prev_close[code]:,.0f}\n"
+                f"Open: {price['open']:,.0f} (Gap: {gap_pct:.2f}%)\n"
+                f"Harga terakhir: {price['last']:,.0f} ({price['time'].strftime('%H:%M')})\n"
+                f"OBV sementara: {'naik' if live['obv_change'] > 0 else 'turun'} ({live['obv_change']:+,.0f})"
+            )
+            try:
+                await broadcast(context.bot, chat_ids, message, label=f"intraday {code}")
+            except Exception as e:
+                print(f"[ERROR] Gagal kirim alert intraday {code}: {str(e)}")
+
+    def start(self):
+        """Jadwalkan persiapan sesi dan polling selama jendela pembukaan (Senin-Jumat)"""
+        job_queue = self.application.job_queue
+        weekdays = (1, 2, 3, 4, 5)  # PTB v20: 0 = Minggu
+        job_queue.run_daily(self.prepare_session, time=SESSION_PREPARE, days=weekdays)
+        job_queue.run_daily(self._start_polling, time=SESSION_OPEN, days=weekdays)
+
+    async def _start_polling(self, context: ContextTypes.DEFAULT_TYPE):
+        if not is_trading_day():
+            return
+        context.job_queue.run_repeating(
+            self.poll,
+            interval=INTRADAY_POLL_SECONDS,
+            first=0,
+            last=timedelta(minutes=INTRADAY_WINDOW_MINUTES)
+        )
@@ -0,0 +1,72 @@
+import os
+import json
+import threading
+import pandas as pd
+
+# Kalender bursa IDX: Senin-Jumat dikurangi hari libur bursa dari file JSON
+IDX_HOLIDAYS_FILE = os.getenv('IDX_HOLIDAYS_FILE', 'data/idx_holidays.json')
+MARKET_TZ = 'Asia/Jakarta'
+
+_holidays = None
+_years = set()
+_warned_years = set()
+_lock = threading.Lock()
+
+def _load():
+    """Muat daftar libur sekali per proses: set tanggal + tahun yang tercakup"""
+    global _holidays, _years
+    with _lock:
+        if _holidays is None:
+            holidays, years = set(), set()
+            try:
+                with open(IDX_HOLIDAYS_FILE, 'r') as f:
+                    data = json.load(f)
+                for year, dates in data.items():
+                    if year.isdigit():
+                        years.add(int(year))
+                        holidays.update(pd.Timestamp(d).normalize() for d in dates)
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print(f"⚠️ Kalender libur IDX tidak bisa dimuat ({IDX_HOLIDAYS_FILE}): {str(e)}")
+            _holidays, _years = holidays, years
+        return _holidays, _years
+
+def reload_holidays():
+    """Baca ulang file libur (setelah file diperbarui)"""
+    global _holidays
+    with _lock:
+        _holidays = None
+        _warned_years.clear()
+    return _load()
+
+def today():
+    """Tanggal hari ini di zona waktu bursa (WIB), tanpa timezone"""
+    return pd.Timestamp.now(tz=MARKET_TZ).normalize().tz_localize(None)
+
+def is_trading_day(date=None):
+    """True jika `date` (default hari ini WIB) adalah hari bursa IDX.
+
+    Tahun yang belum ada di file libur dianggap hanya libur akhir pekan
+    (dengan peringatan sekali), supaya scan tidak diam-diam berhenti.
+    """
+    date = today() if date is None else pd.Timestamp(date).normalize()
+    if date.weekday() >= 5:
+        return False
+    holidays, years = _load()
+    if date.year not in years and date.year not in _warned_years:
+        _warned_years.add(date.year)
+        print(f"⚠️ Kalender libur IDX tahun {date.year} belum ada di {IDX_HOLIDAYS_FILE}")
+    return date not in holidays
+
+def next_trading_day(date=None):
+    """Hari bursa berikutnya setelah `date`"""
+    date = (today() if date is None else pd.Timestamp(date).normalize()) + pd.Timedelta(days=1)
+    while not is_trading_day(date):
+        date += pd.Timedelta(days=1)
+    return date
+
+def previous_trading_day(date=None):
+    """Hari bursa terakhir sebelum `date`"""
+    date = (today() if date is None else pd.Timestamp(date).normalize()) - pd.Timedelta(days=1)
+    while not is_trading_day(date):
+        date -= pd.Timedelta(days=1)
+    return date
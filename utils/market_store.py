@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+from utils.signal_engine import FIELDS, INDICATORS, compute_indicators, indicator_buffers, signal_mask
+
+# Tipe data penyimpanan OHLCV. float32 cukup untuk harga IDX dan volume
+# (int32 tidak cukup: volume harian saham IDX bisa > 2^31 lembar).
+MARKET_DTYPE = np.dtype(os.getenv('MARKET_DTYPE', 'float32'))
+# Jumlah ticker per potongan saat menghitung indikator (ukuran buffer kerja)
+INDICATOR_CHUNK = int(os.getenv('INDICATOR_CHUNK', '256'))
+
+class MarketStore:
+    """OHLCV banyak ticker dalam satu array ringkas [n_tickers, n_dates, 5].
+
+    Data tiap ticker bersebelahan di memori, jadi `view(kode)` dan `frame(kode)`
+    tidak menyalin data. `field(nama)` memberi panel [n_dates, n_tickers]
+    (view, tanpa salinan) untuk perhitungan lintas ticker. Tanggal yang tidak
+    ada untuk suatu ticker berisi NaN. Indikator dihitung dalam float64 ke
+    buffer yang dipakai ulang per potongan ticker, bukan kolom baru per DataFrame.
+    """
+
+    def __init__(self, dates, tickers, cube):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.cube = cube
+        self._columns = {code: i for i, code in enumerate(self.tickers)}
+        self._buffers = None
+
+    @classmethod
+    def from_frames(cls, frames, dtype=None):
+        """Bangun store dari {kode: DataFrame OHLCV} (kolom FIELDS, index tanggal)"""
+        dtype = MARKET_DTYPE if dtype is None else np.dtype(dtype)
+        frames = {code: data for code, data in frames.items() if data is not None and not data.empty}
+        if not frames:
+            return cls(pd.DatetimeIndex([]), [], np.empty((0, 0, len(FIELDS)), dtype=dtype))
+
+        index_values = [data.index.values for data in frames.values()]
+        dates = pd.DatetimeIndex(np.unique(np.concatenate(index_values)))
+        cube = np.full((len(frames), len(dates), len(FIELDS)), np.nan, dtype=dtype)
+        for i, (data, index) in enumerate(zip(frames.values(), index_values)):
+            rows = np.searchsorted(dates.values, index)
+            # Frame dari get_stock_data sudah berurutan FIELDS; hindari seleksi kolom yang mahal
+            values = data.to_numpy(dtype=dtype) if list(data.columns) == FIELDS else data[FIELDS].to_numpy(dtype=dtype)
+            cube[i, rows] = values
+        return cls(dates, list(frames), cube)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, stock_code):
+        return stock_code in self._columns
+
+    @property
+    def nbytes(self):
+        return self.cube.nbytes
+
+    def field(self, name):
+        """Panel satu kolom OHLCV, bentuk [n_dates, n_tickers] (view)"""
+        return self.cube[:, :, FIELDS.index(name)].T
+
+    def view(self, stock_code):
+        """Array [n_dates, 5] milik satu ticker (view, tanpa salinan)"""
+        return self.cube[self._columns[stock_code]]
+
+    def frame(self, stock_code):
+        """DataFrame OHLCV satu ticker di atas view yang sama (tanpa salinan), termasuk baris NaN"""
+        return pd.DataFrame(self.view(stock_code), index=self.dates, columns=FIELDS, copy=False)
+
+    def _chunk_buffers(self, n_tickers):
+        """Buffer input float64 + buffer indikator [n_dates, chunk], dialokasikan sekali per store"""
+        shape = (len(self.dates), n_tickers)
+        if self._buffers is None or self._buffers['shape'][1] < n_tickers or self._buffers['shape'][0] != shape[0]:
+            self._buffers = {
+                'shape': shape,
+                'inputs': np.empty((len(FIELDS),) + shape),
+                'indicators': indicator_buffers(shape),
+            }
+        return self._buffers
+
+    def iter_indicators(self, chunk=None):
+        """Hitung indikator per potongan ticker.
+
+        Yield (slice ticker, {field: panel float64}, {indikator: panel}); semua
+        array adalah buffer yang ditimpa pada potongan berikutnya, jadi salin
+        bila perlu disimpan.
+        """
+        chunk = chunk or INDICATOR_CHUNK
+        buffers = self._chunk_buffers(min(chunk, max(len(self.tickers), 1)))
+        for start in range(0, len(self.tickers), chunk):
+            stop = min(start + chunk, len(self.tickers))
+            width = stop - start
+            inputs = buffers['inputs'][:, :, :width]
+            # Salin potongan float32 ke buffer kerja float64 (transpose ke [dates, tickers])
+            np.copyto(inputs, self.cube[start:stop].transpose(2, 1, 0))
+            arrays = dict(zip(FIELDS, inputs))
+            out = {name: values[:, :width] for name, values in buffers['indicators'].items()}
+            indicators = compute_indicators(
+                arrays['Open'], arrays['High'], arrays['Low'], arrays['Close'], arrays['Volume'], out=out
+            )
+            yield slice(start, stop), arrays, indicators
+
+    def indicators(self):
+        """Indikator untuk seluruh panel sebagai {nama: array [n_dates, n_tickers]} (salinan baru)"""
+        result = {name: np.empty((len(self.dates), len(self.tickers))) for name in INDICATORS}
+        for columns, _, indicators in self.iter_indicators():
+            for name in INDICATORS:
+                result[name][:, columns] = indicators[name]
+        return result
+
+    def scan(self, threshold=0.02, chunk=None):
+        """Baris yang memicu sinyal (gap down ≥ threshold DAN OBV naik) sebagai DataFrame panjang: Date, Ticker, OHLCV, indikator.
+
+        `threshold` boleh skalar atau array per ticker (panjang n_tickers).
+        """
+        columns = ['Date', 'Ticker'] + FIELDS + INDICATORS
+        tickers = np.asarray(self.tickers, dtype=object)
+        threshold = np.asarray(threshold, dtype=float)
+        parts = []
+        for sl, arrays, indicators in self.iter_indicators(chunk):
+            limit = threshold[sl] if threshold.ndim else threshold
+            rows, cols = np.nonzero(signal_mask(indicators, limit))
+            if not len(rows):
+                continue
+            part = {'Date': self.dates[rows], 'Ticker': tickers[sl][cols]}
+            for field in FIELDS:
+                part[field] = arrays[field][rows, cols]
+            for name in INDICATORS:
+                part[name] = indicators[name][rows, cols]
+            parts.append(pd.DataFrame(part, columns=columns))
+
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(parts, ignore_index=True).sort_values(['Date', 'Ticker'], kind='stable', ignore_index=True)
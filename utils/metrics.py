@@ -0,0 +1,238 @@
+import time
+import json
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Jumlah sampel terakhir yang disimpan per histogram (untuk p50/p95)
+MAX_SAMPLES = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = 'gapbot_'
+
+class Histogram:
+    """Distribusi latency: count/sum total + sampel terbaru untuk kuantil"""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            **{f'p{int(q * 100)}': self.quantile(q) for q in QUANTILES},
+        }
+
+class Metrics:
+    """Registry counter & histogram sederhana, thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_scan = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Ukur durasi blok `with` (detik) ke histogram `name`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def checkpoint(self):
+        """Salinan nilai counter & histogram saat ini, untuk delta() nanti"""
+        with self._lock:
+            return (
+                dict(self.counters),
+                {key: (hist.count, hist.total) for key, hist in self.histograms.items()},
+            )
+
+    def delta(self, checkpoint):
+        """Perubahan sejak `checkpoint`: ({key: tambahan}, {key: (tambahan count, total, sampel baru)}).
+
+        Dipakai proses worker untuk mengirim metrik ke proses induk (lihat merge()).
+        """
+        counters, histograms = checkpoint
+        with self._lock:
+            counter_delta = {
+                key: value - counters.get(key, 0)
+                for key, value in self.counters.items() if key not in counters or value != counters[key]
+            }
+            histogram_delta = {}
+            for key, hist in self.histograms.items():
+                count, total = histograms.get(key, (0, 0.0))
+                if hist.count > count:
+                    new = min(hist.count - count, len(hist.samples))
+                    histogram_delta[key] = (hist.count - count, hist.total - total, list(hist.samples)[len(hist.samples) - new:])
+        return counter_delta, histogram_delta
+
+    def merge(self, delta):
+        """Tambahkan hasil delta() dari proses lain ke registry ini"""
+        counter_delta, histogram_delta = delta
+        with self._lock:
+            for key, value in counter_delta.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (count, total, samples) in histogram_delta.items():
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                hist = self.histograms[key]
+                hist.count += count
+                hist.total += total
+                hist.samples.extend(samples)
+
+    def record_scan(self, ticker_seconds, total_seconds, signals):
+        """Simpan ringkasan scan terakhir (latency data per ticker)"""
+        with self._lock:
+            self.last_scan = {
+                'finished_at': time.time(),
+                'total_seconds': total_seconds,
+                'tickers': len(ticker_seconds),
+                'signals': signals,
+                'ticker_seconds': dict(ticker_seconds),
+            }
+
+    def slowest_tickers(self, n=5):
+        ticker_seconds = self.last_scan.get('ticker_seconds', {})
+        return sorted(ticker_seconds.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def hit_rate(self, name):
+        """Rasio hit untuk counter `name` berlabel result=hit/..."""
+        hits, total = 0, 0
+        with self._lock:
+            for (counter, labels), value in self.counters.items():
+                if counter != name:
+                    continue
+                total += value
+                if dict(labels).get('result') == 'hit':
+                    hits += value
+        return hits / total if total else None
+
+    def to_json(self):
+        with self._lock:
+            data = {
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), **hist.snapshot()}
+                    for (name, labels), hist in sorted(self.histograms.items())
+                ],
+                'last_scan': {k: v for k, v in self.last_scan.items() if k != 'ticker_seconds'},
+            }
+        data['last_scan']['slowest_tickers'] = self.slowest_tickers(10)
+        return json.dumps(data, indent=2)
+
+    def to_prometheus(self):
+        """Format teks Prometheus (histogram diekspor sebagai summary)"""
+        def fmt_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {PREFIX}{name} counter')
+                    typed.add(name)
+                lines.append(f'{PREFIX}{name}{fmt_labels(labels)} {value}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {PREFIX}{name} summary')
+                    typed.add(name)
+                for q in QUANTILES:
+                    value = hist.quantile(q)
+                    if value is not None:
+                        lines.append(f'{PREFIX}{name}{fmt_labels(labels, [("quantile", q)])} {value}')
+                lines.append(f'{PREFIX}{name}_sum{fmt_labels(labels)} {hist.total}')
+                lines.append(f'{PREFIX}{name}_count{fmt_labels(labels)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def format_summary(self):
+        """Ringkasan teks untuk perintah /stats"""
+        lines = ["📊 <b>Statistik Bot</b>", "", "<b>Latency (p50 / p95, ms)</b>"]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), hist in histograms:
+            label = ','.join(f'{k}={v}' for k, v in labels)
+            name = f"{name}[{label}]" if label else name
+            lines.append(
+                f"• {name}: {hist.quantile(0.5) * 1000:.0f} / {hist.quantile(0.95) * 1000:.0f} (n={hist.count})"
+            )
+
+        lines += ["", "<b>Cache hit rate</b>"]
+        for name in ('bar_cache_requests_total', 'chart_cache_requests_total', 'coalesce_requests_total'):
+            rate = self.hit_rate(name)
+            lines.append(f"• {name.replace('_requests_total', '')}: {rate * 100:.0f}%" if rate is not None
+                         else f"• {name.replace('_requests_total', '')}: -")
+
+        failures = [(name, labels, value) for (name, labels), value in counters if 'failures' in name or 'errors' in name]
+        if failures:
+            lines += ["", "<b>Kegagalan</b>"]
+            for name, labels, value in failures:
+                label = ','.join(f'{k}={v}' for k, v in labels)
+                lines.append(f"• {name}{f'[{label}]' if label else ''}: {value}")
+
+        if self.last_scan:
+            scan = self.last_scan
+            finished = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(scan['finished_at']))
+            lines += [
+                "",
+                f"<b>Scan terakhir</b> ({finished})",
+                f"• {scan['tickers']} ticker, {scan['signals']} alert, {scan['total_seconds']:.1f}s",
+                "• Ticker paling lambat: " + ", ".join(
+                    f"{code.replace('.JK', '')} ({seconds:.1f}s)" for code, seconds in self.slowest_tickers(5)
+                ),
+            ]
+        return "\n".join(lines)
+
+metrics = Metrics()
+
+def timed_handler(command):
+    """Decorator handler Telegram: catat latency end-to-end dan error per command"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            with metrics.timer('handler_seconds', command=command):
+                try:
+                    return await func(update, context)
+                except Exception:
+                    metrics.inc('handler_errors_total', command=command)
+                    raise
+        return wrapper
+    return decorator
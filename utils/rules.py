@@ -0,0 +1,363 @@
+import os
+import json
+import math
+import threading
+import numpy as np
+import pandas as pd
+from utils.signal_engine import FIELDS, INDICATORS, _prev_valid
+from utils.bar_cache import period_start
+
+# Definisi rule sinyal (deklaratif), lihat data/rules.json
+RULES_FILE = os.getenv('RULES_FILE', 'data/rules.json')
+DEFAULT_RULE = 'gap_obv'
+# Umur maksimum sinyal yang dikirim, dalam bar dari bar terakhir ticker (0 = hanya bar sesi terakhir)
+SIGNAL_MAX_AGE_BARS = int(os.getenv('SIGNAL_MAX_AGE_BARS', '0'))
+# Lookback maksimum rule (bar); rule yang butuh lebih panjang ditolak saat dimuat
+RULE_MAX_LOOKBACK = int(os.getenv('RULE_MAX_LOOKBACK', '250'))
+
+# Rule bawaan = strategi lama detect_gap_down; tetap ada walau file rule tidak bisa dibaca
+BUILTIN_RULES = {
+    DEFAULT_RULE: {
+        'description': 'Gap down + akumulasi OBV',
+        'when': [['gap_pct', '<=', '-threshold'], ['obv_change', '>', 0]],
+    },
+}
+
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+}
+
+# Indikator primitif tanpa parameter: kolom OHLCV + hasil compute_indicators
+BASE_INDICATORS = {field.lower(): field for field in FIELDS}
+BASE_INDICATORS.update({name.lower(): name for name in INDICATORS})
+
+# Kondisi threshold yang makin longgar jika threshold makin kecil: scan per ticker
+# memakai threshold terkecil subscriber, jadi hanya arah ini yang boleh dipakai
+LOOSER_WITH_SMALLER_THRESHOLD = {'-threshold': ('<', '<='), 'threshold': ('>', '>=')}
+
+def _rolling_mean(values, window):
+    """Rata-rata bergerak `window` bar per kolom (NaN jika ada bar kosong di jendela), via cumsum"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[0] < window:
+        return result
+    missing = np.isnan(values)
+    sums = np.cumsum(np.where(missing, 0.0, values), axis=0)
+    gaps = np.cumsum(missing, axis=0)
+    total = sums[window - 1:].copy()
+    total[1:] -= sums[:-window]
+    holes = gaps[window - 1:].copy()
+    holes[1:] -= gaps[:-window]
+    result[window - 1:] = np.where(holes == 0, total / window, np.nan)
+    return result
+
+def _sma(plan, window):
+    return _rolling_mean(plan.value('close'), int(window))
+
+def _volume_ratio(plan, window):
+    """Volume hari ini dibanding rata-rata `window` bar SEBELUMNYA (2 = dua kali rata-rata)"""
+    average = _rolling_mean(plan.value('volume'), int(window))
+    previous = np.full(average.shape, np.nan)
+    previous[1:] = average[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return plan.value('volume') / previous
+
+def _ad_change(plan):
+    ad_line = plan.value('ad_line')
+    return ad_line - _prev_valid(ad_line)
+
+def _ma_cross(plan, fast, slow):
+    """+1 di bar MA cepat memotong ke atas MA lambat, -1 memotong ke bawah, 0 selain itu"""
+    spread = plan.value(f'sma:{fast}') - plan.value(f'sma:{slow}')
+    previous = np.full(spread.shape, np.nan)
+    previous[1:] = spread[:-1]
+    with np.errstate(invalid='ignore'):
+        cross = np.where((spread > 0) & (previous <= 0), 1.0, 0.0)
+        cross[(spread < 0) & (previous >= 0)] = -1.0
+    cross[np.isnan(spread) | np.isnan(previous)] = np.nan
+    return cross
+
+# Indikator turunan: nama -> (fungsi, jumlah parameter). Dipakai sebagai 'nama:p1:p2'.
+DERIVED_INDICATORS = {
+    'sma': (_sma, 1),
+    'volume_ratio': (_volume_ratio, 1),
+    'ad_change': (_ad_change, 0),
+    'ma_cross': (_ma_cross, 2),
+}
+
+# Bar histori yang dibutuhkan supaya indikator punya nilai di bar terakhir
+BASE_LOOKBACK = {'gap_pct': 2, 'obv_change': 2}
+DERIVED_LOOKBACK = {
+    'sma': lambda window: window,
+    'volume_ratio': lambda window: window + 1,   # rata-rata `window` bar SEBELUM bar ini
+    'ad_change': lambda: 2,
+    'ma_cross': lambda fast, slow: max(fast, slow) + 1,
+}
+
+def indicator_lookback(key):
+    name, *params = key.split(':')
+    if name in BASE_INDICATORS and not params:
+        return BASE_LOOKBACK.get(name, 1)
+    return DERIVED_LOOKBACK[name](*(int(p) for p in params))
+
+def lookback_period(bars):
+    """Period (hari kalender, format 'Nd') yang memuat `bars` hari bursa, dengan cadangan libur"""
+    return f"{math.ceil(bars * 7 / 5) + 14}d"
+
+def _check_indicator(key):
+    name, *params = key.split(':')
+    if name in BASE_INDICATORS and not params:
+        return
+    if name not in DERIVED_INDICATORS:
+        raise ValueError(f"indikator tidak dikenal: {key}")
+    if len(params) != DERIVED_INDICATORS[name][1] or not all(p.isdigit() and int(p) > 0 for p in params):
+        raise ValueError(f"parameter indikator tidak valid: {key}")
+
+class Rule:
+    """Rule sinyal: semua kondisi [indikator, operator, operand] harus terpenuhi.
+
+    Operand berupa angka, `threshold`/`-threshold` (batas gap per ticker)
+    atau nama indikator lain (mis. ['close', '>', 'sma:20']).
+    """
+
+    def __init__(self, name, when, description=None):
+        self.name = name
+        self.description = description or name
+        self.conditions = []
+        for condition in when:
+            left, op, right = condition
+            if op not in OPERATORS:
+                raise ValueError(f"operator tidak dikenal: {op}")
+            _check_indicator(left)
+            if isinstance(right, str) and right.lstrip('-') == 'threshold':
+                if op not in LOOSER_WITH_SMALLER_THRESHOLD[right]:
+                    raise ValueError(
+                        f"kondisi {left} {op} {right} tidak didukung (pakai '<'/'<=' untuk -threshold, "
+                        f"'>'/'>=' untuk threshold)"
+                    )
+            elif isinstance(right, str):
+                _check_indicator(right)
+            self.conditions.append((left, op, right))
+        if not self.conditions:
+            raise ValueError("rule tanpa kondisi")
+        self.lookback = max(indicator_lookback(key) for key in self.indicators())
+        if self.lookback > RULE_MAX_LOOKBACK:
+            raise ValueError(f"butuh {self.lookback} bar histori, maksimum {RULE_MAX_LOOKBACK} (RULE_MAX_LOOKBACK)")
+
+    @property
+    def uses_threshold(self):
+        return any(isinstance(right, str) and right.lstrip('-') == 'threshold' for _, _, right in self.conditions)
+
+    def threshold_indicators(self):
+        """Indikator di sisi kiri kondisi yang memakai threshold (nilainya dibawa di hasil scan)"""
+        for left, _, right in self.conditions:
+            if isinstance(right, str) and right.lstrip('-') == 'threshold':
+                yield left
+
+    def matches_threshold(self, signal, threshold):
+        """Cek ulang hanya kondisi ber-threshold untuk satu sinyal dengan `threshold` lain.
+
+        `signal` = baris hasil scan_rules / latest_rule_signals (Series/dict).
+        Kondisi yang nilainya tidak ada di sinyal dianggap lolos (sudah lolos saat scan).
+        """
+        for left, op, right in self.conditions:
+            if not (isinstance(right, str) and right.lstrip('-') == 'threshold'):
+                continue
+            value = signal.get(BASE_INDICATORS.get(left, left))
+            if value is None or pd.isna(value):
+                continue
+            operand = -threshold if right.startswith('-') else threshold
+            if not OPERATORS[op](value, operand):
+                return False
+        return True
+
+    def indicators(self):
+        """Indikator yang dibutuhkan rule ini (untuk planner)"""
+        for left, _, right in self.conditions:
+            yield left
+            if isinstance(right, str) and right.lstrip('-') != 'threshold':
+                yield right
+
+    def evaluate(self, plan, threshold):
+        mask = None
+        with np.errstate(invalid='ignore'):
+            for left, op, right in self.conditions:
+                if isinstance(right, str):
+                    if right.lstrip('-') == 'threshold':
+                        operand = -threshold if right.startswith('-') else threshold
+                    else:
+                        operand = plan.value(right)
+                else:
+                    operand = right
+                result = OPERATORS[op](plan.value(left), operand)
+                mask = result if mask is None else mask & result
+        return mask
+
+class IndicatorPlan:
+    """Planner: hitung setiap indikator yang dibutuhkan sekumpulan rule tepat sekali per panel.
+
+    `arrays` = {field OHLCV: [n_dates, n_tickers]}, `base` = hasil
+    compute_indicators untuk panel yang sama. Indikator turunan (sma, volume
+    ratio, MA cross, ...) dihitung saat pertama diminta lalu dipakai ulang
+    oleh semua rule, termasuk yang saling bergantung (ma_cross memakai sma).
+    """
+
+    def __init__(self, rules, arrays, base):
+        self.rules = list(rules)
+        self.arrays = arrays
+        self.base = base
+        self.values = {}
+        self.required = list(dict.fromkeys(key for rule in self.rules for key in rule.indicators()))
+        self.lookback = max((rule.lookback for rule in self.rules), default=1)
+
+    def value(self, key):
+        if key not in self.values:
+            name, *params = key.split(':')
+            if name in BASE_INDICATORS and not params:
+                column = BASE_INDICATORS[name]
+                self.values[key] = self.arrays[column] if column in self.arrays else self.base[column]
+            else:
+                func, _ = DERIVED_INDICATORS[name]
+                self.values[key] = func(self, *params)
+        return self.values[key]
+
+    def evaluate(self, threshold=0.02):
+        """Mask semua rule dalam satu lintasan: {nama rule: bool [n_dates, n_tickers]}"""
+        for key in self.required:
+            self.value(key)
+        return {rule.name: rule.evaluate(self, threshold) for rule in self.rules}
+
+_rules = None
+_lock = threading.Lock()
+
+def _load():
+    """Muat rule bawaan + file rule sekali per proses; rule yang tidak valid dilewati dengan peringatan"""
+    global _rules
+    with _lock:
+        if _rules is None:
+            specs = dict(BUILTIN_RULES)
+            try:
+                with open(RULES_FILE, 'r') as f:
+                    specs.update({name: spec for name, spec in json.load(f).items() if not name.startswith('_')})
+            except FileNotFoundError:
+                pass
+            except json.JSONDecodeError as e:
+                print(f"⚠️ File rule tidak bisa dibaca ({RULES_FILE}): {str(e)}")
+            rules = {}
+            for name, spec in specs.items():
+                try:
+                    rules[name] = Rule(name, spec['when'], spec.get('description'))
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"⚠️ Rule {name} dilewati: {str(e)}")
+            _rules = rules
+        return _rules
+
+def reload_rules():
+    """Baca ulang file rule (setelah file diperbarui)"""
+    global _rules
+    with _lock:
+        _rules = None
+    return _load()
+
+def available_rules():
+    """{nama: Rule} untuk semua rule yang valid"""
+    return dict(_load())
+
+def get_rule(name):
+    return _load().get(name)
+
+def get_rules(names=None):
+    """Objek Rule untuk `names` (default: rule bawaan); nama yang tidak dikenal dilewati"""
+    rules = _load()
+    names = names or [DEFAULT_RULE]
+    return [rules[name] for name in dict.fromkeys(names) if name in rules]
+
+def scan_period(rules, period='1mo'):
+    """Period fetch untuk scan `rules`: `period`, diperpanjang jika lookback rule tidak muat.
+
+    Histori 1 bulan hanya ~20 bar (lebih sedikit jika ada libur), jadi rule
+    seperti sma:20 / volume_ratio:20 tidak akan punya nilai di bar terakhir.
+    """
+    lookback = max((rule.lookback for rule in rules), default=1)
+    needed = lookback_period(lookback)
+    return needed if period_start(needed) < period_start(period) else period
+
+def scan_rules(frames, rules=None, threshold=0.02):
+    """Evaluasi banyak rule sekaligus untuk dict {kode: DataFrame}.
+
+    Indikator bersama dihitung sekali per potongan ticker (lihat
+    IndicatorPlan), lalu semua rule dievaluasi di lintasan yang sama.
+    Hasil: DataFrame panjang seperti scan_frames plus kolom Rule, satu
+    baris per (tanggal, ticker, rule) yang memicu. Indikator turunan yang
+    dipakai kondisi ber-threshold (lihat threshold_columns) ikut sebagai
+    kolom, supaya rule bisa dicek ulang per chat. `threshold` boleh dict
+    {kode: threshold}.
+    """
+    from utils.market_store import MarketStore
+
+    rules = rules or get_rules()
+    extra = threshold_columns(rules)
+    columns = ['Date', 'Ticker', 'Rule'] + FIELDS + INDICATORS + extra
+    store = MarketStore.from_frames(frames)
+    if isinstance(threshold, dict):
+        threshold = np.array([threshold.get(code, 0.02) for code in store.tickers], dtype=float)
+    threshold = np.asarray(threshold, dtype=float)
+    tickers = np.asarray(store.tickers, dtype=object)
+
+    parts = []
+    for sl, arrays, base in store.iter_indicators():
+        limit = threshold[sl] if threshold.ndim else threshold
+        plan = IndicatorPlan(rules, arrays, base)
+        for rule_name, mask in plan.evaluate(limit).items():
+            rows, cols = np.nonzero(mask)
+            if not len(rows):
+                continue
+            part = {'Date': store.dates[rows], 'Ticker': tickers[sl][cols], 'Rule': rule_name}
+            for field in FIELDS:
+                part[field] = arrays[field][rows, cols]
+            for name in INDICATORS:
+                part[name] = base[name][rows, cols]
+            for key in extra:
+                part[key] = plan.value(key)[rows, cols]
+            parts.append(pd.DataFrame(part, columns=columns))
+
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True).sort_values(['Date', 'Ticker', 'Rule'], kind='stable', ignore_index=True)
+
+def threshold_columns(rules):
+    """Indikator turunan (bukan kolom OHLCV/INDICATORS) di kondisi ber-threshold `rules`"""
+    return list(dict.fromkeys(
+        key for rule in rules for key in rule.threshold_indicators() if key not in BASE_INDICATORS
+    ))
+
+def latest_rule_signals(fired):
+    """Sinyal terakhir per ticker sebagai {kode: Series}; kolom Rules = semua rule yang memicu di tanggal itu"""
+    latest = {}
+    if fired.empty:
+        return latest
+    last_dates = fired.groupby('Ticker', sort=False)['Date'].transform('max')
+    fired = fired[fired['Date'] == last_dates]
+    for code, group in fired.groupby('Ticker', sort=False):
+        row = group.iloc[0].drop(['Ticker', 'Date', 'Rule'])
+        row['Rules'] = list(group['Rule'])
+        row.name = group['Date'].iloc[0]
+        latest[code] = row
+    return latest
+
+def fresh_signals(latest, frames, max_age=None):
+    """Saring hasil latest_rule_signals: buang sinyal yang lebih dari `max_age` bar sebelum bar terakhir ticker-nya.
+
+    Scan membaca histori 1 bulan, jadi tanpa saringan ini rule yang terakhir
+    memicu dua minggu lalu ikut terkirim sebagai sinyal baru.
+    """
+    max_age = SIGNAL_MAX_AGE_BARS if max_age is None else max_age
+    fresh = {}
+    for code, signal in latest.items():
+        index = frames[code].index if code in frames else None
+        if index is not None and len(index) - index.searchsorted(signal.name) - 1 <= max_age:
+            fresh[code] = signal
+    return fresh
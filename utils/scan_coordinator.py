@@ -0,0 +1,333 @@
+"""Koordinator scan ber-shard untuk seluruh saham IDX.
+
+Universe ticker dipecah menjadi shard; setiap shard di-fetch dan dianalisis
+(semua rule, lihat utils/rules.py) di proses worker terpisah. Worker hanya
+mengirim balik sinyal terakhir + potongan bar untuk grafik dalam bentuk
+array numpy ringkas, bukan DataFrame lengkap.
+
+Contoh:
+    python -m utils.scan_coordinator --workers 4 --shard-size 100 --rules gap_obv,gap_volume
+    python -m utils.scan_coordinator --universe data/idx_universe.txt --csv sinyal.csv
+"""
+import os
+import time
+import asyncio
+import argparse
+import threading
+import functools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.executor import get_io_pool, worker_context
+from utils.metrics import metrics
+
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', '2'))            # proses worker scan (0 = pakai thread I/O)
+SCAN_SHARD_SIZE = int(os.getenv('SCAN_SHARD_SIZE', '100'))     # ticker per shard
+SHARD_RETRIES = int(os.getenv('SHARD_RETRIES', '1'))           # percobaan ulang shard yang gagal
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', '300'))       # detik per shard sebelum dianggap gagal
+UNIVERSE_FILE = os.getenv('UNIVERSE_FILE', 'data/idx_universe.txt')
+CHART_BARS = 30  # bar yang dikirim balik per sinyal untuk grafik (= CHART_WINDOW)
+
+SIGNAL_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Gap_pct', 'OBV', 'OBV_Change', 'AD_Line']
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def load_universe(path=None):
+    """Ticker seluruh bursa dari UNIVERSE_FILE (satu kode per baris / dipisah koma).
+
+    Jika file belum ada: semua kode di data/sectors.json + watchlist global.
+    """
+    path = path or UNIVERSE_FILE
+    try:
+        with open(path, 'r') as f:
+            codes = [code.strip().upper() for line in f for code in line.split(',')]
+        codes = [code for code in codes if code and not code.startswith('#')]
+    except FileNotFoundError:
+        from utils.sectors import all_tickers
+        from utils.watchlist_manager import load_watchlist
+        codes = all_tickers(load_watchlist())
+    return list(dict.fromkeys(code if code.endswith('.JK') else f"{code}.JK" for code in codes))
+
+def make_shards(stock_codes, shard_size=None):
+    shard_size = shard_size or SCAN_SHARD_SIZE
+    stock_codes = list(dict.fromkeys(stock_codes))
+    return [stock_codes[i:i + shard_size] for i in range(0, len(stock_codes), shard_size)]
+
+def scan_shard(shard_id, stock_codes, period='1mo', rule_names=None, threshold=0.02, bars=CHART_BARS):
+    """Dijalankan di worker: fetch + evaluasi rule untuk satu shard, kembalikan hasil ringkas.
+
+    Hanya sinyal yang masih baru (lihat rules.fresh_signals) yang dikembalikan.
+    Hasil berupa dict array numpy: nilai sinyal terakhir per ticker
+    [n_sinyal, kolom], daftar rule yang memicu, dan bar grafik semua sinyal
+    digabung jadi satu array float32 [total_bar, 5] + offset per sinyal.
+    Metrik yang dicatat selama shard (fetch, cache bar, indikator) ikut
+    dikembalikan sebagai delta supaya bisa digabung di proses induk.
+    """
+    from utils.data_fetcher import get_bulk_stock_data
+    from utils.rules import scan_rules, latest_rule_signals, fresh_signals, get_rules, threshold_columns
+
+    checkpoint = metrics.checkpoint()
+    started = time.perf_counter()
+    frames = get_bulk_stock_data(stock_codes, period=period)
+    fetched = time.perf_counter() - started
+    if isinstance(threshold, dict):
+        threshold = {code: threshold[code] for code in frames if code in threshold}
+    rules = get_rules(rule_names)
+    latest = {}
+    if frames:
+        with metrics.timer('indicator_seconds'):
+            latest = fresh_signals(latest_rule_signals(scan_rules(frames, rules, threshold)), frames)
+    extra = threshold_columns(rules)
+
+    codes = list(latest)
+    windows = [frames[code].loc[:latest[code].name].tail(bars) for code in codes]
+    offsets = np.cumsum([0] + [len(window) for window in windows])
+    return {
+        'shard': shard_id,
+        'tickers': len(stock_codes),
+        'fetched': list(frames),
+        'fetch_seconds': fetched,
+        'elapsed': time.perf_counter() - started,
+        'codes': codes,
+        'dates': np.array([latest[code].name for code in codes], dtype='datetime64[ns]'),
+        'values': np.array([[latest[code][c] for c in SIGNAL_COLUMNS] for code in codes], dtype=np.float64).reshape(-1, len(SIGNAL_COLUMNS)),
+        'rules': [list(latest[code]['Rules']) for code in codes],
+        'extra': [{key: float(latest[code][key]) for key in extra} for code in codes],
+        'bar_dates': np.concatenate([w.index.values for w in windows]) if windows else np.array([], dtype='datetime64[ns]'),
+        'bars': np.concatenate([w[BAR_COLUMNS].to_numpy(np.float32) for w in windows]) if windows else np.empty((0, 5), np.float32),
+        'offsets': offsets,
+        'pid': os.getpid(),
+        'metrics': metrics.delta(checkpoint),
+    }
+
+def unpack_shard(result):
+    """Kebalikan scan_shard: yield (kode, Series sinyal, DataFrame bar grafik)"""
+    for i, code in enumerate(result['codes']):
+        signal = pd.Series(dict(zip(SIGNAL_COLUMNS, result['values'][i])), name=pd.Timestamp(result['dates'][i]))
+        for key, value in result.get('extra', [{}] * len(result['codes']))[i].items():
+            signal[key] = value  # indikator turunan untuk cek ulang threshold per chat
+        signal['Rules'] = result['rules'][i]
+        start, stop = result['offsets'][i], result['offsets'][i + 1]
+        data = pd.DataFrame(
+            result['bars'][start:stop].astype(np.float64),
+            index=pd.DatetimeIndex(result['bar_dates'][start:stop]),
+            columns=BAR_COLUMNS
+        )
+        yield code, signal, data
+
+def _worker_state():
+    """State proses induk yang harus dibawa ke worker (worker tidak di-fork, lihat worker_context)"""
+    from utils import bar_cache
+    from utils.data_source import get_source
+    return get_source(), bar_cache.BAR_CACHE_DIR
+
+def _init_worker(source, bar_cache_dir):
+    from utils import bar_cache
+    from utils.data_source import set_source
+    set_source(source)
+    bar_cache.BAR_CACHE_DIR = bar_cache_dir
+
+def _new_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=worker_context(),
+        initializer=_init_worker, initargs=_worker_state()
+    )
+
+def _warm_worker():
+    """Muat modul berat di proses worker, kembalikan PID-nya"""
+    import utils.data_fetcher  # noqa: F401
+    import utils.rules  # noqa: F401
+    time.sleep(0.2)  # tahan sebentar supaya tugas berikutnya jatuh ke worker lain
+    return os.getpid()
+
+class ScanCoordinator:
+    """Jalankan shard di pool proses worker, ulangi shard yang gagal, teruskan hasil begitu shard selesai.
+
+    Shard yang tetap gagal setelah `retries` dicatat (metrics + log) dan
+    dilewati; shard lain tetap jalan. Pool yang rusak (worker mati) dibuat
+    ulang sebelum percobaan berikutnya. Pool dipakai ulang antar scan (lihat
+    get_coordinator), jadi worker cukup di-fork dan dipanaskan sekali.
+    """
+
+    def __init__(self, workers=SCAN_WORKERS, shard_size=SCAN_SHARD_SIZE, retries=SHARD_RETRIES, timeout=SHARD_TIMEOUT):
+        self.workers = workers
+        self.shard_size = shard_size
+        self.retries = retries
+        self.timeout = timeout
+        self.failed = []  # ticker dari shard yang gagal pada run terakhir
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        if self.workers <= 0:
+            return get_io_pool()
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = _new_pool(self.workers)
+            return self._pool
+
+    def _reset_pool(self, pool=None):
+        """Matikan pool aktif (atau hanya jika masih `pool`, karena shard lain mungkin sudah membuat pool baru)"""
+        with self._pool_lock:
+            if self._pool is None or (pool is not None and pool is not self._pool):
+                return
+            stale, self._pool = self._pool, None
+        stale.shutdown(wait=False, cancel_futures=True)
+
+    async def warm(self):
+        """Hidupkan semua proses worker sebelum scan, kembalikan set PID worker"""
+        if self.workers <= 0:
+            get_io_pool()
+            return set()
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        pids = set()
+        for _ in range(5):  # worker dibuat bertahap; ulangi sampai semua sudah menjawab
+            pids.update(await asyncio.gather(*[loop.run_in_executor(pool, _warm_worker) for _ in range(self.workers)]))
+            if len(pids) >= self.workers:
+                break
+        return pids
+
+    async def _submit(self, pool, shard_id, stock_codes, kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(pool, functools.partial(scan_shard, shard_id, stock_codes, **kwargs))
+        result = await asyncio.wait_for(future, self.timeout)
+        if result['pid'] != os.getpid():
+            metrics.merge(result['metrics'])  # shard di proses lain: metriknya belum tercatat di sini
+        return result
+
+    async def _run_shard(self, shard_id, stock_codes, failed, retry_slots, **kwargs):
+        """Jalankan satu shard; percobaan ulang memakai proses tersendiri.
+
+        Worker yang mati merusak seluruh pool bersama, jadi shard lain yang
+        sedang jalan ikut gagal. Dengan mengulang tiap shard di proses
+        sendiri, shard penyebab crash hanya menggagalkan dirinya sendiri.
+        """
+        for attempt in range(self.retries + 1):
+            isolated = attempt > 0 and self.workers > 0
+            if attempt:
+                metrics.inc('scan_shard_retries_total')
+            pool = _new_pool(1) if isolated else self._get_pool()
+            try:
+                if isolated:
+                    async with retry_slots:  # paling banyak `workers` proses ulangan sekaligus
+                        return await self._submit(pool, shard_id, stock_codes, kwargs)
+                return await self._submit(pool, shard_id, stock_codes, kwargs)
+            except BrokenProcessPool as e:
+                error = e
+                if not isolated:
+                    self._reset_pool(pool)
+            except asyncio.TimeoutError as e:
+                error = e
+            except Exception as e:
+                error = e
+            finally:
+                if isolated:
+                    pool.shutdown(wait=False, cancel_futures=True)
+            print(f"⚠️ Shard {shard_id} ({len(stock_codes)} ticker) gagal (percobaan {attempt + 1}): {error!r}")
+
+        metrics.inc('scan_shard_failures_total')
+        failed.extend(stock_codes)
+        return None
+
+    async def run(self, stock_codes, period='1mo', rule_names=None, threshold=0.02):
+        """Async generator: yield hasil scan_shard per shard sesuai urutan selesai"""
+        # State per run (bukan atribut) supaya scan yang berjalan bersamaan tidak saling menimpa
+        failed = self.failed = []
+        retry_slots = asyncio.Semaphore(max(self.workers, 1))
+        shards = make_shards(stock_codes, self.shard_size)
+        tasks = []
+        for shard_id, codes in enumerate(shards):
+            shard_threshold = {code: threshold[code] for code in codes if code in threshold} if isinstance(threshold, dict) else threshold
+            tasks.append(asyncio.ensure_future(
+                self._run_shard(shard_id, codes, failed, retry_slots, period=period, rule_names=rule_names, threshold=shard_threshold)
+            ))
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                if result is not None:
+                    metrics.observe('scan_shard_seconds', result['elapsed'])
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+        if failed:
+            print(f"⚠️ {len(failed)} ticker tidak terscan karena shard gagal")
+
+    def close(self):
+        self._reset_pool()
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+def get_coordinator():
+    """Koordinator bersama untuk scan terjadwal / manual; pool worker-nya hidup sampai close_coordinator()"""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = ScanCoordinator()
+        return _coordinator
+
+def close_coordinator():
+    """Matikan pool worker koordinator bersama (dipanggil saat bot berhenti)"""
+    global _coordinator
+    with _coordinator_lock:
+        coordinator, _coordinator = _coordinator, None
+    if coordinator is not None:
+        coordinator.close()
+
+async def scan_universe(stock_codes=None, period='1mo', rule_names=None, threshold=0.02, coordinator=None):
+    """Scan seluruh universe, kembalikan (DataFrame sinyal terakhir per ticker, ringkasan)"""
+    from utils.rules import get_rules, scan_period
+
+    stock_codes = stock_codes or load_universe()
+    period = scan_period(get_rules(rule_names), period)
+    coordinator = coordinator or ScanCoordinator()
+    started = time.perf_counter()
+    rows, fetched, shards = [], 0, 0
+    try:
+        async for result in coordinator.run(stock_codes, period=period, rule_names=rule_names, threshold=threshold):
+            shards += 1
+            fetched += len(result['fetched'])
+            for code, signal, _ in unpack_shard(result):
+                rows.append({'Date': signal.name, 'Ticker': code, **signal.to_dict()})
+    finally:
+        coordinator.close()
+    signals = pd.DataFrame(rows, columns=['Date', 'Ticker'] + SIGNAL_COLUMNS + ['Rules'])
+    if len(signals):
+        signals = signals.sort_values(['Gap_pct', 'OBV_Change'], ascending=[True, False], ignore_index=True)
+    summary = {
+        'tickers': len(stock_codes),
+        'fetched': fetched,
+        'shards': shards,
+        'failed_tickers': list(coordinator.failed),
+        'seconds': time.perf_counter() - started,
+    }
+    return signals, summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan ber-shard seluruh saham IDX")
+    parser.add_argument('--universe', default=None, help="File daftar ticker (default: UNIVERSE_FILE / sektor + watchlist)")
+    parser.add_argument('--workers', type=int, default=SCAN_WORKERS, help="Jumlah proses worker (0 = thread)")
+    parser.add_argument('--shard-size', type=int, default=SCAN_SHARD_SIZE, help="Ticker per shard")
+    parser.add_argument('--period', default='1mo', help="Panjang histori (format yfinance)")
+    parser.add_argument('--rules', default=None, help="Nama rule dipisah koma (default: rule bawaan)")
+    parser.add_argument('--threshold', type=float, default=0.02, help="Batas gap down (persen)")
+    parser.add_argument('--csv', default=None, help="Simpan sinyal ke CSV")
+    args = parser.parse_args(argv)
+
+    coordinator = ScanCoordinator(workers=args.workers, shard_size=args.shard_size)
+    rule_names = args.rules.split(',') if args.rules else None
+    signals, summary = asyncio.run(scan_universe(
+        load_universe(args.universe), args.period, rule_names, args.threshold, coordinator
+    ))
+
+    print(f"Universe: {summary['tickers']} ticker, {summary['fetched']} berdata, "
+          f"{summary['shards']} shard, {len(summary['failed_tickers'])} gagal ({summary['seconds']:.2f}s)")
+    print(signals.head(30).to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    if args.csv:
+        signals.to_csv(args.csv, index=False)
+        print(f"Sinyal disimpan ke {args.csv}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import itertools
+from utils.data_fetcher import render_chart, CHART_WINDOW
+from utils.rules import get_rule, get_rules, scan_period, DEFAULT_RULE
+from utils.alert_sender import send_signal_alert
+from utils.executor import CPU_WORKERS
+from utils.scan_coordinator import get_coordinator, unpack_shard
+from utils.metrics import metrics
+
+# Jumlah grafik yang dirender bersamaan
+RENDER_CONCURRENCY = int(os.getenv('RENDER_CONCURRENCY', str(max(CPU_WORKERS, 1))))
+
+_DONE = object()
+
+async def shard_stage(stock_codes, period='1mo', threshold=0.02, rules=None, coordinator=None, ticker_seconds=None):
+    """Stage 1+2 ber-shard: fetch + deteksi per shard di proses worker, yield (kode, baris sinyal, data grafik).
+
+    Shard yang gagal dilewati (lihat ScanCoordinator); sinyal dari shard lain tetap dikirim.
+    """
+    started = time.perf_counter()
+    coordinator = coordinator or get_coordinator()
+    rule_names = [rule.name for rule in rules] if rules else None
+    async for result in coordinator.run(stock_codes, period=period, rule_names=rule_names, threshold=threshold):
+        if ticker_seconds is not None:
+            elapsed = time.perf_counter() - started
+            ticker_seconds.update({code: elapsed for code in result['fetched']})
+        for item in unpack_shard(result):
+            yield item
+
+async def journal_stage(signals, journal):
+    """Stage dedup: teruskan hanya rule yang belum pernah terkirim menurut jurnal.
+
+    Sinyal yang sama (ticker, tanggal bar, rule) yang sudah terkirim di scan
+    sebelumnya dibuang sebelum dirender, jadi scan ulang / /test_auto tidak
+    mengirim alert lama lagi. Pencatatan baru dilakukan dispatch_stage
+    setelah alert terkirim, jadi alert yang gagal dicoba lagi di scan berikutnya.
+    """
+    async for stock_code, signal, data in signals:
+        rules = list(signal.get('Rules', [DEFAULT_RULE]))
+        try:
+            new_rules = journal.unsent(stock_code, signal.name, rules)
+        except Exception as e:
+            print(f"⚠️ Error jurnal sinyal {stock_code}: {str(e)}")
+            new_rules = rules  # jurnal bermasalah: lebih baik terkirim dua kali daripada hilang
+        metrics.inc('signal_journal_total', len(rules) - len(new_rules), result='duplicate')
+        metrics.inc('signal_journal_total', len(new_rules), result='new')
+        if not new_rules:
+            continue
+        signal = signal.copy()
+        signal['Rules'] = new_rules
+        yield stock_code, signal, data
+
+async def priority_stage(signals):
+    """Stage 3: antrian prioritas, gap paling dalam lalu OBV_Change terbesar keluar lebih dulu.
+
+    Stage hulu berjalan di task terpisah, jadi selama stage hilir sibuk
+    sinyal yang datang diurutkan ulang di antrian.
+    """
+    queue = asyncio.PriorityQueue()
+    counter = itertools.count()
+
+    async def fill():
+        try:
+            async for stock_code, signal, data in signals:
+                priority = (signal['Gap_pct'], -signal['OBV_Change'])
+                await queue.put((priority, next(counter), (stock_code, signal, data)))
+        finally:
+            await queue.put(((float('inf'),), next(counter), _DONE))
+
+    producer = asyncio.ensure_future(fill())
+    try:
+        while True:
+            _, _, item = await queue.get()
+            if item is _DONE:
+                break
+            yield item
+        await producer  # teruskan exception dari stage hulu
+    finally:
+        producer.cancel()
+
+async def render_stage(items, concurrency=None, window=CHART_WINDOW):
+    """Stage 4: render grafik `window` bar hingga tanggal sinyal, paralel, yield sesuai urutan selesai"""
+    concurrency = concurrency or RENDER_CONCURRENCY
+    pending = set()
+
+    async def render(stock_code, signal, data):
+        chart_data = data.loc[:signal.name].tail(window)
+        try:
+            chart = await render_chart(chart_data, stock_code, window=window)
+        except Exception as e:
+            print(f"⚠️ Error render {stock_code}: {str(e)}")
+            chart = None
+        return stock_code, signal, chart
+
+    try:
+        async for stock_code, signal, data in items:
+            pending.add(asyncio.ensure_future(render(stock_code, signal, data)))
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def _rule_matches(rule_name, signal, threshold):
+    """Kondisi ber-threshold rule dievaluasi ulang dengan threshold chat (scan memakai threshold terkecil)"""
+    rule = get_rule(rule_name)
+    return rule is not None and rule.matches_threshold(signal, threshold)
+
+def route_signal(routes, stock_code, signal, chat_rules=None):
+    """Chat yang rule & threshold-nya terpenuhi oleh sinyal ini.
+
+    routes: ticker -> {chat_id: threshold}; chat_rules: {chat_id: [nama rule]}
+    (chat yang tidak ada di sini memakai rule bawaan).
+    """
+    fired = signal.get('Rules', [DEFAULT_RULE])
+    chat_rules = chat_rules or {}
+    return [
+        chat_id for chat_id, threshold in routes.get(stock_code, {}).items()
+        if any(
+            _rule_matches(name, signal, threshold)
+            for name in fired if name in chat_rules.get(chat_id, [DEFAULT_RULE])
+        )
+    ]
+
+async def dispatch_stage(context, rendered, routes=None, chat_rules=None, journal=None):
+    """Stage 5: kirim alert untuk setiap grafik yang sudah jadi, kembalikan jumlah alert terkirim.
+
+    Jika `routes` diberikan, alert hanya dikirim ke chat yang memantau ticker tsb.
+    Jika `journal` diberikan, sinyal dicatat setelah minimal satu chat menerimanya.
+    """
+    sent = 0
+    async for stock_code, signal, chart in rendered:
+        chat_ids = None
+        if routes is not None:
+            chat_ids = route_signal(routes, stock_code, signal, chat_rules)
+            if not chat_ids:
+                continue
+        try:
+            result = await send_signal_alert(context, stock_code, signal, chart=chart, chat_ids=chat_ids)
+        except Exception as e:
+            print(f"⚠️ Error kirim alert {stock_code}: {str(e)}")
+            continue
+        if not result or not (result['sent'] or result.get('uncertain')):  # timeout = mungkin sudah sampai, jangan kirim ulang
+            metrics.inc('signal_journal_total', result='unsent')
+            continue
+        sent += 1
+        if journal is not None:
+            try:
+                journal.claim(stock_code, signal.name, list(signal.get('Rules', [DEFAULT_RULE])), signal)
+            except Exception as e:
+                print(f"⚠️ Error jurnal sinyal {stock_code}: {str(e)}")
+    return sent
+
+async def run_scan_pipeline(context, stock_codes=None, period='1mo', threshold=0.02, routes=None, chat_rules=None, journal=None):
+    """Fetch + deteksi (per shard, di proses worker) -> prioritas -> render -> kirim, semuanya streaming.
+
+    `routes` (ticker -> {chat_id: threshold}, lihat Store.subscription_index):
+    setiap ticker unik hanya di-fetch & dianalisis sekali dengan threshold
+    paling longgar di antara subscriber-nya, lalu sinyal dikirim per chat.
+    `chat_rules` ({chat_id: [nama rule]}, lihat Store.subscription_rules):
+    gabungan rule semua chat dievaluasi sekali per batch; `period` diperpanjang
+    jika rule butuh histori lebih panjang (lihat rules.scan_period).
+    `journal` (SignalJournal): jika diberikan, hanya sinyal baru yang dikirim
+    dan sinyal dicatat setelah terkirim.
+    """
+    rules = get_rules(sorted({name for names in (chat_rules or {}).values() for name in names}))
+    period = scan_period(rules, period)  # histori cukup untuk lookback rule terpanjang
+    if routes is not None:
+        stock_codes = list(routes)
+        threshold = {code: min(chats.values()) for code, chats in routes.items()}
+    started = time.perf_counter()
+    ticker_seconds = {}
+    signals = shard_stage(
+        stock_codes, period=period, threshold=threshold, rules=rules, ticker_seconds=ticker_seconds
+    )
+    if journal is not None:
+        signals = journal_stage(signals, journal)
+    prioritized = priority_stage(signals)
+    rendered = render_stage(prioritized)
+    sent = await dispatch_stage(context, rendered, routes=routes, chat_rules=chat_rules, journal=journal)
+
+    elapsed = time.perf_counter() - started
+    metrics.observe('scan_seconds', elapsed)
+    metrics.record_scan(ticker_seconds, elapsed, sent)
+    return sent
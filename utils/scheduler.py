@@ -1,38 +1,109 @@
+import asyncio
+import time as timer
 from datetime import datetime, time
 from telegram.ext import ContextTypes
-from utils.gap_analyzer import detect_gap_down
-from utils.data_fetcher import get_stock_data
-from utils.watchlist_manager import load_watchlist
-from utils.alert_sender import send_signal_alert
-import pandas as pd
+from utils.store import get_store
+from utils.executor import run_io, warm_cpu_pool
+from utils.metrics import metrics
+
+# Modul berat (pandas, yfinance, mplfinance) diimport di dalam job, bukan saat
+# bot start, supaya polling Telegram bisa mulai secepatnya.
+
+PREWARM_TIME = time(hour=2, minute=0)   # 09:00 WIB, 15 menit sebelum scan
+SCAN_TIME = time(hour=2, minute=15)     # 09:15 WIB
+CHART_BASE_TIME = time(hour=10, minute=0)  # 17:00 WIB, setelah penutupan bursa (16:00 WIB)
+TRADING_WEEKDAYS = (1, 2, 3, 4, 5)      # PTB v20: 0 = Minggu, jadi ini Senin-Jumat
+SCAN_PERIOD = '1mo'
 
 class GapScanner:
     def __init__(self, application):
         self.application = application
+        self.prewarmed_on = None
 
     async def scan_and_alert(self, context: ContextTypes.DEFAULT_TYPE):
-        
+
         # Production mode - real data check
-        watchlist = load_watchlist()
-        for stock_code in watchlist:
-            try:
-                data = get_stock_data(stock_code.replace('.JK', ''), period='1mo')
-                if data is None or data.empty:
-                    continue
-
-                data = detect_gap_down(data)
-                signals = data[data['Is_Signal']]
-                
-                if not signals.empty:
-                    await send_signal_alert(context, stock_code, signals.iloc[-1])
-                    
-            except Exception as e:
-                print(f"⚠️ Error scanning {stock_code}: {str(e)}")
+        # Pipeline streaming: bulk fetch -> deteksi batch -> prioritas -> render -> kirim
+        # Gabungan watchlist semua subscriber, tiap ticker unik dipindai sekali
+        # Sinyal yang sudah tercatat di jurnal tidak dikirim ulang
+        from utils.scan_pipeline import run_scan_pipeline
+        from utils.signal_journal import get_journal
+        store = get_store()
+        routes = store.subscription_index()
+        try:
+            await run_scan_pipeline(
+                context, period=SCAN_PERIOD, routes=routes,
+                chat_rules=store.subscription_rules(), journal=get_journal()
+            )
+        except Exception as e:
+            print(f"⚠️ Error scanning: {str(e)}")
+
+    async def prewarm(self, context: ContextTypes.DEFAULT_TYPE):
+        """Fase pemanasan sebelum scan: worker render & scan hidup, cache bar & koneksi Yahoo sudah terisi.
+
+        Bar sampai kemarin di-download sekarang, jadi saat scan hanya bar hari ini yang perlu diambil.
+        """
+        from utils.data_fetcher import get_bulk_stock_data, warm_renderer
+        from utils.scan_coordinator import get_coordinator
+        from utils.rules import get_rules, scan_period
+        from utils.market_calendar import is_trading_day, today
+
+        if not is_trading_day():
+            return
+        started = timer.perf_counter()
+        try:
+            store = get_store()
+            routes = store.subscription_index()
+            rules = get_rules(sorted({name for names in store.subscription_rules().values() for name in names}))
+            workers, scan_workers, frames = await asyncio.gather(
+                warm_cpu_pool(warm_renderer),
+                get_coordinator().warm(),
+                run_io(get_bulk_stock_data, list(routes), period=scan_period(rules, SCAN_PERIOD)),
+            )
+            self.prewarmed_on = today()
+            elapsed = timer.perf_counter() - started
+            metrics.observe('prewarm_seconds', elapsed)
+            print(f"[PREWARM] {len(frames)}/{len(routes)} ticker di cache, {len(workers)} worker render & {len(scan_workers)} worker scan siap ({elapsed:.1f}s)")
+        except Exception as e:
+            metrics.inc('prewarm_failures_total')
+            print(f"⚠️ Error prewarm: {str(e)}")
+
+    async def precompute_charts(self, context: ContextTypes.DEFAULT_TYPE):
+        """Setelah penutupan: siapkan lapisan dasar grafik (29 bar historis) untuk hari bursa berikutnya.
+
+        Saat alert pagi grafik cukup dikomposit dari lapisan ini + bar hari itu, tanpa render mplfinance.
+        """
+        from utils.chart_base import precompute_chart_bases
+        from utils.market_calendar import is_trading_day, next_trading_day
+
+        if not is_trading_day():
+            return
+        started = timer.perf_counter()
+        try:
+            routes = get_store().subscription_index()
+            next_date = next_trading_day()
+            built = await precompute_chart_bases(list(routes), next_date, period=SCAN_PERIOD)
+            elapsed = timer.perf_counter() - started
+            metrics.observe('chart_base_seconds', elapsed)
+            print(f"[CHART BASE] {built}/{len(routes)} lapisan dasar grafik siap untuk {next_date.date()} ({elapsed:.1f}s)")
+        except Exception as e:
+            metrics.inc('chart_base_failures_total')
+            print(f"⚠️ Error lapisan dasar grafik: {str(e)}")
+
+    async def scheduled_scan(self, context: ContextTypes.DEFAULT_TYPE):
+        """Scan terjadwal: hanya di hari bursa IDX"""
+        from utils.market_calendar import is_trading_day, today
+
+        if not is_trading_day():
+            print(f"[SCAN] {today().date()} bukan hari bursa, scan dilewati")
+            return
+        if self.prewarmed_on != today():
+            print("[SCAN] Prewarm belum jalan hari ini, scan mulai dalam keadaan dingin")
+        await self.scan_and_alert(context)
 
     def start(self):
-        """Schedule daily scans at 09:15 WIB (02:15 UTC) Mon-Fri"""
-        self.application.job_queue.run_daily(
-            self.scan_and_alert,
-            time=time(hour=2, minute=15), 
-            days=(0, 1, 2, 3, 4, 5, 6)
-        )
\ No newline at end of file
+        """Schedule prewarm at 09:00 WIB, scan at 09:15 WIB (02:15 UTC) and chart bases at 17:00 WIB on IDX trading days"""
+        job_queue = self.application.job_queue
+        job_queue.run_daily(self.prewarm, time=PREWARM_TIME, days=TRADING_WEEKDAYS)
+        job_queue.run_daily(self.scheduled_scan, time=SCAN_TIME, days=TRADING_WEEKDAYS)
+        job_queue.run_daily(self.precompute_charts, time=CHART_BASE_TIME, days=TRADING_WEEKDAYS)
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import threading
+
+# Pengelompokan sektor untuk /gapcheck [sektor] (lihat data/sectors.json)
+SECTORS_FILE = os.getenv('SECTORS_FILE', 'data/sectors.json')
+
+# Argumen periode yang diterima yfinance (5d, 1mo, 3mo, 1y, ytd, max, ...)
+PERIOD_PATTERN = re.compile(r'^(\d+(d|wk|mo|y)|ytd|max)$', re.IGNORECASE)
+ALL_KEYWORDS = ('all', 'semua')
+CHART_KEYWORDS = ('chart', 'grafik')
+
+_sectors = None
+_aliases = {}
+_lock = threading.Lock()
+
+def _load():
+    """Muat file sektor sekali per proses: ({sektor: [kode]}, {alias: sektor})"""
+    global _sectors, _aliases
+    with _lock:
+        if _sectors is None:
+            sectors, aliases = {}, {}
+            try:
+                with open(SECTORS_FILE, 'r') as f:
+                    data = json.load(f)
+                for name, codes in data.items():
+                    if name == '_aliases':
+                        aliases = {alias.lower(): target.lower() for alias, target in codes.items()}
+                    elif not name.startswith('_'):
+                        sectors[name.lower()] = [code.upper().replace('.JK', '') for code in codes]
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print(f"⚠️ Daftar sektor tidak bisa dimuat ({SECTORS_FILE}): {str(e)}")
+            # Alias yang sama dengan kode saham yang dikenal tidak dipakai (kode saham menang)
+            codes = {code.lower() for members in sectors.values() for code in members}
+            for alias in sorted(set(aliases) & codes):
+                print(f"⚠️ Alias sektor '{alias}' sama dengan kode saham, diabaikan")
+                del aliases[alias]
+            _sectors, _aliases = sectors, aliases
+        return _sectors, _aliases
+
+def reload_sectors():
+    """Baca ulang file sektor (setelah file diperbarui)"""
+    global _sectors
+    with _lock:
+        _sectors = None
+    return _load()
+
+def sector_names():
+    return sorted(_load()[0])
+
+def sector_members(name):
+    """Kode saham (tanpa .JK) dalam sektor `name` atau aliasnya, None jika bukan nama sektor"""
+    sectors, aliases = _load()
+    name = name.lower()
+    return sectors.get(aliases.get(name, name))
+
+def all_tickers(extra=()):
+    """Semua kode di file sektor ditambah `extra` (mis. watchlist chat), tanpa duplikat"""
+    codes = [code for members in _load()[0].values() for code in members]
+    codes += [code.upper().replace('.JK', '') for code in extra]
+    return list(dict.fromkeys(codes))
+
+def parse_gapcheck_args(args, watchlist=()):
+    """Urai argumen /gapcheck menjadi (kode saham, periode, label, pakai_grafik).
+
+    Argumen bisa berupa kode saham (dipisah spasi/koma), nama sektor, `all`,
+    periode (mis. 3mo) dan `chart` untuk grafik ringkas. `label` berisi nama
+    sektor/`all` jika dipakai, selain itu None. Kode saham yang dikenal
+    (anggota sektor atau watchlist) dicocokkan sebelum nama sektor/alias.
+    """
+    known_codes = {code.lower() for code in all_tickers(watchlist)}
+    codes, labels = [], []
+    period, with_chart = None, False
+    for token in (part for arg in args for part in arg.split(',')):
+        token = token.strip()
+        if not token:
+            continue
+        lowered = token.lower()
+        if PERIOD_PATTERN.match(lowered):
+            period = lowered
+        elif lowered in CHART_KEYWORDS:
+            with_chart = True
+        elif lowered in known_codes:
+            codes.append(token.upper().replace('.JK', ''))
+        elif lowered in ALL_KEYWORDS:
+            codes += all_tickers(watchlist)
+            labels.append('all')
+        elif sector_members(lowered) is not None:
+            codes += sector_members(lowered)
+            labels.append(_load()[1].get(lowered, lowered))
+        else:
+            codes.append(token.upper().replace('.JK', ''))
+    label = ', '.join(labels) if labels else None
+    return list(dict.fromkeys(codes)), period or '1mo', label, with_chart
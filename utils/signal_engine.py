@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+INDICATORS = ['Gap_pct', 'OBV', 'OBV_Change', 'AD_Line']
+
+def indicator_buffers(shape, dtype=np.float64):
+    """Buffer output compute_indicators (+ 1 buffer kerja) yang bisa dipakai ulang antar panggilan"""
+    return {name: np.empty(shape, dtype=dtype) for name in INDICATORS + ['_work']}
+
+def _prev_valid(values, out=None):
+    """Nilai valid terakhir SEBELUM tiap baris (per kolom), NaN jika belum ada"""
+    n_rows = values.shape[0]
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(n_rows)[:, None], -1)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    if out is None:
+        out = np.empty(values.shape, dtype=np.float64)
+    out[0] = np.nan
+    if n_rows > 1:
+        prev_idx = idx[:-1]
+        out[1:] = values[np.maximum(prev_idx, 0), np.arange(values.shape[1])]
+        out[1:][prev_idx < 0] = np.nan
+    return out
+
+def compute_indicators(open_, high, low, close, volume, out=None):
+    """Hitung Gap_pct, OBV, OBV_Change dan AD_Line untuk semua ticker sekaligus.
+
+    Semua input berbentuk [n_dates, n_tickers]; semantik sama dengan
+    detect_gap_down (OBV gaya `ta`) dan calculate_ad_line per ticker.
+    `out` = hasil indicator_buffers() dengan bentuk sama; jika diberikan,
+    hasil ditulis ke buffer tersebut tanpa alokasi array indikator baru.
+    """
+    if out is None:
+        out = indicator_buffers(close.shape)
+    gap_pct, obv, flow, ad_line, work = (out[name] for name in INDICATORS + ['_work'])
+
+    valid = ~(np.isnan(close) | np.isnan(volume))
+    invalid = ~valid
+    prev_close = _prev_valid(np.where(valid, close, np.nan), out=work)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # (Open - prev_close) / prev_close * 100
+        np.subtract(open_, prev_close, out=gap_pct)
+        np.divide(gap_pct, prev_close, out=gap_pct)
+        np.multiply(gap_pct, 100, out=gap_pct)
+
+        # OBV: turun -> -volume, selain itu +volume (sama seperti ta.OnBalanceVolumeIndicator)
+        np.copyto(flow, volume)
+        np.negative(flow, out=flow, where=close < prev_close)
+        np.copyto(flow, 0.0, where=invalid)
+        np.cumsum(flow, axis=0, out=obv)
+        np.copyto(obv, np.nan, where=invalid)
+        np.copyto(flow, np.nan, where=invalid | np.isnan(prev_close))  # -> OBV_Change
+
+        # Accumulation/Distribution Line: ((C - L) - (H - C)) / (H - L) * V, range 0 -> 1
+        np.subtract(high, low, out=work)
+        np.copyto(work, 1.0, where=work == 0)
+        np.subtract(close, low, out=ad_line)
+        ad_line -= high - close
+        np.divide(ad_line, work, out=ad_line)
+        np.multiply(ad_line, volume, out=ad_line)
+        np.copyto(ad_line, 0.0, where=invalid)
+        np.cumsum(ad_line, axis=0, out=ad_line)
+        np.copyto(ad_line, np.nan, where=invalid)
+
+    return {name: out[name] for name in INDICATORS}
+
+def signal_mask(indicators, threshold=0.02):
+    """Gap down ≥ threshold DAN OBV naik (akumulasi).
+
+    `threshold` boleh skalar atau array per ticker (panjang n_tickers).
+    """
+    with np.errstate(invalid='ignore'):
+        return (indicators['Gap_pct'] <= -threshold) & (indicators['OBV_Change'] > 0)
+
+def scan_frames(frames, threshold=0.02):
+    """Shortcut: MarketStore + scan untuk dict {kode: DataFrame}.
+
+    `threshold` boleh berupa dict {kode: threshold} untuk batas berbeda per ticker.
+    """
+    from utils.market_store import MarketStore
+
+    store = MarketStore.from_frames(frames)
+    if isinstance(threshold, dict):
+        threshold = np.array([threshold.get(code, 0.02) for code in store.tickers], dtype=float)
+    return store.scan(threshold=threshold)
+
+def latest_signals(fired):
+    """Sinyal terakhir per ticker, sebagai {kode: Series} (name = tanggal sinyal)"""
+    latest = {}
+    for row in fired.groupby('Ticker', sort=False).tail(1).itertuples(index=False):
+        row = row._asdict()
+        code = row.pop('Ticker')
+        date = row.pop('Date')
+        latest[code] = pd.Series(row, name=date)
+    return latest
+
+def rank_signals(fired):
+    """Sinyal terakhir per ticker sebagai DataFrame, urut gap paling dalam lalu OBV_Change terbesar"""
+    if fired.empty:
+        return fired
+    latest = fired.groupby('Ticker', sort=False).tail(1)
+    return latest.sort_values(['Gap_pct', 'OBV_Change'], ascending=[True, False], ignore_index=True)
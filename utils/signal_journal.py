@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import threading
+import pandas as pd
+
+# Jurnal sinyal (append-only): satu baris per (ticker, tanggal bar, rule) yang sudah terkirim
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'data/signals.db')
+SIGNALS_PAGE_SIZE = int(os.getenv('SIGNALS_PAGE_SIZE', '10'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stock_code TEXT NOT NULL,
+    bar_date TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    close REAL,
+    gap_pct REAL,
+    obv_change REAL,
+    recorded_at REAL NOT NULL,
+    UNIQUE (stock_code, bar_date, rule)
+);
+CREATE INDEX IF NOT EXISTS idx_signals_date ON signals (bar_date, id);
+"""
+
+def _day(date):
+    return pd.Timestamp(date).strftime('%Y-%m-%d')
+
+def _code(stock_code):
+    stock_code = stock_code.upper()
+    return stock_code if stock_code.endswith('.JK') else f"{stock_code}.JK"
+
+class SignalJournal:
+    """Jurnal sinyal berbasis SQLite, kunci unik (ticker, tanggal bar, rule).
+
+    Pipeline scan menyaring sinyal dengan `unsent` sebelum render, lalu
+    `claim` mencatatnya setelah alert berhasil terkirim: alert yang gagal
+    dikirim tidak tercatat, jadi dicoba lagi pada scan berikutnya
+    (at-least-once; bot mati di antara kirim dan catat = kirim ulang).
+    `claim` memakai satu transaksi, jadi dua scan yang bersamaan hanya
+    mencatat sekali. Baris tidak pernah diubah/dihapus.
+    Query riwayat memakai index (ticker, tanggal) / (tanggal, id) dengan
+    paging keyset, bukan OFFSET.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def claim(self, stock_code, bar_date, rules, signal=None):
+        """Catat sinyal, kembalikan rule yang BELUM pernah tercatat untuk (ticker, tanggal) ini"""
+        code, day, now = _code(stock_code), _day(bar_date), time.time()
+        values = (
+            (signal.get('Close'), signal.get('Gap_pct'), signal.get('OBV_Change'))
+            if signal is not None else (None, None, None)
+        )
+        new_rules = []
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for rule in dict.fromkeys(rules):
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO signals "
+                        "(stock_code, bar_date, rule, close, gap_pct, obv_change, recorded_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (code, day, rule, *(None if v is None else float(v) for v in values), now)
+                    )
+                    if cursor.rowcount > 0:
+                        new_rules.append(rule)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return new_rules
+
+    def unsent(self, stock_code, bar_date, rules):
+        """Rule yang belum tercatat untuk (ticker, tanggal) ini, tanpa mencatatnya"""
+        rules = list(dict.fromkeys(rules))
+        if not rules:
+            return []
+        with self._lock:
+            recorded = {row[0] for row in self._conn.execute(
+                f"SELECT rule FROM signals WHERE stock_code = ? AND bar_date = ? AND rule IN ({','.join('?' * len(rules))})",
+                (_code(stock_code), _day(bar_date), *rules)
+            )}
+        return [rule for rule in rules if rule not in recorded]
+
+    def seen(self, stock_code, bar_date, rule):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM signals WHERE stock_code = ? AND bar_date = ? AND rule = ?",
+                (_code(stock_code), _day(bar_date), rule)
+            ).fetchone()
+        return row is not None
+
+    def query(self, stock_code=None, start=None, end=None, limit=SIGNALS_PAGE_SIZE, before=None):
+        """Riwayat sinyal terbaru dulu, difilter ticker dan/atau rentang tanggal (inklusif).
+
+        `before` = kursor (bar_date, id) dari baris terakhir halaman sebelumnya.
+        Mengembalikan (list dict baris, kursor halaman berikutnya atau None).
+        """
+        where, params = [], []
+        if stock_code:
+            where.append("stock_code = ?")
+            params.append(_code(stock_code))
+        if start is not None:
+            where.append("bar_date >= ?")
+            params.append(_day(start))
+        if end is not None:
+            where.append("bar_date <= ?")
+            params.append(_day(end))
+        if before is not None:
+            where.append("(bar_date < ? OR (bar_date = ? AND id < ?))")
+            params += [before[0], before[0], int(before[1])]
+        sql = (
+            "SELECT id, stock_code, bar_date, rule, close, gap_pct, obv_change, recorded_at FROM signals"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY bar_date DESC, id DESC LIMIT ?"
+        )
+        with self._lock:
+            cursor = self._conn.execute(sql, (*params, limit + 1))
+            columns = [c[0] for c in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor_next = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor_next = (rows[-1]['bar_date'], rows[-1]['id'])
+        return rows, cursor_next
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signals").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    """Instance SignalJournal bersama (dibuat saat pertama dipakai)"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = SignalJournal()
+        return _journal
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from utils.metrics import metrics
+
+# Hasil command identik dipakai ulang selama TTL ini (detik)
+COALESCE_TTL = float(os.getenv('COALESCE_TTL', '60'))
+COALESCE_MAX_ENTRIES = int(os.getenv('COALESCE_MAX_ENTRIES', '256'))
+
+class SingleFlight:
+    """Gabungkan request identik yang datang bersamaan menjadi satu pekerjaan.
+
+    Request pertama untuk suatu key menjalankan `func`; request lain dengan
+    key sama selama pekerjaan masih berjalan menunggu hasil yang sama.
+    Hasil yang sukses (bukan None) disimpan selama `ttl` detik. Exception
+    diteruskan ke semua yang menunggu dan tidak disimpan. Hanya untuk
+    dipakai dari satu event loop (tidak thread-safe).
+    """
+
+    def __init__(self, ttl=COALESCE_TTL, max_entries=COALESCE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight = {}
+        self._results = OrderedDict()  # key -> (kedaluwarsa, hasil)
+
+    def _get_result(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return value
+
+    def _store_result(self, key, value):
+        if value is None or self.ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.ttl, value)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._store_result(key, task.result())
+
+    async def do(self, key, func):
+        """Jalankan `func()` (coroutine function) sekali per key, bagikan hasilnya.
+
+        Elemen pertama key (nama command) dipakai sebagai label metrics.
+        """
+        command = key[0] if isinstance(key, tuple) else str(key)
+        value = self._get_result(key)
+        if value is not None:
+            metrics.inc('coalesce_requests_total', command=command, result='hit')
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.inc('coalesce_requests_total', command=command, result='miss')
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            metrics.inc('coalesce_requests_total', command=command, result='shared')
+
+        # shield: satu handler yang dibatalkan tidak membatalkan pekerjaan untuk yang lain
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._results.clear()
+
+def command_key(command, stock_code, period=None):
+    """Key (command, ticker, period) yang dinormalisasi: BBRI, bbri.jk -> BBRI"""
+    return command, stock_code.upper().replace('.JK', ''), (period or '').lower()
+
+commands = SingleFlight()
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Database subscriber & watchlist (SQLite, mode WAL)
+STORE_PATH = os.getenv('STORE_PATH', 'data/bot.db')
+
+# File JSON lama yang dimigrasi saat pertama kali jalan
+LEGACY_CHAT_ID_FILE = "data/chat_ids.json"
+LEGACY_WATCHLIST_FILE = "data/watchlist.json"
+
+GLOBAL_WATCHLIST = 0  # chat_id 0 = watchlist global
+DEFAULT_WATCHLIST = ["BBRI.JK", "BMRI.JK"]
+DEFAULT_THRESHOLD = 0.02  # batas gap down (satuan sama dengan Gap_pct, persen)
+DEFAULT_RULES = ('gap_obv',)  # rule sinyal untuk chat yang belum memilih (lihat utils/rules.py)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watchlist (
+    chat_id INTEGER NOT NULL,
+    stock_code TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, stock_code)
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_code ON watchlist (stock_code);
+CREATE TABLE IF NOT EXISTS chat_settings (
+    chat_id INTEGER PRIMARY KEY,
+    threshold REAL,
+    own_watchlist INTEGER NOT NULL DEFAULT 0,
+    rules TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class Store:
+    """Penyimpanan subscriber & watchlist berbasis SQLite.
+
+    Semua tulis lewat transaksi dengan lock, jadi /addwatch bersamaan tidak
+    saling menimpa. Hasil baca di-cache di memori (set untuk cek keanggotaan
+    O(1)) dan cache dibuang setiap kali ada tulis.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_schema()
+
+        self._subscribers = None   # list urut, None = belum dimuat
+        self._subscriber_set = None
+        self._watchlists = {}      # chat_id -> (list urut, set)
+        self._index = None         # ticker -> {chat_id: threshold}
+        self._settings = {}        # chat_id -> (threshold, own_watchlist, rules)
+        self._migrate_legacy()
+
+    # ------------------------------------------------------------ util
+
+    def _transaction(self, statements):
+        """Jalankan beberapa (sql, params) dalam satu transaksi, kembalikan total rowcount"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                changed = 0
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                    changed += max(cursor.rowcount, 0)
+                cursor.execute("COMMIT")
+                return changed
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _migrate_schema(self):
+        """Tambah kolom yang belum ada di database lama"""
+        with self._lock:
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chat_settings)")}
+            if 'rules' not in columns:
+                self._conn.execute("ALTER TABLE chat_settings ADD COLUMN rules TEXT")
+
+    def _migrate_legacy(self):
+        """Pindahkan data/chat_ids.json & data/watchlist.json ke database (sekali saja)"""
+        if self._get_meta('legacy_migrated'):
+            return
+
+        statements = []
+        now = time.time()
+        try:
+            with open(LEGACY_CHAT_ID_FILE, "r") as f:
+                for chat_id in json.load(f):
+                    statements.append(("INSERT OR IGNORE INTO subscribers VALUES (?, ?)", (int(chat_id), now)))
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError):
+            pass
+
+        try:
+            with open(LEGACY_WATCHLIST_FILE, "r") as f:
+                watchlist = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            watchlist = DEFAULT_WATCHLIST
+        for stock_code in watchlist:
+            statements.append((
+                "INSERT OR IGNORE INTO watchlist VALUES (?, ?, ?)",
+                (GLOBAL_WATCHLIST, stock_code, now)
+            ))
+
+        statements.append(("INSERT OR REPLACE INTO meta VALUES ('legacy_migrated', ?)", (str(now),)))
+        self._transaction(statements)
+        self._invalidate_subscribers()
+        self._invalidate_watchlist()
+
+    def _invalidate_subscribers(self):
+        with self._lock:
+            self._index = None
+            self._subscribers = None
+            self._subscriber_set = None
+
+    def _invalidate_watchlist(self, chat_id=None):
+        with self._lock:
+            self._index = None
+            if chat_id is None:
+                self._watchlists.clear()
+            else:
+                self._watchlists.pop(chat_id, None)
+
+    # ------------------------------------------------------------ subscriber
+
+    def _load_subscribers(self):
+        with self._lock:
+            if self._subscribers is None:
+                rows = self._conn.execute("SELECT chat_id FROM subscribers ORDER BY created_at, rowid").fetchall()
+                self._subscribers = [row[0] for row in rows]
+                self._subscriber_set = set(self._subscribers)
+            return self._subscribers, self._subscriber_set
+
+    def subscribers(self):
+        """Daftar chat_id terdaftar (urut sesuai waktu daftar)"""
+        return list(self._load_subscribers()[0])
+
+    def is_subscribed(self, chat_id):
+        return chat_id in self._load_subscribers()[1]
+
+    def subscribe(self, chat_id):
+        """Daftarkan chat_id, True jika baru"""
+        if self.is_subscribed(chat_id):
+            return False
+        changed = self._transaction([("INSERT OR IGNORE INTO subscribers VALUES (?, ?)", (chat_id, time.time()))])
+        self._invalidate_subscribers()
+        return changed > 0
+
+    def unsubscribe(self, chat_id):
+        changed = self._transaction([("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))])
+        self._invalidate_subscribers()
+        return changed > 0
+
+    # ------------------------------------------------------------ watchlist
+
+    def _load_watchlist(self, chat_id):
+        with self._lock:
+            if chat_id not in self._watchlists:
+                rows = self._conn.execute(
+                    "SELECT stock_code FROM watchlist WHERE chat_id = ? ORDER BY added_at, rowid", (chat_id,)
+                ).fetchall()
+                codes = [row[0] for row in rows]
+                self._watchlists[chat_id] = (codes, set(codes))
+            return self._watchlists[chat_id]
+
+    def watchlist(self, chat_id=GLOBAL_WATCHLIST):
+        return list(self._load_watchlist(chat_id)[0])
+
+    def in_watchlist(self, stock_code, chat_id=GLOBAL_WATCHLIST):
+        return stock_code in self._load_watchlist(chat_id)[1]
+
+    def add_to_watchlist(self, stock_code, chat_id=GLOBAL_WATCHLIST):
+        """Tambah saham ke watchlist chat, True jika sebelumnya belum ada"""
+        if self.in_watchlist(stock_code, chat_id):
+            return False
+        changed = self._transaction([(
+            "INSERT OR IGNORE INTO watchlist VALUES (?, ?, ?)", (chat_id, stock_code, time.time())
+        )])
+        self._invalidate_watchlist(chat_id)
+        return changed > 0
+
+    def remove_from_watchlist(self, stock_code, chat_id=GLOBAL_WATCHLIST):
+        changed = self._transaction([(
+            "DELETE FROM watchlist WHERE chat_id = ? AND stock_code = ?", (chat_id, stock_code)
+        )])
+        self._invalidate_watchlist(chat_id)
+        return changed > 0
+
+    def set_watchlist(self, stock_codes, chat_id=GLOBAL_WATCHLIST):
+        """Ganti seluruh isi watchlist chat dalam satu transaksi"""
+        now = time.time()
+        statements = [("DELETE FROM watchlist WHERE chat_id = ?", (chat_id,))]
+        statements += [
+            ("INSERT OR IGNORE INTO watchlist VALUES (?, ?, ?)", (chat_id, code, now + i * 1e-6))
+            for i, code in enumerate(stock_codes)
+        ]
+        if chat_id != GLOBAL_WATCHLIST:
+            statements.append((
+                "INSERT INTO chat_settings (chat_id, own_watchlist) VALUES (?, 1) "
+                "ON CONFLICT(chat_id) DO UPDATE SET own_watchlist = 1",
+                (chat_id,)
+            ))
+        self._transaction(statements)
+        self._invalidate_settings(chat_id)
+        self._invalidate_watchlist(chat_id)
+
+    def has_own_watchlist(self, chat_id):
+        return self._load_settings(chat_id)[1]
+
+    def effective_watchlist(self, chat_id):
+        """Watchlist milik chat, atau watchlist global jika chat belum punya sendiri"""
+        if chat_id != GLOBAL_WATCHLIST and self.has_own_watchlist(chat_id):
+            return self.watchlist(chat_id)
+        return self.watchlist(GLOBAL_WATCHLIST)
+
+    def copy_global_watchlist(self, chat_id):
+        """Salin watchlist global ke chat (dipakai sebelum chat mengubah watchlist pertama kali)"""
+        now = time.time()
+        statements = [
+            ("INSERT OR IGNORE INTO watchlist VALUES (?, ?, ?)", (chat_id, code, now + i * 1e-6))
+            for i, code in enumerate(self.watchlist(GLOBAL_WATCHLIST))
+        ]
+        statements.append((
+            "INSERT INTO chat_settings (chat_id, own_watchlist) VALUES (?, 1) "
+            "ON CONFLICT(chat_id) DO UPDATE SET own_watchlist = 1",
+            (chat_id,)
+        ))
+        self._transaction(statements)
+        self._invalidate_settings(chat_id)
+        self._invalidate_watchlist(chat_id)
+
+    # ------------------------------------------------------------ pengaturan chat
+
+    def _load_settings(self, chat_id):
+        with self._lock:
+            if chat_id not in self._settings:
+                row = self._conn.execute(
+                    "SELECT threshold, own_watchlist, rules FROM chat_settings WHERE chat_id = ?", (chat_id,)
+                ).fetchone()
+                threshold = row[0] if row and row[0] is not None else DEFAULT_THRESHOLD
+                rules = tuple(row[2].split(',')) if row and row[2] else DEFAULT_RULES
+                self._settings[chat_id] = (threshold, bool(row and row[1]), rules)
+            return self._settings[chat_id]
+
+    def _invalidate_settings(self, chat_id):
+        with self._lock:
+            self._index = None
+            self._settings.pop(chat_id, None)
+
+    def threshold(self, chat_id):
+        return self._load_settings(chat_id)[0]
+
+    def set_threshold(self, chat_id, threshold):
+        self._transaction([(
+            "INSERT INTO chat_settings (chat_id, threshold) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET threshold = excluded.threshold",
+            (chat_id, threshold)
+        )])
+        self._invalidate_settings(chat_id)
+
+    def rules(self, chat_id):
+        """Nama rule sinyal yang aktif untuk chat"""
+        return list(self._load_settings(chat_id)[2])
+
+    def set_rules(self, chat_id, rules):
+        """Atur rule sinyal chat; list kosong = kembali ke DEFAULT_RULES"""
+        value = ','.join(dict.fromkeys(rules)) or None
+        self._transaction([(
+            "INSERT INTO chat_settings (chat_id, rules) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET rules = excluded.rules",
+            (chat_id, value)
+        )])
+        self._invalidate_settings(chat_id)
+
+    def subscription_rules(self):
+        """{chat_id: [nama rule]} untuk semua subscriber (pasangan subscription_index)"""
+        return {chat_id: self.rules(chat_id) for chat_id in self.subscribers()}
+
+    # ------------------------------------------------------------ indeks terbalik
+
+    def subscription_index(self):
+        """Indeks ticker -> {chat_id: threshold} untuk semua subscriber.
+
+        Chat tanpa watchlist sendiri mengikuti watchlist global. Dipakai scanner
+        agar tiap ticker cukup di-fetch/dianalisis sekali lalu dikirim ke chat yang relevan.
+        """
+        with self._lock:
+            if self._index is None:
+                rows = self._conn.execute("""
+                    SELECT w.stock_code, s.chat_id, COALESCE(cs.threshold, ?)
+                    FROM subscribers s
+                    LEFT JOIN chat_settings cs ON cs.chat_id = s.chat_id
+                    JOIN watchlist w ON w.chat_id = CASE
+                        WHEN COALESCE(cs.own_watchlist, 0) = 1 THEN s.chat_id ELSE ? END
+                    ORDER BY w.added_at, w.rowid
+                """, (DEFAULT_THRESHOLD, GLOBAL_WATCHLIST)).fetchall()
+                index = {}
+                for stock_code, chat_id, threshold in rows:
+                    index.setdefault(stock_code, {})[chat_id] = threshold
+                self._index = index
+            return {code: dict(chats) for code, chats in self._index.items()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Instance Store bersama (dibuat saat pertama dipakai)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = Store()
+        return _store
@@ -0,0 +1,213 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import traceback
+from collections import deque
+from telegram.ext import Application
+from utils.metrics import metrics
+
+# Antrian update terbatas: beberapa worker memproses update bersamaan (0 = sekuensial bawaan PTB)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '100'))    # update menunggu maksimum sebelum ditolak
+HEAVY_WORKERS = int(os.getenv('HEAVY_WORKERS', str(max(UPDATE_WORKERS - 2, 1))))  # worker maks. untuk command berat
+HEAVY_QUEUE_SHARE = float(os.getenv('HEAVY_QUEUE_SHARE', '0.75'))  # porsi antrian yang boleh diisi command berat
+UPDATE_DRAIN_TIMEOUT = float(os.getenv('UPDATE_DRAIN_TIMEOUT', '30'))  # detik menunggu antrian habis saat berhenti
+
+# Command yang render grafik / scan banyak ticker
+HEAVY_COMMANDS = frozenset(
+    name.strip().lower() for name in os.getenv('HEAVY_COMMANDS', 'cek_candle,gapcheck,test_auto').split(',')
+    if name.strip()
+)
+BUSY_MESSAGE = "⏳ Bot sedang sibuk, coba lagi sebentar lagi."
+
+PRIORITY_CHEAP = 0
+PRIORITY_HEAVY = 1
+
+def update_command(update):
+    """Nama command (tanpa / dan @bot) dari pesan update, None jika bukan command"""
+    message = getattr(update, 'effective_message', None)
+    text = getattr(message, 'text', None) or ''
+    if not text.startswith('/'):
+        return None
+    return text[1:].split(maxsplit=1)[0].split('@')[0].lower() if len(text) > 1 else None
+
+def update_priority(update):
+    return PRIORITY_HEAVY if update_command(update) in HEAVY_COMMANDS else PRIORITY_CHEAP
+
+def _kind(priority):
+    return 'heavy' if priority == PRIORITY_HEAVY else 'cheap'
+
+class UpdateDispatcher:
+    """Antrian update terbatas dengan urutan per chat dan prioritas command ringan.
+
+    - Update dari chat yang sama diproses berurutan (satu worker per chat).
+    - Chat yang siap diurutkan menurut prioritas update terdepannya, jadi
+      /watchlist tidak menunggu di belakang render grafik chat lain; command
+      berat memakai paling banyak `heavy_workers` worker dan `heavy_limit`
+      slot antrian, sisanya selalu tersedia untuk command ringan.
+    - Saat antrian penuh update ditolak (`on_shed`, mis. balasan "sibuk").
+    """
+
+    def __init__(self, process, workers=UPDATE_WORKERS, maxsize=UPDATE_QUEUE_SIZE,
+                 heavy_workers=HEAVY_WORKERS, heavy_limit=None, on_shed=None):
+        self.process = process
+        self.workers = max(workers, 1)
+        self.maxsize = maxsize
+        self.heavy_workers = max(min(heavy_workers, self.workers), 1)
+        self.heavy_limit = heavy_limit if heavy_limit is not None else max(int(maxsize * HEAVY_QUEUE_SHARE), 1)
+        self.on_shed = on_shed
+        self.queued = 0
+        self.queued_heavy = 0
+        self.running_heavy = 0
+        self._chats = {}        # chat -> deque (prioritas, urutan, waktu masuk, update)
+        self._ready = []        # heap (prioritas, urutan, chat) chat yang siap & tidak sedang diproses
+        self._active = set()    # chat yang sedang diproses worker
+        self._seq = itertools.count()
+        self._changed = None
+        self._tasks = []
+        self._stopping = False
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def submit(self, update):
+        """Masukkan update ke antrian; False (dan on_shed dipanggil) jika ditolak"""
+        priority = update_priority(update)
+        if self.queued >= self.maxsize or (priority == PRIORITY_HEAVY and self.queued_heavy >= self.heavy_limit):
+            metrics.inc('updates_shed_total', kind=_kind(priority))
+            if self.on_shed is not None:
+                self.on_shed(update)
+            return False
+
+        seq = next(self._seq)
+        chat = getattr(getattr(update, 'effective_chat', None), 'id', None)
+        chat = ('update', seq) if chat is None else chat  # update tanpa chat tidak perlu diurutkan
+        pending = self._chats.setdefault(chat, deque())
+        pending.append((priority, seq, time.perf_counter(), update))
+        self.queued += 1
+        self.queued_heavy += priority == PRIORITY_HEAVY
+        if len(pending) == 1 and chat not in self._active:
+            heapq.heappush(self._ready, (priority, seq, chat))
+        metrics.observe('update_queue_depth', self.queued)
+        self._wake()
+        return True
+
+    def _wake(self):
+        if self._changed is not None:
+            self._changed.set()
+
+    def _can_take(self):
+        if not self._ready:
+            return False
+        return self._ready[0][0] != PRIORITY_HEAVY or self.running_heavy < self.heavy_workers
+
+    async def _take(self):
+        # Satu event loop: tidak ada await antara cek dan ambil, jadi tidak perlu lock
+        while not self._can_take():
+            if self._stopping and not self.queued:
+                return None
+            self._changed.clear()
+            await self._changed.wait()
+        priority, _, chat = heapq.heappop(self._ready)
+        self._active.add(chat)
+        item = self._chats[chat].popleft()
+        self.queued -= 1
+        if priority == PRIORITY_HEAVY:
+            self.queued_heavy -= 1
+            self.running_heavy += 1
+        return chat, item
+
+    def _release(self, chat, priority):
+        if priority == PRIORITY_HEAVY:
+            self.running_heavy -= 1
+        self._active.discard(chat)
+        pending = self._chats[chat]
+        if pending:
+            head_priority, head_seq = pending[0][:2]
+            heapq.heappush(self._ready, (head_priority, head_seq, chat))
+        else:
+            del self._chats[chat]
+        self._wake()
+
+    async def _worker(self):
+        while True:
+            taken = await self._take()
+            if taken is None:
+                return
+            chat, (priority, _, enqueued, update) = taken
+            kind = _kind(priority)
+            metrics.observe('update_wait_seconds', time.perf_counter() - enqueued, kind=kind)
+            try:
+                await self.process(update)
+            except Exception:
+                print(f"[ERROR] Update gagal diproses: {traceback.format_exc()}")
+            finally:
+                self._release(chat, priority)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._changed = asyncio.Event()
+        self._stopping = False
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=UPDATE_DRAIN_TIMEOUT):
+        """Selesaikan update yang sudah diantre (maks. `timeout` detik), lalu hentikan worker"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wake()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            print(f"⚠️ {self.queued} update di antrian dibuang saat berhenti")
+        self._tasks = []
+
+async def reply_busy(bot, update):
+    """Balasan "sibuk, coba lagi" untuk update yang ditolak antrian"""
+    try:
+        if getattr(update, 'callback_query', None) is not None:
+            await update.callback_query.answer(BUSY_MESSAGE)
+        elif getattr(update, 'effective_chat', None) is not None:
+            await bot.send_message(update.effective_chat.id, BUSY_MESSAGE)
+    except Exception as e:
+        print(f"⚠️ Gagal mengirim balasan sibuk: {str(e)}")
+
+class QueuedApplication(Application):
+    """Application yang memproses update lewat UpdateDispatcher, bukan satu per satu.
+
+    Berlaku untuk polling maupun webhook, karena keduanya lewat
+    `update_queue` -> `process_update`. Dipasang dengan
+    `Application.builder().application_class(QueuedApplication)`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = UpdateDispatcher(self._process_now, on_shed=self._shed)
+
+    async def _process_now(self, update):
+        await super().process_update(update)
+
+    def _shed(self, update):
+        self.create_task(reply_busy(self.bot, update))
+
+    async def process_update(self, update):
+        if not self.dispatcher.running:
+            await self._process_now(update)
+            return
+        self.dispatcher.submit(update)
+
+    async def start(self):
+        await super().start()
+        self.dispatcher.start()
+
+    async def stop(self):
+        # Hentikan pengambilan update dulu, baru habiskan antrian
+        await super().stop()
+        await self.dispatcher.stop()
@@ -1,56 +1,36 @@
-import json
-import os
-from typing import List
+from typing import List, Optional
+from utils.store import get_store, GLOBAL_WATCHLIST
 
+# Dipertahankan untuk kompatibilitas; isinya dimigrasi ke database (utils/store.py)
 WATCHLIST_PATH = "data/watchlist.json"
 
-def load_watchlist() -> List[str]:
-    """Muat daftar saham dari file dengan error handling"""
-    # Jika file tidak ada, buat baru dengan default watchlist
-    if not os.path.exists(WATCHLIST_PATH):
-        default_watchlist = ["BBRI.JK", "BMRI.JK"]
-        save_watchlist(default_watchlist)
-        return default_watchlist
-    
-    # Jika file ada, baca dengan error handling
-    try:
-        with open(WATCHLIST_PATH, 'r') as f:
-            content = f.read()
-            if not content.strip():  # Jika file kosong
-                raise ValueError("File kosong")
-            return json.loads(content)
-    except (json.JSONDecodeError, ValueError) as e:
-        print(f"⚠️ Error baca watchlist: {e}. Membuat baru...")
-        default_watchlist = ["BBRI.JK", "BMRI.JK"]
-        save_watchlist(default_watchlist)
-        return default_watchlist
+def _normalize(stock_code: str) -> str:
+    stock_code = stock_code.upper()
+    return stock_code if stock_code.endswith(".JK") else stock_code + ".JK"
 
-def save_watchlist(watchlist: List[str]) -> None:
-    """Simpan daftar saham ke file"""
-    os.makedirs(os.path.dirname(WATCHLIST_PATH), exist_ok=True)
-    with open(WATCHLIST_PATH, 'w') as f:
-        json.dump(watchlist, f, indent=2)
+def load_watchlist(chat_id: Optional[int] = None) -> List[str]:
+    """Muat daftar saham: global, atau watchlist efektif milik chat_id"""
+    if chat_id is None:
+        return get_store().watchlist(GLOBAL_WATCHLIST)
+    return get_store().effective_watchlist(chat_id)
 
-def add_to_watchlist(stock_code: str) -> bool:
-    """Tambahkan saham ke watchlist"""
-    if not stock_code.endswith(".JK"):
-        stock_code += ".JK"
-    
-    watchlist = load_watchlist()
-    if stock_code not in watchlist:
-        watchlist.append(stock_code)
-        save_watchlist(watchlist)
-        return True
-    return False
+def save_watchlist(watchlist: List[str], chat_id: Optional[int] = None) -> None:
+    """Simpan (ganti) seluruh daftar saham"""
+    get_store().set_watchlist(watchlist, GLOBAL_WATCHLIST if chat_id is None else chat_id)
 
-def remove_from_watchlist(stock_code: str) -> bool:
-    """Hapus saham dari watchlist"""
-    if not stock_code.endswith(".JK"):
-        stock_code += ".JK"
-    
-    watchlist = load_watchlist()
-    if stock_code in watchlist:
-        watchlist.remove(stock_code)
-        save_watchlist(watchlist)
-        return True
-    return False
\ No newline at end of file
+def _own_watchlist(chat_id: int) -> int:
+    """Pastikan chat punya watchlist sendiri (disalin dari global saat pertama diubah)"""
+    store = get_store()
+    if not store.has_own_watchlist(chat_id):
+        store.copy_global_watchlist(chat_id)
+    return chat_id
+
+def add_to_watchlist(stock_code: str, chat_id: Optional[int] = None) -> bool:
+    """Tambahkan saham ke watchlist (global atau milik chat_id)"""
+    target = GLOBAL_WATCHLIST if chat_id is None else _own_watchlist(chat_id)
+    return get_store().add_to_watchlist(_normalize(stock_code), target)
+
+def remove_from_watchlist(stock_code: str, chat_id: Optional[int] = None) -> bool:
+    """Hapus saham dari watchlist (global atau milik chat_id)"""
+    target = GLOBAL_WATCHLIST if chat_id is None else _own_watchlist(chat_id)
+    return get_store().remove_from_watchlist(_normalize(stock_code), target)
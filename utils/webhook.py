@@ -0,0 +1,180 @@
+import os
+import hmac
+import json
+import signal
+import asyncio
+from urllib.parse import urlsplit
+from telegram import Update
+
+# Mode webhook: Telegram mengirim update ke WEBHOOK_URL (https, biasanya lewat reverse proxy)
+# yang diteruskan ke server lokal di WEBHOOK_LISTEN:WEBHOOK_PORT
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH') or (urlsplit(WEBHOOK_URL).path if WEBHOOK_URL else '') or '/'
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')                      # dicek di header X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+WEBHOOK_MAX_BODY = int(os.getenv('WEBHOOK_MAX_BODY', str(1024 * 1024)))
+WEBHOOK_IDLE_TIMEOUT = float(os.getenv('WEBHOOK_IDLE_TIMEOUT', '75'))  # detik koneksi keep-alive dibiarkan diam
+WEBHOOK_READ_TIMEOUT = float(os.getenv('WEBHOOK_READ_TIMEOUT', '10'))  # detik membaca header + body satu request
+WEBHOOK_MAX_HEADERS = int(os.getenv('WEBHOOK_MAX_HEADERS', '50'))
+WEBHOOK_MAX_HEADER_BYTES = int(os.getenv('WEBHOOK_MAX_HEADER_BYTES', str(16 * 1024)))
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+}
+
+class _HeadersTooLarge(Exception):
+    pass
+
+class WebhookServer:
+    """Server HTTP minimal (asyncio stdlib) penerima update webhook Telegram.
+
+    Setiap POST ke `path` dengan secret yang cocok di-parse menjadi Update lalu
+    dimasukkan ke `application.update_queue`, jadi diproses lewat jalur yang
+    sama dengan polling (termasuk antrian QueuedApplication). Balasan 200
+    dikirim segera setelah update masuk antrian, bukan setelah diproses.
+    Secret wajib: tanpa secret siapa pun bisa menyuntikkan update (termasuk
+    command admin).
+    """
+
+    def __init__(self, application, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                 path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET belum diatur")
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        # Port 0 = port bebas dari OS (untuk tes lokal)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def receive(self, method, target, headers, body):
+        """Tangani satu request, kembalikan status HTTP"""
+        if urlsplit(target).path != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode(), self.secret.encode()):
+            return 403
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return 400
+        if update is None:
+            return 400
+        self.application.update_queue.put_nowait(update)
+        return 200
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), WEBHOOK_IDLE_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                # Header + body dibatasi waktu & ukuran supaya klien lambat tidak menahan koneksi
+                try:
+                    headers = await asyncio.wait_for(self._read_headers(reader), WEBHOOK_READ_TIMEOUT)
+                except _HeadersTooLarge:
+                    await self._respond(writer, 431, keep_alive=False)
+                    break
+
+                length = int(headers.get('content-length') or 0)
+                if length > WEBHOOK_MAX_BODY:
+                    await self._respond(writer, 413, keep_alive=False)
+                    break
+                body = await asyncio.wait_for(reader.readexactly(length), WEBHOOK_READ_TIMEOUT) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, self.receive(method, target, headers, body), keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader):
+        headers, size = {}, 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            size += len(line)
+            if len(headers) >= WEBHOOK_MAX_HEADERS or size > WEBHOOK_MAX_HEADER_BYTES:
+                raise _HeadersTooLarge()
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _respond(writer, status, keep_alive=True):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+async def serve_webhook(application, url=WEBHOOK_URL, stop_signals=(signal.SIGINT, signal.SIGTERM)):
+    """Jalankan `application` dalam mode webhook sampai menerima sinyal stop.
+
+    Urutan start/stop sama seperti run_polling (post_init, post_stop,
+    post_shutdown ikut dipanggil). Webhook tidak dihapus saat berhenti supaya
+    Telegram menyimpan update selama bot restart.
+    """
+    if not url:
+        raise ValueError("WEBHOOK_URL belum diatur")
+    if not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET belum diatur: tanpa secret siapa pun bisa mengirim update palsu")
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in stop_signals:
+        loop.add_signal_handler(sig, stopped.set)
+
+    server = WebhookServer(application)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.bot.set_webhook(
+            url,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        await application.start()
+        print(f"[WEBHOOK] Mendengarkan di {server.listen}:{server.port}{server.path}")
+        await stopped.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run_webhook(application, url=WEBHOOK_URL):
+    asyncio.run(serve_webhook(application, url))